@@ -0,0 +1,158 @@
+from typing import Any, Dict, List, Optional
+from models import Aeronave, Voo
+from cache import referencias
+from paginacao import combinar_filtros, decodificar_cursor, filtro_cursor, proximo_cursor
+
+# Campos devolvidos pelas rotas "completas" (mantêm o mesmo formato de resposta)
+CAMPOS_VOO = ["numero_voo", "origem", "destino", "hr_partida", "hr_chegada", "status"]
+CAMPOS_AERONAVE = ["modelo", "capacidade", "last_check", "next_check"]
+CAMPOS_CIA = ["nome", "cod_iata"]
+CAMPOS_AERONAVE_RESUMO = ["modelo", "capacidade"]
+
+
+def juncao_paginada(
+    colecao: str, campo_estrangeiro: str, como: str, ordenacao: List[tuple], limit: int, campos: List[str]
+) -> Dict[str, Any]:
+    """$lookup dos documentos que apontam para este (`campo_estrangeiro` == _id), só os `limit` primeiros.
+
+    A busca vai pelo índice de `campo_estrangeiro` (com a ordenação), então o
+    custo não depende de quantos documentos a referência tem. localField/foreignField
+    junto com pipeline no mesmo $lookup exige MongoDB 5.0+.
+    """
+    return {
+        "$lookup": {
+            "from": colecao,
+            "localField": "_id",
+            "foreignField": campo_estrangeiro,
+            "pipeline": [
+                {"$sort": dict(ordenacao)},
+                {"$limit": limit},
+                {"$project": {campo: 1 for campo in campos}},
+            ],
+            "as": como,
+        }
+    }
+
+
+def montar_pipeline(
+    filtros: Optional[Dict[str, Any]],
+    offset: int,
+    limit: int,
+    juncoes: List[Dict[str, Any]],
+    campos: List[str],
+    campos_juncoes: Dict[str, List[str]],
+) -> List[Dict[str, Any]]:
+    """Monta um único pipeline $match/$sort/$skip/$limit/$lookup/$project para uma página.
+
+    O $lookup só roda depois do $limit, então o custo da junção é proporcional
+    ao tamanho da página e tudo sai em uma única ida ao banco.
+    """
+    pipeline: List[Dict[str, Any]] = []
+    if filtros:
+        pipeline.append({"$match": filtros})
+    # Ordem estável por _id para que o cursor (keyset) da próxima página funcione
+    pipeline.append({"$sort": {"_id": 1}})
+    if offset:
+        pipeline.append({"$skip": offset})
+    pipeline.append({"$limit": limit})
+    pipeline.extend(juncoes)
+
+    projecao = {campo: 1 for campo in campos}
+    for como, campos_ref in campos_juncoes.items():
+        projecao[f"{como}._id"] = 1
+        for campo in campos_ref:
+            projecao[f"{como}.{campo}"] = 1
+    pipeline.append({"$project": projecao})
+    return pipeline
+
+
+async def agregar(engine, model, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return await engine.get_collection(model).aggregate(pipeline).to_list(length=None)
+
+
+async def paginar_agregacao(engine, model, construtor, filtros, limit: int, offset: int = 0, cursor: Optional[str] = None):
+    """Executa o pipeline de `construtor` paginando por offset ou por cursor (_id)."""
+    if cursor:
+        dados = decodificar_cursor(cursor, "_id", False)
+        filtros = combinar_filtros(filtros, filtro_cursor("_id", dados, False))
+        offset = 0
+
+    docs = await agregar(engine, model, construtor(filtros, offset, limit))
+    return docs, proximo_cursor(docs, limit, "_id", False)
+
+
+async def anexar_referencias(engine, docs: List[Dict[str, Any]], campo: str, model) -> None:
+    """Substitui o id em `campo` pelo documento referenciado, vindo do cache de referências.
+
+    Fica no mesmo formato do $lookup (lista com zero ou um documento).
+    """
+    mapa = await referencias.obter_varios(engine, model, [doc[campo] for doc in docs if campo in doc])
+    for doc in docs:
+        ref = mapa.get(doc.get(campo))
+        doc[campo] = [ref] if ref else []
+
+
+def _referencia(docs: List[Dict[str, Any]], campos: List[str]) -> Dict[str, Any]:
+    # Referência ausente continua saindo com todos os campos em None
+    doc = docs[0] if docs else None
+    resultado = {"id": str(doc["_id"]) if doc else None}
+    for campo in campos:
+        resultado[campo] = doc.get(campo) if doc else None
+    return resultado
+
+
+def _item(doc: Dict[str, Any], campos: List[str]) -> Dict[str, Any]:
+    resultado = {"id": str(doc["_id"])}
+    for campo in campos:
+        resultado[campo] = doc.get(campo)
+    return resultado
+
+
+# Voo + Cia + Aeronave (referências resolvidas pelo cache, ver anexar_referencias)
+def pipeline_voos_completos(filtros, offset: int, limit: int):
+    return montar_pipeline(filtros, offset, limit, [], CAMPOS_VOO + ["cia", "aeronave"], {})
+
+
+def formatar_voo_completo(doc: Dict[str, Any]) -> Dict[str, Any]:
+    resultado = _item(doc, CAMPOS_VOO)
+    resultado["cia"] = _referencia(doc.get("cia", []), CAMPOS_CIA)
+    resultado["aeronave"] = _referencia(doc.get("aeronave", []), CAMPOS_AERONAVE_RESUMO)
+    return resultado
+
+
+# Aeronave + Cia (companhia resolvida pelo cache, ver anexar_referencias)
+def pipeline_aeronaves_completas(filtros, offset: int, limit: int):
+    return montar_pipeline(filtros, offset, limit, [], CAMPOS_AERONAVE + ["cia"], {})
+
+
+def formatar_aeronave_completa(doc: Dict[str, Any]) -> Dict[str, Any]:
+    resultado = _item(doc, CAMPOS_AERONAVE)
+    resultado["cia"] = _referencia(doc.get("cia", []), CAMPOS_CIA)
+    return resultado
+
+
+# Ordem das listas aninhadas de cias completas (cobertas pelos índices cia_id e cia_hr_partida_id)
+ORDENACAO_AERONAVES_CIA = [("_id", 1)]
+ORDENACAO_VOOS_CIA = [("hr_partida", -1), ("_id", -1)]
+
+
+# Cia + primeiras aeronaves e voos (o restante em /cias/{id}/aeronaves e /cias/{id}/voos)
+def pipeline_cias_completas(filtros, offset: int, limit: int, limit_aeronaves: int = 10, limit_voos: int = 10):
+    return montar_pipeline(
+        filtros,
+        offset,
+        limit,
+        [
+            juncao_paginada(Aeronave.__collection__, "cia", "aeronaves", ORDENACAO_AERONAVES_CIA, limit_aeronaves, CAMPOS_AERONAVE),
+            juncao_paginada(Voo.__collection__, "cia", "voos", ORDENACAO_VOOS_CIA, limit_voos, CAMPOS_VOO),
+        ],
+        CAMPOS_CIA,
+        {"aeronaves": CAMPOS_AERONAVE, "voos": CAMPOS_VOO},
+    )
+
+
+def formatar_cia_completa(doc: Dict[str, Any]) -> Dict[str, Any]:
+    resultado = _item(doc, CAMPOS_CIA)
+    resultado["aeronaves"] = [_item(aero, CAMPOS_AERONAVE) for aero in doc.get("aeronaves", [])]
+    resultado["voos"] = [_item(voo, CAMPOS_VOO) for voo in doc.get("voos", [])]
+    return resultado
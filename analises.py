@@ -0,0 +1,294 @@
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, DeleteOne, IndexModel, ReplaceOne, UpdateOne
+from pymongo.errors import PyMongoError
+
+from arquivamento import COLECAO_ARQUIVO
+from atualizacao import ATUALIZADO_EM
+from models import Voo
+import tarefas
+
+logger = logging.getLogger(__name__)
+
+INTERVALO_ANALISES = float(os.getenv("ANALISES_INTERVALO", "60"))  # segundos entre atualizações; 0 desliga
+RECONSTRUCAO_ANALISES = float(os.getenv("ANALISES_RECONSTRUCAO_HORAS", "24"))  # reconstrução completa periódica
+LOTE_ANALISES = 1000
+# Prazo da reserva da tarefa, renovado a cada lote: só um worker atualiza as visões por vez
+RESERVA_ANALISES = float(os.getenv("ANALISES_RESERVA", "120"))
+# Gravações ainda não confirmadas podem ter carimbo um pouco mais antigo: lê com atraso
+ATRASO_ANALISES = timedelta(seconds=5)
+
+TAREFA = "analises"
+STATUS_ATRASADO = "atrasado"
+STATUS_CANCELADO = "cancelado"
+
+# Contribuição atual de cada voo às visões; a diferença para a nova é o que muda nas contagens
+COLECAO_CONTRIBUICOES = "analise_contribuicoes"
+# Voos removidos pela API desde a última atualização
+COLECAO_REMOCOES = "analise_remocoes"
+
+# Visão materializada -> campos da chave (contagem de voos por chave)
+VISOES: Dict[str, Tuple[str, ...]] = {
+    "analise_rotas": ("origem", "destino"),
+    "analise_partidas": ("cia", "dia"),
+    "analise_status": ("cia", "status"),
+}
+
+INDICES_ANALISES = {
+    "analise_rotas": [
+        IndexModel([("total", DESCENDING)], name="total"),
+        IndexModel([("origem", ASCENDING), ("total", DESCENDING)], name="origem_total"),
+        IndexModel([("destino", ASCENDING), ("total", DESCENDING)], name="destino_total"),
+    ],
+    "analise_partidas": [
+        IndexModel([("cia", ASCENDING), ("dia", ASCENDING)], name="cia_dia"),
+        IndexModel([("dia", ASCENDING)], name="dia"),
+    ],
+    "analise_status": [IndexModel([("cia", ASCENDING)], name="cia")],
+}
+
+# Mesmos valores de `contribuicao`, calculados no servidor na reconstrução
+PROJECAO_CONTRIBUICAO = {
+    "origem": 1,
+    "destino": 1,
+    "cia": 1,
+    "dia": {"$dateToString": {"format": "%Y-%m-%d", "date": "$hr_partida"}},
+    "status": {"$toLower": {"$trim": {"input": {"$ifNull": ["$status", ""]}}}},
+}
+
+# Situação da última execução neste worker (a marca d'água fica no banco)
+estado: Dict[str, Any] = {"ultima_execucao": None, "processados": 0, "em_execucao": False}
+
+
+def contribuicao(doc: Dict[str, Any]) -> Dict[str, Any]:
+    partida = doc.get("hr_partida")
+    return {
+        "origem": doc.get("origem"),
+        "destino": doc.get("destino"),
+        "cia": doc.get("cia"),
+        "dia": partida.strftime("%Y-%m-%d") if partida else None,
+        "status": str(doc.get("status") or "").strip().lower(),
+    }
+
+
+def _chave(contrib: Optional[Dict[str, Any]], campos: Tuple[str, ...]):
+    if contrib is None:
+        return None
+    return tuple((campo, contrib.get(campo)) for campo in campos)
+
+
+async def criar_indices_analises(engine) -> None:
+    for colecao, indices in INDICES_ANALISES.items():
+        await engine.database[colecao].create_indexes(indices)
+
+
+async def registrar_remocao(engine, voo_id) -> None:
+    """Chamado na remoção pela API; a contribuição do voo sai na próxima atualização.
+
+    Voos movidos para o arquivo continuam contando: as visões cobrem o histórico.
+    """
+    await engine.database[COLECAO_REMOCOES].update_one({"_id": voo_id}, {"$set": {"_id": voo_id}}, upsert=True)
+
+
+async def _aplicar(engine, novas: Dict[Any, Optional[Dict[str, Any]]]) -> None:
+    """Aplica nas visões a diferença entre a contribuição guardada e a nova de cada voo."""
+    db = engine.database
+    antigas = {doc["_id"]: doc async for doc in db[COLECAO_CONTRIBUICOES].find({"_id": {"$in": list(novas)}})}
+
+    deltas = {colecao: Counter() for colecao in VISOES}
+    escritas = []
+    for voo_id, nova in novas.items():
+        antiga = antigas.get(voo_id)
+        for colecao, campos in VISOES.items():
+            chave_antiga, chave_nova = _chave(antiga, campos), _chave(nova, campos)
+            if chave_antiga == chave_nova:
+                continue
+            if chave_antiga is not None:
+                deltas[colecao][chave_antiga] -= 1
+            if chave_nova is not None:
+                deltas[colecao][chave_nova] += 1
+        if nova is None:
+            escritas.append(DeleteOne({"_id": voo_id}))
+        elif antiga is None or any(antiga.get(campo) != valor for campo, valor in nova.items()):
+            escritas.append(ReplaceOne({"_id": voo_id}, {"_id": voo_id, **nova}, upsert=True))
+
+    for colecao, delta in deltas.items():
+        operacoes = [
+            UpdateOne({"_id": dict(chave)}, {"$inc": {"total": total}, "$set": dict(chave)}, upsert=True)
+            for chave, total in delta.items()
+            if total
+        ]
+        if operacoes:
+            await db[colecao].bulk_write(operacoes, ordered=False)
+    if escritas:
+        await db[COLECAO_CONTRIBUICOES].bulk_write(escritas, ordered=False)
+
+
+async def reconstruir(engine) -> int:
+    """Recalcula tudo com $group/$merge (voos vivos e arquivados) e reinicia a marca d'água.
+
+    As visões são agrupadas a partir das contribuições gravadas, então
+    contagens e contribuições partem do mesmo estado; alterações feitas
+    durante a reconstrução são reaplicadas pela atualização incremental.
+    """
+    db = engine.database
+    marca = datetime.utcnow() - ATRASO_ANALISES
+    geracao = time.time_ns()
+
+    ramo = [{"$project": {**PROJECAO_CONTRIBUICAO, "geracao": {"$literal": geracao}}}]
+    await engine.get_collection(Voo).aggregate(
+        ramo
+        + [
+            {"$unionWith": {"coll": COLECAO_ARQUIVO, "pipeline": ramo}},
+            {"$merge": {"into": COLECAO_CONTRIBUICOES, "whenMatched": "replace", "whenNotMatched": "insert"}},
+        ]
+    ).to_list(length=None)
+    await db[COLECAO_CONTRIBUICOES].delete_many({"geracao": {"$ne": geracao}})
+
+    for colecao, campos in VISOES.items():
+        await tarefas.renovar(engine, TAREFA, RESERVA_ANALISES)
+        await db[COLECAO_CONTRIBUICOES].aggregate([
+            {"$group": {"_id": {campo: f"${campo}" for campo in campos}, "total": {"$sum": 1}}},
+            {"$set": {**{campo: f"$_id.{campo}" for campo in campos}, "geracao": geracao}},
+            {"$merge": {"into": colecao, "whenMatched": "replace", "whenNotMatched": "insert"}},
+        ]).to_list(length=None)
+        # Chaves que deixaram de existir
+        await db[colecao].delete_many({"geracao": {"$ne": geracao}})
+
+    total = await db[COLECAO_CONTRIBUICOES].count_documents({})
+    await tarefas.gravar(engine, TAREFA, {
+        "marca": marca,
+        "ultimo_id": ObjectId("0" * 24),
+        "reconstruido_em": datetime.utcnow(),
+        "atualizado_em": datetime.utcnow(),
+    })
+    return total
+
+
+async def atualizar(engine) -> int:
+    """Aplica só os voos alterados desde a marca d'água (e as remoções registradas)."""
+    situacao = await tarefas.ler(engine, TAREFA) or {}
+    if "marca" not in situacao:
+        return await reconstruir(engine)
+
+    db = engine.database
+    processados = 0
+
+    while True:
+        removidos = [doc["_id"] async for doc in db[COLECAO_REMOCOES].find({}, {"_id": 1}).limit(LOTE_ANALISES)]
+        if not removidos:
+            break
+        await tarefas.renovar(engine, TAREFA, RESERVA_ANALISES)
+        await _aplicar(engine, dict.fromkeys(removidos))
+        await db[COLECAO_REMOCOES].delete_many({"_id": {"$in": removidos}})
+        processados += len(removidos)
+
+    marca, ultimo_id = situacao["marca"], situacao["ultimo_id"]
+    limite = datetime.utcnow() - ATRASO_ANALISES
+    projecao = {campo: 1 for campo in ("origem", "destino", "cia", "hr_partida", "status", ATUALIZADO_EM)}
+    voos = engine.get_collection(Voo)
+    while True:
+        filtro = {
+            "$or": [
+                {ATUALIZADO_EM: {"$gt": marca, "$lt": limite}},
+                {ATUALIZADO_EM: marca, "_id": {"$gt": ultimo_id}},
+            ]
+        }
+        docs = await (
+            voos.find(filtro, projecao)
+            .sort([(ATUALIZADO_EM, ASCENDING), ("_id", ASCENDING)])
+            .limit(LOTE_ANALISES)
+            .to_list(length=LOTE_ANALISES)
+        )
+        if not docs:
+            break
+        await tarefas.renovar(engine, TAREFA, RESERVA_ANALISES)
+        await _aplicar(engine, {doc["_id"]: contribuicao(doc) for doc in docs})
+        marca, ultimo_id = docs[-1][ATUALIZADO_EM], docs[-1]["_id"]
+        # Marca gravada a cada lote: uma execução interrompida continua daqui
+        await tarefas.gravar(engine, TAREFA, {"marca": marca, "ultimo_id": ultimo_id})
+        processados += len(docs)
+
+    await tarefas.gravar(engine, TAREFA, {"atualizado_em": datetime.utcnow()})
+    return processados
+
+
+async def executar(engine, completa: bool = False) -> int:
+    """Atualiza ou reconstrói as visões; quem chama já tem a reserva da tarefa."""
+    estado["em_execucao"] = True
+    try:
+        processados = await (reconstruir(engine) if completa else atualizar(engine))
+    finally:
+        estado["em_execucao"] = False
+        estado["ultima_execucao"] = datetime.utcnow()
+    estado["processados"] = processados
+    return processados
+
+
+async def agendar_analises(engine) -> None:
+    """Job periódico: atualização incremental e, de tempos em tempos, reconstrução completa."""
+    while True:
+        try:
+            if await tarefas.reservar(engine, TAREFA, max(RESERVA_ANALISES, INTERVALO_ANALISES * 2)):
+                situacao = await tarefas.ler(engine, TAREFA) or {}
+                reconstruido = situacao.get("reconstruido_em")
+                # A reconstrução corrige qualquer desvio (ex.: execução interrompida no meio de um lote)
+                completa = reconstruido is None or datetime.utcnow() - reconstruido > timedelta(hours=RECONSTRUCAO_ANALISES)
+                await executar(engine, completa)
+        except tarefas.ReservaPerdida:
+            logger.warning("Reserva das análises perdida para outro worker; execução interrompida")
+        except PyMongoError as e:
+            logger.warning("Falha ao atualizar as análises (%s); nova tentativa no próximo intervalo", e)
+        await asyncio.sleep(INTERVALO_ANALISES)
+
+
+async def rotas(engine, origem: Optional[str], destino: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    filtro: Dict[str, Any] = {"total": {"$gt": 0}}
+    if origem:
+        filtro["origem"] = origem
+    if destino:
+        filtro["destino"] = destino
+    cursor = engine.database["analise_rotas"].find(filtro, {"_id": 0, "origem": 1, "destino": 1, "total": 1})
+    return await cursor.sort("total", DESCENDING).limit(limit).to_list(length=limit)
+
+
+async def partidas(engine, cia: Optional[ObjectId], data_inicio: Optional[str], data_fim: Optional[str], limit: int):
+    filtro: Dict[str, Any] = {"total": {"$gt": 0}}
+    if cia is not None:
+        filtro["cia"] = cia
+    if data_inicio or data_fim:
+        filtro["dia"] = {}
+        if data_inicio:
+            filtro["dia"]["$gte"] = data_inicio
+        if data_fim:
+            filtro["dia"]["$lte"] = data_fim
+    cursor = engine.database["analise_partidas"].find(filtro, {"_id": 0, "cia": 1, "dia": 1, "total": 1})
+    docs = await cursor.sort([("dia", ASCENDING), ("cia", ASCENDING)]).limit(limit).to_list(length=limit)
+    return [{**doc, "cia": str(doc["cia"])} for doc in docs]
+
+
+async def status(engine, cia: Optional[ObjectId]) -> Dict[str, Any]:
+    filtro: Dict[str, Any] = {"total": {"$gt": 0}}
+    if cia is not None:
+        filtro["cia"] = cia
+    # Poucas linhas (companhias x status): somadas aqui mesmo
+    por_status: Counter = Counter()
+    async for doc in engine.database["analise_status"].find(filtro, {"status": 1, "total": 1}):
+        por_status[doc["status"]] += doc["total"]
+
+    total = sum(por_status.values())
+    atrasados, cancelados = por_status[STATUS_ATRASADO], por_status[STATUS_CANCELADO]
+    return {
+        "total": total,
+        "por_status": dict(por_status),
+        "proporcoes": {chave: valor / total for chave, valor in por_status.items()} if total else {},
+        "pontualidade": (total - atrasados - cancelados) / total if total else None,
+        "cancelamento": cancelados / total if total else None,
+    }
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from pymongo import ASCENDING, IndexModel, ReplaceOne, UpdateOne
+from pymongo.errors import PyMongoError
+
+from atualizacao import VERSAO
+from busca import TERMOS
+from contadores import TOTAL_VOOS
+from models import Cia, Voo
+import tarefas
+from versoes import versoes
+
+logger = logging.getLogger(__name__)
+
+# Voos com partida anterior a este horizonte saem da coleção principal; 0 desliga o job
+HORIZONTE_ARQUIVO = int(os.getenv("ARQUIVO_HORIZONTE_DIAS", "0"))
+INTERVALO_ARQUIVO = float(os.getenv("ARQUIVO_INTERVALO", "3600"))  # segundos entre execuções
+TAMANHO_LOTE_ARQUIVO = int(os.getenv("ARQUIVO_TAMANHO_LOTE", "1000"))
+PAUSA_LOTE = float(os.getenv("ARQUIVO_PAUSA_LOTE", "0.1"))  # segundos entre lotes, alivia o banco sob carga
+# Prazo da reserva da tarefa, renovada a cada lote: só uma execução por vez entre os workers
+TAREFA = "arquivamento"
+RESERVA_ARQUIVO = float(os.getenv("ARQUIVO_RESERVA", "120"))
+
+COLECAO_ARQUIVO = f"{Voo.__collection__}_arquivo"
+
+# Os mesmos índices que as consultas de /voos/read e /voos/filtros usam na coleção principal
+INDICES_ARQUIVO = [
+    IndexModel([("hr_partida", ASCENDING), ("_id", ASCENDING)], name="hr_partida_id"),
+    IndexModel([("hr_chegada", ASCENDING), ("_id", ASCENDING)], name="hr_chegada_id"),
+    IndexModel([("numero_voo", ASCENDING), ("_id", ASCENDING)], name="numero_voo_id"),
+    IndexModel([("cia", ASCENDING), ("hr_partida", ASCENDING)], name="cia_hr_partida"),
+    IndexModel([(TERMOS, ASCENDING)], name=TERMOS),
+]
+
+# Resultado da última execução (exposto em /arquivamento)
+estado: Dict[str, Any] = {"ultima_execucao": None, "arquivados": 0, "em_execucao": False}
+
+
+async def criar_indices_arquivo(engine) -> None:
+    await engine.database[COLECAO_ARQUIVO].create_indexes(INDICES_ARQUIVO)
+
+
+async def arquivar_lote(engine, corte: datetime, tamanho_lote: int = TAMANHO_LOTE_ARQUIVO) -> Optional[int]:
+    """Move um lote de voos com partida antes de `corte`; devolve quantos saíram (None se não há mais).
+
+    Cada passo é idempotente, então um lote interrompido é refeito na próxima
+    execução: a cópia usa upsert por _id e a remoção só apaga voos que não
+    mudaram (mesma versão) desde a cópia. Só os voos que a própria remoção
+    apagou são descontados dos contadores.
+    """
+    voos = engine.get_collection(Voo)
+    arquivo = engine.database[COLECAO_ARQUIVO]
+
+    docs = await (
+        voos.find({"hr_partida": {"$lt": corte}})
+        .sort([("hr_partida", ASCENDING), ("_id", ASCENDING)])
+        .limit(tamanho_lote)
+        .to_list(length=tamanho_lote)
+    )
+    if not docs:
+        return None
+
+    await arquivo.bulk_write([ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs], ordered=False)
+    # Uma remoção por voo: só conta como arquivado o que esta remoção de fato apagou
+    resultados = await asyncio.gather(
+        *(voos.delete_one({"_id": doc["_id"], VERSAO: doc.get(VERSAO)}) for doc in docs)
+    )
+    removidos = [doc for doc, resultado in zip(docs, resultados) if resultado.deleted_count]
+
+    # Alterados durante a cópia continuam na coleção principal: a cópia velha sai do arquivo.
+    # Os que já não estão lá foram arquivados por outra execução (a cópia é a deles) ou
+    # removidos pela API, que apaga a própria cópia (ver remover_do_arquivo)
+    nao_removidos = [doc["_id"] for doc, resultado in zip(docs, resultados) if not resultado.deleted_count]
+    if nao_removidos:
+        descartados = [doc["_id"] async for doc in voos.find({"_id": {"$in": nao_removidos}}, {"_id": 1})]
+        if descartados:
+            await arquivo.delete_many({"_id": {"$in": descartados}})
+    versoes.alterar(Voo)
+
+    # Os contadores da Cia contam só os voos da coleção principal (como recalcular)
+    totais = Counter(doc["cia"] for doc in removidos)
+    if totais:
+        await engine.get_collection(Cia).bulk_write(
+            [UpdateOne({"_id": cia_id}, {"$inc": {TOTAL_VOOS: -total}}) for cia_id, total in totais.items()],
+            ordered=False,
+        )
+        versoes.alterar(Cia, {TOTAL_VOOS})
+    return len(removidos)
+
+
+async def remover_do_arquivo(engine, id) -> None:
+    """Voo removido pela API: apaga a cópia que um arquivamento em andamento já tenha feito."""
+    await engine.database[COLECAO_ARQUIVO].delete_one({"_id": id})
+
+
+async def arquivar(engine, horizonte_dias: int, tamanho_lote: int = TAMANHO_LOTE_ARQUIVO) -> Optional[int]:
+    """Arquiva em lotes todos os voos com partida há mais de `horizonte_dias` dias.
+
+    Devolve None se outra execução (deste ou de outro worker) tem a reserva.
+    A reserva é renovada a cada lote; se venceu e outro worker a assumiu,
+    levanta ReservaPerdida antes do lote seguinte.
+    """
+    # A reserva barra outros workers; o estado local, outra chamada neste mesmo worker
+    if estado["em_execucao"]:
+        return None
+    estado["em_execucao"] = True
+    try:
+        if not await tarefas.reservar(engine, TAREFA, RESERVA_ARQUIVO):
+            return None
+        corte = datetime.utcnow() - timedelta(days=horizonte_dias)
+        total = 0
+        try:
+            while True:
+                movidos = await arquivar_lote(engine, corte, tamanho_lote)
+                # Fim, ou um lote inteiro mudou durante a cópia (fica para a próxima execução)
+                if not movidos:
+                    break
+                total += movidos
+                await asyncio.sleep(PAUSA_LOTE)
+                await tarefas.renovar(engine, TAREFA, RESERVA_ARQUIVO)
+        finally:
+            estado["ultima_execucao"] = datetime.utcnow()
+            estado["arquivados"] = total
+            await tarefas.gravar(engine, TAREFA, {"ultima_execucao": estado["ultima_execucao"]})
+            await tarefas.liberar(engine, TAREFA)
+        return total
+    finally:
+        estado["em_execucao"] = False
+
+
+async def agendar_arquivamento(engine, horizonte_dias: int = HORIZONTE_ARQUIVO) -> None:
+    """Job periódico do worker; com vários workers, um executa por intervalo (a última execução fica na tarefa)."""
+    while True:
+        try:
+            situacao = await tarefas.ler(engine, TAREFA) or {}
+            ultima = situacao.get("ultima_execucao")
+            if ultima is None or datetime.utcnow() - ultima >= timedelta(seconds=INTERVALO_ARQUIVO):
+                total = await arquivar(engine, horizonte_dias)
+                if total is not None:
+                    logger.info("Arquivamento concluído: %d voos movidos para %s", total, COLECAO_ARQUIVO)
+        except tarefas.ReservaPerdida:
+            logger.warning("Reserva do arquivamento perdida para outro worker; execução interrompida")
+        except PyMongoError as e:
+            logger.warning("Falha no arquivamento (%s); nova tentativa no próximo intervalo", e)
+        await asyncio.sleep(INTERVALO_ARQUIVO)
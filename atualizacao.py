@@ -0,0 +1,107 @@
+from datetime import datetime
+from typing import Any, Dict, Optional, Set
+
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+from busca import CAMPOS_BUSCA, altera_busca, chaves, registrar_sugestoes
+
+# Campo de versão usado no controle de concorrência otimista (If-Match/ETag)
+VERSAO = "versao"
+# Momento da última gravação, nos modelos que têm o campo
+ATUALIZADO_EM = "atualizado_em"
+# Releituras quando outra gravação muda o documento entre a leitura dos campos de busca e o update
+TENTATIVAS_BUSCA = 3
+
+
+def carimbar(model, doc: Dict[str, Any]) -> Dict[str, Any]:
+    if ATUALIZADO_EM in model.model_fields:
+        doc[ATUALIZADO_EM] = datetime.utcnow()
+    return doc
+
+
+def alterados(antes: Dict[str, Any], depois: Dict[str, Any]) -> Set[str]:
+    """Campos cujo valor mudou na atualização (ouvintes de `versoes.alterar` invalidam só o que depende deles)."""
+    return {campo for campo, valor in depois.items() if antes.get(campo) != valor}
+
+
+def etag(versao: int) -> str:
+    return f'"{versao}"'
+
+
+def versao_if_match(if_match: Optional[str]) -> Optional[int]:
+    """Versão esperada a partir do cabeçalho If-Match ("3", W/"3" ou 3); '*' não verifica."""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    valor = if_match.strip()
+    if valor.startswith("W/"):
+        valor = valor[2:]
+    try:
+        return int(valor.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match deve conter a versão do documento")
+
+
+async def atualizar_parcial(
+    engine,
+    model,
+    id,
+    alteracoes: Dict[str, Any],
+    if_match: Optional[str] = None,
+    mensagem_404: str = "Documento não encontrado",
+):
+    """Aplica só os campos alterados com um único find_one_and_update ($set + $inc na versão).
+
+    Devolve (documento antes, documento depois). Com If-Match a atualização só
+    acontece se a versão ainda for a esperada; caso contrário responde 412.
+    As chaves de busca vão no mesmo $set; se faltar algum campo de busca
+    para montá-las, ele é lido antes e o update só vale para a versão lida.
+    """
+    if not alteracoes:
+        raise HTTPException(status_code=400, detail="Nenhum campo para atualizar")
+
+    alteracoes = carimbar(model, dict(alteracoes))
+    versao = versao_if_match(if_match)
+    colecao = engine.get_collection(model)
+    muda_busca = altera_busca(model, alteracoes)
+    faltando = [campo for campo in CAMPOS_BUSCA[model] if campo not in alteracoes] if muda_busca else []
+
+    for _ in range(TENTATIVAS_BUSCA):
+        esperada = versao
+        definir = alteracoes
+        if muda_busca:
+            atual: Dict[str, Any] = {}
+            if faltando:
+                atual = await colecao.find_one({"_id": id}, {**dict.fromkeys(faltando, 1), VERSAO: 1})
+                if atual is None:
+                    raise HTTPException(status_code=404, detail=mensagem_404)
+                lida = atual.get(VERSAO) or 0
+                if versao is not None and lida != versao:
+                    raise HTTPException(status_code=412, detail="O documento foi alterado por outra requisição")
+                esperada = lida
+            definir = {**alteracoes, **chaves(model, {**atual, **alteracoes})}
+
+        filtro: Dict[str, Any] = {"_id": id}
+        if esperada is not None:
+            # Documentos antigos, sem o campo, estão na versão 0
+            filtro[VERSAO] = {"$in": [0, None]} if esperada == 0 else esperada
+
+        antes = await colecao.find_one_and_update(
+            filtro,
+            {"$set": definir, "$inc": {VERSAO: 1}},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if antes is not None:
+            # O estado final é exatamente o anterior com o $set e o $inc aplicados
+            depois = {**antes, **definir, VERSAO: antes.get(VERSAO, 0) + 1}
+            if muda_busca:
+                await registrar_sugestoes(engine, model, [alteracoes])
+            return antes, depois
+
+        if not await colecao.count_documents({"_id": id}, limit=1):
+            raise HTTPException(status_code=404, detail=mensagem_404)
+        if versao is not None:
+            raise HTTPException(status_code=412, detail="O documento foi alterado por outra requisição")
+        # Sem If-Match, só a versão lida para as chaves de busca ficou velha: lê de novo
+
+    raise HTTPException(status_code=409, detail="O documento está sendo alterado por outras requisições; tente novamente")
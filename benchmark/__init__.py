@@ -0,0 +1,4 @@
+"""Gerador de dados sintéticos, driver de carga e relatórios de desempenho da API.
+
+Uso: python -m benchmark --help
+"""
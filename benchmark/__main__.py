@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import time
+
+from benchmark import relatorio
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description=__doc__)
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    gerar = comandos.add_parser("gerar", help="Preenche um mongod local com dados sintéticos")
+    gerar.add_argument("--uri", default="mongodb://localhost:27017")
+    gerar.add_argument("--banco", default="gerenc_voos")
+    gerar.add_argument("--cias", type=int, default=50)
+    gerar.add_argument("--aeronaves", type=int, default=5000)
+    gerar.add_argument("--voos", type=int, default=5_000_000)
+    gerar.add_argument("--semente", type=int, default=42)
+    gerar.add_argument("--limpar", action="store_true", help="Apaga as coleções antes de gerar")
+
+    carga = comandos.add_parser("carga", help="Executa a carga contra a API e grava o relatório")
+    carga.add_argument("--url", default="http://localhost:8000")
+    carga.add_argument("--concorrencia", type=int, default=32)
+    carga.add_argument("--duracao", type=float, default=30.0, help="Segundos")
+    carga.add_argument("--cenarios", nargs="*", help="Subconjunto de cenários (padrão: todos)")
+    carga.add_argument("--escritas", action="store_true", help="Inclui cenários que alteram o banco")
+    carga.add_argument("--semente", type=int, default=42)
+    carga.add_argument("--saida", default="bench_output.json")
+
+    comparar = comandos.add_parser("comparar", help="Compara dois relatórios (ex.: antes/depois de um commit)")
+    comparar.add_argument("antes")
+    comparar.add_argument("depois")
+
+    serializar = comandos.add_parser("serializacao", help="Mede a serialização das páginas de /voos/read (sem banco)")
+    serializar.add_argument("--itens", type=int, default=100, help="Voos por página")
+    serializar.add_argument("--repeticoes", type=int, default=300)
+
+    args = parser.parse_args()
+
+    if args.comando == "gerar":
+        from benchmark.gerador import gerar as gerar_dados
+
+        inicio = time.perf_counter()
+        totais = gerar_dados(
+            args.uri, args.banco, args.cias, args.aeronaves, args.voos, args.semente, limpar=args.limpar
+        )
+        print(f"{totais} em {time.perf_counter() - inicio:.1f}s")
+
+    elif args.comando == "carga":
+        from benchmark.carga import executar
+
+        resultado = asyncio.run(
+            executar(args.url, args.concorrencia, args.duracao, args.cenarios, args.escritas, args.semente)
+        )
+        dados = relatorio.montar(resultado, {
+            "concorrencia": args.concorrencia,
+            "duracao": args.duracao,
+            "cenarios": args.cenarios or "todos",
+            "escritas": args.escritas,
+        })
+        relatorio.salvar(dados, args.saida)
+        print(relatorio.formatar(dados))
+
+    elif args.comando == "serializacao":
+        from benchmark.serializacao import medir
+
+        resultado = medir(args.itens, args.repeticoes)
+        print(f"{resultado['itens_por_pagina']} voos por página")
+        print(f"hidratado + json: {resultado['hidratado']:.0f} páginas/s")
+        print(f"documento + json: {resultado['documento_json']:.0f} páginas/s")
+        print(f"documento + orjson: {resultado['documento']:.0f} páginas/s")
+    else:
+        print(relatorio.comparar(relatorio.carregar(args.antes), relatorio.carregar(args.depois)))
+
+
+if __name__ == "__main__":
+    main()
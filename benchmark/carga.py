@@ -0,0 +1,318 @@
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+
+class ConexaoHTTP:
+    """Cliente HTTP/1.1 mínimo com keep-alive (sem dependências, roda offline).
+
+    Lê respostas com Content-Length ou chunked, o que cobre as rotas da API.
+    """
+
+    def __init__(self, host: str, porta: int):
+        self.host = host
+        self.porta = porta
+        self._leitor: Optional[asyncio.StreamReader] = None
+        self._escritor: Optional[asyncio.StreamWriter] = None
+
+    async def _conectar(self) -> None:
+        self._leitor, self._escritor = await asyncio.open_connection(self.host, self.porta)
+
+    async def fechar(self) -> None:
+        if self._escritor is not None:
+            self._escritor.close()
+            self._escritor = None
+
+    async def requisitar(self, metodo: str, caminho: str, corpo: Optional[bytes] = None,
+                         cabecalhos: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+        if self._escritor is None:
+            await self._conectar()
+        linhas = [f"{metodo} {caminho} HTTP/1.1", f"Host: {self.host}:{self.porta}"]
+        for nome, valor in (cabecalhos or {}).items():
+            linhas.append(f"{nome}: {valor}")
+        if corpo is not None:
+            linhas.append(f"Content-Length: {len(corpo)}")
+        self._escritor.write(("\r\n".join(linhas) + "\r\n\r\n").encode() + (corpo or b""))
+        await self._escritor.drain()
+
+        status_linha = await self._leitor.readline()
+        if not status_linha:
+            # Servidor fechou a conexão ociosa: reconecta e repete uma vez
+            await self.fechar()
+            return await self.requisitar(metodo, caminho, corpo, cabecalhos)
+        status = int(status_linha.split()[1])
+        tamanho = None
+        chunked = False
+        fechar = False
+        while True:
+            linha = (await self._leitor.readline()).strip()
+            if not linha:
+                break
+            nome, _, valor = linha.decode().partition(":")
+            nome = nome.lower()
+            if nome == "content-length":
+                tamanho = int(valor)
+            elif nome == "transfer-encoding" and "chunked" in valor.lower():
+                chunked = True
+            elif nome == "connection" and "close" in valor.lower():
+                fechar = True
+
+        if chunked:
+            partes = []
+            while True:
+                tamanho_parte = int((await self._leitor.readline()).strip().split(b";")[0], 16)
+                if tamanho_parte == 0:
+                    await self._leitor.readline()
+                    break
+                partes.append(await self._leitor.readexactly(tamanho_parte))
+                await self._leitor.readline()
+            resposta = b"".join(partes)
+        elif tamanho is not None:
+            resposta = await self._leitor.readexactly(tamanho)
+        else:
+            resposta = b""
+        if fechar:
+            await self.fechar()
+        return status, resposta
+
+
+@dataclass
+class Amostras:
+    latencias: Dict[str, List[float]] = field(default_factory=lambda: defaultdict(list))
+    erros: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+
+@dataclass
+class Contexto:
+    """Ids reais do banco para montar as requisições dos cenários."""
+
+    cias: List[str]
+    aeronaves: List[Tuple[str, str]]  # (id da aeronave, id da cia)
+    voos: List[str]
+    aleatorio: random.Random
+    # Voos criados pela carga, consumidos pelo cenário de remoção
+    criados: List[str] = field(default_factory=list)
+    aeroportos: List[str] = field(default_factory=list)
+    nomes_cias: Dict[str, str] = field(default_factory=dict)
+    cliente: int = 0
+    sequencia: int = 0
+
+
+def _q(caminho: str, **params) -> str:
+    return f"{caminho}?{urlencode(params)}" if params else caminho
+
+
+def _data(ctx: Contexto) -> str:
+    return (datetime(2024, 1, 1) + timedelta(days=ctx.aleatorio.randint(0, 60))).strftime("%Y-%m-%d")
+
+
+# Cenários de leitura: nome -> função que devolve (método, caminho, corpo).
+# Ficam de fora /voos/stream (conexão SSE que não termina: não há latência por
+# requisição a medir) e POST /analises/atualizar (job de manutenção das visões,
+# uma execução por vez: sob carga quase todas as chamadas responderiam 409).
+CENARIOS: Dict[str, Callable[[Contexto], Tuple[str, str, Optional[bytes]]]] = {
+    "voos_read": lambda ctx: ("GET", _q("/voos/read", limit=50), None),
+    "voos_filtros": lambda ctx: ("GET", _q("/voos/filtros", data_inicio=_data(ctx), ordenacao="hr_partida", limit=50), None),
+    "voos_busca": lambda ctx: ("GET", _q("/voos/filtros", busca_texto=ctx.aleatorio.choice(["gr", "gig", "bs", "rec"]), limit=20), None),
+    "voos_completo": lambda ctx: ("GET", _q("/voos/completo", limit=50), None),
+    "voos_export": lambda ctx: ("GET", _q("/voos/export", data_inicio=_data(ctx), data_fim=_data(ctx)), None),
+    "voos_autocomplete": lambda ctx: ("GET", _q("/voos/autocomplete", prefixo=ctx.aleatorio.choice("gscbr")), None),
+    "voos_painel": lambda ctx: ("GET", _q(f"/voos/painel/{ctx.aleatorio.choice(ctx.aeroportos)}", tipo=ctx.aleatorio.choice(["partidas", "chegadas"])), None),
+    "aeronaves_read": lambda ctx: ("GET", _q("/aeronaves/read", limit=50), None),
+    "aeronaves_filtros": lambda ctx: ("GET", _q("/aeronaves/filtros", cia_id=ctx.aleatorio.choice(ctx.cias)), None),
+    "aeronaves_completa": lambda ctx: ("GET", _q("/aeronaves/completa", limit=50), None),
+    "aeronaves_relatorio": lambda ctx: ("GET", _q("/aeronaves/relatorio", dias=30, limit=100), None),
+    "cias_listar": lambda ctx: ("GET", _q("/cias/", limit=50), None),
+    "cias_filtros": lambda ctx: ("GET", _q("/cias/filtros", ordenacao="nome", limit=20), None),
+    "cias_completa": lambda ctx: ("GET", _q("/cias/cia_completa", id=ctx.aleatorio.choice(ctx.cias)), None),
+    "cias_count_voos": lambda ctx: ("GET", f"/cias/{ctx.aleatorio.choice(ctx.cias)}/voos/count", None),
+    "cias_count_aeronaves": lambda ctx: ("GET", f"/cias/{ctx.aleatorio.choice(ctx.cias)}/aeronaves/count", None),
+    "cias_aeronaves": lambda ctx: ("GET", _q(f"/cias/{ctx.aleatorio.choice(ctx.cias)}/aeronaves", limit=50), None),
+    "cias_voos": lambda ctx: ("GET", _q(f"/cias/{ctx.aleatorio.choice(ctx.cias)}/voos", limit=50), None),
+    "cias_autocomplete": lambda ctx: ("GET", _q("/cias/autocomplete", prefixo="comp"), None),
+    "analises_rotas": lambda ctx: ("GET", _q("/analises/rotas", origem=ctx.aleatorio.choice(ctx.aeroportos)), None),
+    "analises_partidas": lambda ctx: ("GET", _q("/analises/partidas", cia_id=ctx.aleatorio.choice(ctx.cias), data_inicio=_data(ctx)), None),
+    "analises_status": lambda ctx: ("GET", _q("/analises/status", cia_id=ctx.aleatorio.choice(ctx.cias)), None),
+    "analises_situacao": lambda ctx: ("GET", "/analises/situacao", None),
+}
+
+# Aeroporto e modelo fictícios dos itens criados pelos cenários de lote, que
+# não devolvem ids: a limpeza final os encontra pela busca
+MARCA_LOTE = "ZZB"
+ITENS_POR_LOTE = 10
+
+
+def _patch_status(ctx: Contexto):
+    corpo = json.dumps({"status": ctx.aleatorio.choice(["embarque", "partiu", "atrasado"])}).encode()
+    return "PATCH", f"/voos/{ctx.aleatorio.choice(ctx.voos)}", corpo
+
+
+def _patch_aeronave(ctx: Contexto):
+    corpo = json.dumps({"next_check": _data(ctx)}).encode()
+    return "PATCH", f"/aeronaves/{ctx.aleatorio.choice(ctx.aeronaves)[0]}", corpo
+
+
+def _patch_cia(ctx: Contexto):
+    # Regrava o nome atual: percorre o PATCH inteiro (versão, chaves de busca) sem alterar os dados gerados
+    cia = ctx.aleatorio.choice(ctx.cias)
+    return "PATCH", f"/cias/{cia}", json.dumps({"nome": ctx.nomes_cias[cia]}).encode()
+
+
+def _novo_voo(ctx: Contexto, origem: str = "GRU") -> dict:
+    # Horário único por cliente no futuro distante: nunca conflita com os dados gerados
+    ctx.sequencia = (ctx.sequencia + 1) % 20_000
+    partida = datetime(2100, 1, 1) + timedelta(hours=2 * (ctx.cliente * 20_000 + ctx.sequencia))
+    aeronave, cia = ctx.aleatorio.choice(ctx.aeronaves)
+    return {
+        "numero_voo": ctx.aleatorio.randint(1000, 9999),
+        "origem": origem,
+        "destino": "GIG",
+        "hr_partida": partida.isoformat(),
+        "hr_chegada": (partida + timedelta(hours=1)).isoformat(),
+        "status": "programado",
+        "aeronave": aeronave,
+        "cia": cia,
+    }
+
+
+def _criar_voo(ctx: Contexto):
+    return "POST", "/voos/", json.dumps(_novo_voo(ctx)).encode()
+
+
+def _criar_voos_lote(ctx: Contexto):
+    corpo = [_novo_voo(ctx, MARCA_LOTE) for _ in range(ITENS_POR_LOTE)]
+    return "POST", "/voos/bulk", json.dumps(corpo).encode()
+
+
+def _criar_aeronaves_lote(ctx: Contexto):
+    corpo = [
+        {"modelo": f"{MARCA_LOTE} {ctx.aleatorio.randint(100, 999)}", "capacidade": 180, "cia": ctx.aleatorio.choice(ctx.cias)}
+        for _ in range(ITENS_POR_LOTE)
+    ]
+    return "POST", "/aeronaves/bulk", json.dumps(corpo).encode()
+
+
+def _remover_voo(ctx: Contexto):
+    if not ctx.criados:
+        return _criar_voo(ctx)
+    return "DELETE", f"/voos/{ctx.criados.pop()}", None
+
+
+# Cenários de escrita (só com --escritas): alteram o banco, mas só removem o que a própria carga criou
+CENARIOS_ESCRITA = {
+    "voos_criar": _criar_voo,
+    "voos_patch_status": _patch_status,
+    "voos_remover": _remover_voo,
+    "voos_bulk": _criar_voos_lote,
+    "aeronaves_bulk": _criar_aeronaves_lote,
+    "aeronaves_patch": _patch_aeronave,
+    "cias_patch": _patch_cia,
+}
+
+
+async def _listar(conexao: ConexaoHTTP, caminho: str) -> List[dict]:
+    status, corpo = await conexao.requisitar("GET", caminho)
+    if status != 200:
+        raise RuntimeError(f"{caminho} respondeu {status}; o banco foi preenchido?")
+    return json.loads(corpo)
+
+
+async def _remover_marcados(conexao: ConexaoHTTP, busca: str, remocao: str) -> None:
+    """Apaga, página a página, os itens criados pelos cenários de lote."""
+    while True:
+        status, corpo = await conexao.requisitar("GET", busca)
+        itens = json.loads(corpo) if status == 200 else []
+        removidos = 0
+        for item in itens:
+            status, _ = await conexao.requisitar("DELETE", remocao.format(item["id"]))
+            removidos += status == 200
+        if not removidos:
+            return
+
+
+async def executar(
+    url: str,
+    concorrencia: int = 32,
+    duracao: float = 30.0,
+    cenarios: Optional[List[str]] = None,
+    escritas: bool = False,
+    semente: int = 42,
+) -> Dict[str, object]:
+    """Dispara `concorrencia` clientes por `duracao` segundos, sorteando os cenários."""
+    partes = urlsplit(url)
+    host, porta = partes.hostname or "localhost", partes.port or 80
+
+    todos = dict(CENARIOS)
+    if escritas:
+        todos.update(CENARIOS_ESCRITA)
+    nomes = cenarios or list(todos)
+
+    inicial = ConexaoHTTP(host, porta)
+    cias = await _listar(inicial, "/cias/?limit=100")
+    voos = await _listar(inicial, "/voos/read?limit=100")
+    ctx = Contexto(
+        cias=[item["id"] for item in cias],
+        aeronaves=[(item["id"], item["cia"]) for item in await _listar(inicial, "/aeronaves/read?limit=100")],
+        voos=[item["id"] for item in voos],
+        aleatorio=random.Random(semente),
+        aeroportos=sorted({item["origem"] for item in voos}),
+        nomes_cias={item["id"]: item["nome"] for item in cias},
+    )
+    await inicial.fechar()
+
+    amostras = Amostras()
+    fim = time.perf_counter() + duracao
+
+    async def cliente(numero: int) -> None:
+        aleatorio = random.Random(semente + numero)
+        local = replace(ctx, aleatorio=aleatorio, criados=[], cliente=numero)
+        conexao = ConexaoHTTP(host, porta)
+        try:
+            while time.perf_counter() < fim:
+                nome = aleatorio.choice(nomes)
+                metodo, caminho, corpo = todos[nome](local)
+                cabecalhos = {"Content-Type": "application/json"} if corpo else None
+                inicio = time.perf_counter()
+                try:
+                    status, resposta = await conexao.requisitar(metodo, caminho, corpo, cabecalhos)
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    amostras.erros[nome] += 1
+                    await conexao.fechar()
+                    continue
+                amostras.latencias[nome].append(time.perf_counter() - inicio)
+                if metodo == "POST" and caminho == "/voos/" and status == 200:
+                    local.criados.append(json.loads(resposta)["id"])
+                # 404 de filtros sem resultado não é erro de carga
+                if status >= 500 or status in (400, 409, 412, 422):
+                    amostras.erros[nome] += 1
+        finally:
+            # Limpa os voos criados que o cenário de remoção não chegou a consumir
+            for restante in local.criados:
+                try:
+                    await conexao.requisitar("DELETE", f"/voos/{restante}")
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    break
+            await conexao.fechar()
+
+    inicio_execucao = time.perf_counter()
+    await asyncio.gather(*(cliente(numero) for numero in range(concorrencia)))
+    duracao_execucao = time.perf_counter() - inicio_execucao
+    if escritas:
+        limpeza = ConexaoHTTP(host, porta)
+        try:
+            await _remover_marcados(limpeza, _q("/voos/filtros", busca_texto=MARCA_LOTE, limit=100), "/voos/{}")
+            await _remover_marcados(limpeza, _q("/aeronaves/filtros", modelo=MARCA_LOTE), "/aeronaves/{}")
+        finally:
+            await limpeza.fechar()
+    return {
+        "duracao": duracao_execucao,
+        "concorrencia": concorrencia,
+        "latencias": dict(amostras.latencias),
+        "erros": dict(amostras.erros),
+    }
@@ -0,0 +1,151 @@
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from bson import ObjectId
+from pymongo import MongoClient
+
+from busca import CAMPOS_BUSCA, COLECAO_SUGESTOES, chaves, sugestao
+from migracoes import COLECAO_MIGRACOES, MIGRACAO_BUSCA, MIGRACAO_CONTADORES, MIGRACAO_DURACAO
+from models import Aeronave, Cia, Voo
+
+AEROPORTOS = [
+    "GRU", "CGH", "GIG", "SDU", "BSB", "CNF", "SSA", "REC", "FOR", "POA",
+    "CWB", "FLN", "BEL", "MAO", "VCP", "GYN", "NAT", "MCZ", "CGB", "VIX",
+    "LIS", "MIA", "JFK", "EZE", "SCL", "MAD", "CDG", "LHR", "FRA", "BOG",
+]
+MODELOS = ["A320neo", "A321", "A330-900", "737-800", "737 MAX 8", "777-300ER", "787-9", "E195-E2", "ATR 72-600"]
+STATUS = ["programado"] * 6 + ["embarque", "partiu", "atrasado", "cancelado", "pousou"]
+
+
+def _lotes(colecao, docs, tamanho: int) -> int:
+    total = 0
+    for inicio in range(0, len(docs), tamanho):
+        colecao.insert_many(docs[inicio:inicio + tamanho], ordered=False)
+        total += len(docs[inicio:inicio + tamanho])
+    return total
+
+
+def gerar(
+    uri: str,
+    banco: str = "gerenc_voos",
+    cias: int = 50,
+    aeronaves: int = 5000,
+    voos: int = 5_000_000,
+    semente: int = 42,
+    inicio: datetime = datetime(2024, 1, 1),
+    tamanho_lote: int = 10_000,
+    limpar: bool = False,
+) -> Dict[str, int]:
+    """Preenche o banco com um conjunto de dados reprodutível (mesma semente, mesmos dados).
+
+    Cada aeronave recebe uma sequência de voos sem sobreposição de horário,
+    então os dados respeitam a verificação de conflitos da API.
+    """
+    aleatorio = random.Random(semente)
+    cliente = MongoClient(uri)
+    db = cliente[banco]
+    col_cia, col_aeronave, col_voo = (db[model.__collection__] for model in (Cia, Aeronave, Voo))
+    if limpar:
+        for colecao in (col_cia, col_aeronave, col_voo, db[COLECAO_SUGESTOES]):
+            colecao.delete_many({})
+
+    def oid() -> ObjectId:
+        # ObjectIds determinísticos a partir da semente
+        return ObjectId(bytes(aleatorio.getrandbits(8) for _ in range(12)))
+
+    docs_cia = []
+    for numero in range(cias):
+        doc = {
+            "_id": oid(),
+            "nome": f"Companhia {numero:03d} Linhas Aéreas",
+            "cod_iata": f"{chr(65 + numero // 26 % 26)}{chr(65 + numero % 26)}",
+            "total_aeronaves": 0,
+            "total_voos": 0,
+            "versao": 0,
+        }
+        doc.update(chaves(Cia, doc))
+        docs_cia.append(doc)
+
+    docs_aeronave = []
+    for _ in range(aeronaves):
+        cia = aleatorio.choice(docs_cia)
+        ultimo_check = inicio - timedelta(days=aleatorio.randint(0, 180))
+        doc = {
+            "_id": oid(),
+            "modelo": aleatorio.choice(MODELOS),
+            "capacidade": aleatorio.choice([70, 120, 150, 180, 220, 300, 400]),
+            "last_check": ultimo_check,
+            "next_check": ultimo_check + timedelta(days=aleatorio.randint(90, 365)),
+            "cia": cia["_id"],
+            "versao": 0,
+        }
+        doc.update(chaves(Aeronave, doc))
+        docs_aeronave.append(doc)
+        cia["total_aeronaves"] += 1
+
+    cias_por_id = {cia["_id"]: cia for cia in docs_cia}
+    totais = {"cias": _lotes(col_cia, docs_cia, tamanho_lote), "aeronaves": _lotes(col_aeronave, docs_aeronave, tamanho_lote)}
+
+    # Voos gerados e gravados em lotes para manter a memória constante
+    inseridos = 0
+    por_aeronave = max(1, voos // max(1, aeronaves))
+    lote: List[dict] = []
+    for aeronave in docs_aeronave:
+        horario = inicio + timedelta(minutes=aleatorio.randint(0, 600))
+        origem = aleatorio.choice(AEROPORTOS)
+        for _ in range(por_aeronave):
+            if inseridos + len(lote) >= voos:
+                break
+            destino = aleatorio.choice([a for a in AEROPORTOS if a != origem])
+            duracao = timedelta(minutes=aleatorio.randint(45, 720))
+            doc = {
+                "_id": oid(),
+                "numero_voo": aleatorio.randint(1000, 9999),
+                "origem": origem,
+                "destino": destino,
+                "hr_partida": horario,
+                "hr_chegada": horario + duracao,
+                "status": aleatorio.choice(STATUS),
+                "aeronave": aeronave["_id"],
+                "cia": aeronave["cia"],
+                "versao": 0,
+                "atualizado_em": inicio,
+            }
+            doc.update(chaves(Voo, doc))
+            lote.append(doc)
+            cias_por_id[aeronave["cia"]]["total_voos"] += 1
+            # Próximo voo parte do destino após o tempo de solo
+            horario = doc["hr_chegada"] + timedelta(minutes=aleatorio.randint(40, 240))
+            origem = destino
+            if len(lote) >= tamanho_lote:
+                col_voo.insert_many(lote, ordered=False)
+                inseridos += len(lote)
+                lote = []
+    if lote:
+        col_voo.insert_many(lote, ordered=False)
+        inseridos += len(lote)
+    totais["voos"] = inseridos
+
+    # Valores do autocompletar: poucos (companhias, modelos, aeroportos), gravados de uma vez
+    valores = {
+        Cia: {cia["nome"] for cia in docs_cia},
+        Aeronave: {aeronave["modelo"] for aeronave in docs_aeronave},
+        Voo: set(AEROPORTOS),
+    }
+    db[COLECAO_SUGESTOES].bulk_write(
+        [sugestao(model, valor) for model in CAMPOS_BUSCA for valor in sorted(valores[model])], ordered=False
+    )
+
+    for cia in docs_cia:
+        col_cia.update_one(
+            {"_id": cia["_id"]},
+            {"$set": {"total_aeronaves": cia["total_aeronaves"], "total_voos": cia["total_voos"]}},
+        )
+    # Os dados já nascem com chaves de busca, contadores e voos dentro da duração máxima:
+    # a API não refaz essas migrações ao subir
+    for nome in (MIGRACAO_BUSCA, MIGRACAO_CONTADORES, MIGRACAO_DURACAO):
+        db[COLECAO_MIGRACOES].update_one({"_id": nome}, {"$set": {"executada_em": datetime.utcnow()}}, upsert=True)
+    cliente.close()
+    return totais
+
@@ -0,0 +1,90 @@
+import json
+import subprocess
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+PERCENTIS = (50, 95, 99)
+
+
+def percentil(ordenadas: List[float], p: float) -> float:
+    if not ordenadas:
+        return 0.0
+    posicao = min(len(ordenadas) - 1, max(0, round(p / 100 * len(ordenadas)) - 1))
+    return ordenadas[posicao]
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecido"
+
+
+def montar(resultado: Dict[str, Any], configuracao: Dict[str, Any]) -> Dict[str, Any]:
+    """Relatório com vazão e percentis por cenário (latências em milissegundos)."""
+    duracao = resultado["duracao"]
+    cenarios = {}
+    for nome, latencias in sorted(resultado["latencias"].items()):
+        ordenadas = sorted(latencias)
+        cenarios[nome] = {
+            "requisicoes": len(ordenadas),
+            "erros": resultado["erros"].get(nome, 0),
+            "rps": len(ordenadas) / duracao if duracao else 0.0,
+            **{f"p{p}_ms": percentil(ordenadas, p) * 1000 for p in PERCENTIS},
+            "max_ms": ordenadas[-1] * 1000 if ordenadas else 0.0,
+        }
+    total = sum(item["requisicoes"] for item in cenarios.values())
+    return {
+        "commit": _commit(),
+        "data": datetime.now(timezone.utc).isoformat(),
+        "configuracao": configuracao,
+        "total": {"requisicoes": total, "rps": total / duracao if duracao else 0.0},
+        "cenarios": cenarios,
+    }
+
+
+def salvar(relatorio: Dict[str, Any], caminho: str) -> None:
+    with open(caminho, "w", encoding="utf-8") as arquivo:
+        json.dump(relatorio, arquivo, indent=2, ensure_ascii=False, sort_keys=True)
+
+
+def carregar(caminho: str) -> Dict[str, Any]:
+    with open(caminho, encoding="utf-8") as arquivo:
+        return json.load(arquivo)
+
+
+def formatar(relatorio: Dict[str, Any]) -> str:
+    linhas = [
+        f"commit {relatorio['commit']}  total {relatorio['total']['rps']:.1f} req/s",
+        f"{'cenário':<24}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'erros':>8}",
+    ]
+    for nome, item in relatorio["cenarios"].items():
+        linhas.append(
+            f"{nome:<24}{item['rps']:>10.1f}{item['p50_ms']:>10.2f}{item['p95_ms']:>10.2f}"
+            f"{item['p99_ms']:>10.2f}{item['erros']:>8}"
+        )
+    return "\n".join(linhas)
+
+
+def comparar(antes: Dict[str, Any], depois: Dict[str, Any]) -> str:
+    """Diferença percentual de vazão e p99 entre dois relatórios, por cenário."""
+    def variacao(a: float, b: float) -> str:
+        return f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+
+    linhas = [
+        f"{antes['commit']} -> {depois['commit']}",
+        f"{'cenário':<24}{'req/s':>22}{'p99 ms':>26}",
+    ]
+    for nome in sorted(antes["cenarios"].keys() | depois["cenarios"].keys()):
+        a = antes["cenarios"].get(nome)
+        b = depois["cenarios"].get(nome)
+        if not a or not b:
+            linhas.append(f"{nome:<24}{'(só em um dos relatórios)':>48}")
+            continue
+        linhas.append(
+            f"{nome:<24}{a['rps']:>8.1f} {b['rps']:>7.1f} {variacao(a['rps'], b['rps']):>5}"
+            f"{a['p99_ms']:>9.2f} {b['p99_ms']:>8.2f} {variacao(a['p99_ms'], b['p99_ms']):>7}"
+        )
+    return "\n".join(linhas)
@@ -0,0 +1,75 @@
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+import serializacao
+from models import Voo
+from serializacao import documento
+
+
+def _pagina(itens: int) -> List[dict]:
+    # Documentos como o Motor devolve em /voos/read
+    inicio = datetime(2024, 1, 1)
+    return [
+        {
+            "_id": ObjectId(),
+            "numero_voo": numero,
+            "origem": "GRU",
+            "destino": "GIG",
+            "hr_partida": inicio + timedelta(hours=numero),
+            "hr_chegada": inicio + timedelta(hours=numero + 1),
+            "status": "programado",
+            "aeronave": ObjectId(),
+            "cia": ObjectId(),
+            "versao": 0,
+            "atualizado_em": inicio,
+        }
+        for numero in range(itens)
+    ]
+
+
+def _padrao_json(valor):
+    return valor.isoformat() if isinstance(valor, datetime) else str(valor)
+
+
+def _por_segundo(funcao: Callable[[], bytes], repeticoes: int) -> float:
+    funcao()
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return repeticoes / (time.perf_counter() - inicio)
+
+
+def medir(itens: int = 100, repeticoes: int = 300) -> Dict[str, float]:
+    """Páginas de voos serializadas por segundo em um worker, sem banco.
+
+    "hidratado" é o caminho anterior das rotas /read (modelo ODMantic e
+    response_model do FastAPI); "documento_json" é o documento cru com o json
+    da biblioteca padrão, e "documento" o caminho atual (orjson).
+    """
+    docs = _pagina(itens)
+    lista_voos = TypeAdapter(List[Voo])
+
+    def hidratado() -> bytes:
+        voos = lista_voos.validate_python([Voo.model_validate_doc(doc) for doc in docs])
+        conteudo = jsonable_encoder(lista_voos.dump_python(voos, mode="json"))
+        return json.dumps(conteudo, ensure_ascii=False, separators=(",", ":")).encode()
+
+    def direto_json() -> bytes:
+        conteudo = [documento(Voo, doc) for doc in docs]
+        return json.dumps(conteudo, default=_padrao_json, ensure_ascii=False, separators=(",", ":")).encode()
+
+    def direto() -> bytes:
+        return serializacao.dumps([documento(Voo, doc) for doc in docs])
+
+    return {
+        "itens_por_pagina": itens,
+        "hidratado": _por_segundo(hidratado, repeticoes),
+        "documento_json": _por_segundo(direto_json, repeticoes),
+        "documento": _por_segundo(direto, repeticoes),
+    }
@@ -0,0 +1,151 @@
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import IndexModel, UpdateOne
+
+from models import Aeronave, Cia, Voo
+
+# Campo com os termos normalizados (palavras e texto completo) de cada documento
+TERMOS = "termos_busca"
+COD_IATA = "cod_iata_busca"
+
+# Campos de texto que alimentam os termos de busca de cada modelo
+CAMPOS_BUSCA = {
+    Voo: ["origem", "destino"],
+    Cia: ["nome"],
+    Aeronave: ["modelo"],
+}
+
+# Índices das chaves de busca (criados junto com os dos modelos em database.criar_indices)
+INDICES_BUSCA = {
+    Voo: [IndexModel([(TERMOS, 1)], name=TERMOS)],
+    Cia: [IndexModel([(TERMOS, 1)], name=TERMOS), IndexModel([(COD_IATA, 1)], name=COD_IATA)],
+    Aeronave: [IndexModel([(TERMOS, 1)], name=TERMOS)],
+}
+
+# Valores distintos dos campos de busca (um documento por modelo e valor), lidos pelo
+# autocompletar: o tamanho acompanha quantos valores existem, não quantos documentos
+COLECAO_SUGESTOES = "sugestoes_busca"
+INDICES_SUGESTOES = [IndexModel([("modelo", 1), (TERMOS, 1)], name="modelo_termos")]
+# Valores já gravados por este worker, para não repetir o upsert a cada criação
+LIMITE_CONHECIDAS = 10_000
+_conhecidas: set = set()
+
+
+def normalizar(texto: Optional[str]) -> str:
+    """Minúsculas, sem acentos e com espaços simples: 'São  Paulo' -> 'sao paulo'."""
+    if not texto:
+        return ""
+    decomposto = unicodedata.normalize("NFKD", texto)
+    sem_acentos = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return " ".join(sem_acentos.lower().split())
+
+
+def termos(valores: List[Optional[str]]) -> List[str]:
+    # Texto completo (busca por "sao pa") e cada palavra (busca por "paulo")
+    resultado = set()
+    for valor in valores:
+        normalizado = normalizar(valor)
+        if normalizado:
+            resultado.add(normalizado)
+            resultado.update(re.findall(r"\w+", normalizado))
+    return sorted(resultado)
+
+
+def chaves(model, doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Campos de busca a gravar junto do documento (doc pode ser parcial, como no PATCH)."""
+    campos = CAMPOS_BUSCA[model]
+    resultado: Dict[str, Any] = {}
+    if all(campo in doc for campo in campos):
+        resultado[TERMOS] = termos([doc[campo] for campo in campos])
+    if model is Cia and "cod_iata" in doc:
+        resultado[COD_IATA] = normalizar(doc["cod_iata"])
+    return resultado
+
+
+def filtro_prefixo(campo: str, texto: str) -> Dict[str, Any]:
+    # Regex ancorada e sensível a maiúsculas: vira um intervalo no índice
+    return {campo: {"$regex": "^" + re.escape(normalizar(texto))}}
+
+
+def altera_busca(model, alteracoes: Dict[str, Any]) -> bool:
+    return any(campo in alteracoes for campo in CAMPOS_BUSCA[model] + ["cod_iata"])
+
+
+def sugestao(model, valor: str) -> UpdateOne:
+    # Upsert idempotente: o _id é o próprio valor, então criações simultâneas não duplicam
+    return UpdateOne(
+        {"_id": f"{model.__collection__}:{valor}"},
+        {"$setOnInsert": {"modelo": model.__collection__, "valor": valor, "chave": normalizar(valor), TERMOS: termos([valor])}},
+        upsert=True,
+    )
+
+
+async def registrar_sugestoes(engine, model, docs: Iterable[Dict[str, Any]]) -> None:
+    """Garante na coleção de sugestões os valores de busca dos documentos (docs podem ser parciais)."""
+    novas = {}
+    for doc in docs:
+        for campo in CAMPOS_BUSCA[model]:
+            valor = doc.get(campo)
+            if isinstance(valor, str) and normalizar(valor) and (model, valor) not in _conhecidas:
+                novas[valor] = sugestao(model, valor)
+    if not novas:
+        return
+    await engine.database[COLECAO_SUGESTOES].bulk_write(list(novas.values()), ordered=False)
+    if len(_conhecidas) > LIMITE_CONHECIDAS:
+        _conhecidas.clear()
+    _conhecidas.update((model, valor) for valor in novas)
+
+
+async def inserir(engine, model, inst) -> Dict[str, Any]:
+    """Insere um documento novo já com as chaves de busca, em uma única gravação."""
+    doc = inst.model_dump_doc()
+    doc.update(chaves(model, doc))
+    await engine.get_collection(model).insert_one(doc)
+    await registrar_sugestoes(engine, model, [doc])
+    return doc
+
+
+async def reindexar(engine, model, tamanho_lote: int = 1000) -> int:
+    """Preenche as chaves de busca e as sugestões de toda a coleção (documentos criados antes delas)."""
+    colecao = engine.get_collection(model)
+    projecao = {campo: 1 for campo in CAMPOS_BUSCA[model] + ["cod_iata"]}
+    total = 0
+    docs = []
+    async for doc in colecao.find({}, projecao).batch_size(tamanho_lote):
+        docs.append(doc)
+        if len(docs) >= tamanho_lote:
+            total += await _reindexar_lote(engine, model, docs)
+            docs = []
+    if docs:
+        total += await _reindexar_lote(engine, model, docs)
+    return total
+
+
+async def _reindexar_lote(engine, model, docs: List[Dict[str, Any]]) -> int:
+    operacoes = [UpdateOne({"_id": doc["_id"]}, {"$set": chaves(model, doc)}) for doc in docs]
+    await engine.get_collection(model).bulk_write(operacoes, ordered=False)
+    await registrar_sugestoes(engine, model, docs)
+    return len(operacoes)
+
+
+async def reindexar_todos(engine) -> Dict[str, int]:
+    """Refaz as chaves de busca de todos os modelos; as sugestões são recriadas do zero."""
+    await engine.database[COLECAO_SUGESTOES].delete_many({})
+    _conhecidas.clear()
+    return {model.__collection__: await reindexar(engine, model) for model in CAMPOS_BUSCA}
+
+
+async def sugerir(engine, model, prefixo: str, limit: int) -> List[str]:
+    """Valores distintos dos campos de busca que têm uma palavra começando por `prefixo`.
+
+    Consulta só a coleção de sugestões, pelo índice (modelo, termos): cada
+    valor tem um documento, então milhares de voos do mesmo aeroporto contam
+    como uma sugestão só e o custo não cresce com a coleção de voos. Valores
+    que deixaram de ser usados saem no próximo /busca/reindexar.
+    """
+    cursor = engine.database[COLECAO_SUGESTOES].find(
+        {"modelo": model.__collection__, **filtro_prefixo(TERMOS, prefixo)}, {"valor": 1}
+    )
+    return [doc["valor"] async for doc in cursor.sort("chave", 1).limit(limit)]
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from models import Aeronave, Cia
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL = float(os.getenv("CACHE_TTL", "60"))  # segundos
+CACHE_TAMANHO = int(os.getenv("CACHE_TAMANHO", "10000"))  # entradas
+
+# Campos guardados por modelo: só o que as rotas usam das referências
+PROJECOES = {
+    Cia: {"nome": 1, "cod_iata": 1},
+    Aeronave: {"modelo": 1, "capacidade": 1, "last_check": 1, "next_check": 1, "cia": 1},
+}
+
+
+class CacheReferencias:
+    """Cache LRU com TTL de documentos de Cia/Aeronave por _id.
+
+    Roda no loop do asyncio (sem threads), então as operações no OrderedDict
+    são atômicas. Buscas concorrentes da mesma chave compartilham uma única
+    consulta, e uma invalidação durante a busca impede que o resultado
+    antigo seja guardado.
+    """
+
+    def __init__(self, tamanho: int = CACHE_TAMANHO, ttl: float = CACHE_TTL):
+        self.tamanho = tamanho
+        self.ttl = ttl
+        self._itens: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._pendentes: Dict[tuple, asyncio.Future] = {}
+        self._geracao = 0
+        self.acertos = 0
+        self.falhas = 0
+        self.remocoes = 0
+        self.invalidacoes = 0
+
+    def _ler(self, chave) -> Optional[Dict[str, Any]]:
+        item = self._itens.get(chave)
+        if item is None:
+            return None
+        expira, doc = item
+        if expira < time.monotonic():
+            del self._itens[chave]
+            return None
+        self._itens.move_to_end(chave)
+        return doc
+
+    def _guardar(self, chave, doc: Dict[str, Any], geracao: int) -> None:
+        # Houve invalidação enquanto a consulta rodava: o documento pode estar velho
+        if geracao != self._geracao:
+            return
+        self._itens[chave] = (time.monotonic() + self.ttl, doc)
+        self._itens.move_to_end(chave)
+        while len(self._itens) > self.tamanho:
+            self._itens.popitem(last=False)
+            self.remocoes += 1
+
+    async def obter(self, engine, model, id) -> Optional[Dict[str, Any]]:
+        chave = (model.__collection__, id)
+        doc = self._ler(chave)
+        if doc is not None:
+            self.acertos += 1
+            return doc
+        self.falhas += 1
+
+        pendente = self._pendentes.get(chave)
+        if pendente is not None:
+            return await asyncio.shield(pendente)
+
+        futuro = asyncio.get_running_loop().create_future()
+        self._pendentes[chave] = futuro
+        geracao = self._geracao
+        try:
+            doc = await engine.get_collection(model).find_one({"_id": id}, PROJECOES[model])
+            if doc is not None:
+                self._guardar(chave, doc, geracao)
+            futuro.set_result(doc)
+            return doc
+        except BaseException as e:
+            futuro.set_exception(e)
+            # Evita aviso de exceção não lida quando ninguém estava esperando
+            futuro.exception()
+            raise
+        finally:
+            del self._pendentes[chave]
+
+    async def obter_varios(self, engine, model, ids: Iterable) -> Dict[Any, Dict[str, Any]]:
+        """Documentos por _id; os que não estão no cache saem em uma única consulta $in."""
+        encontrados = {}
+        faltando = []
+        for id in set(ids):
+            doc = self._ler((model.__collection__, id))
+            if doc is None:
+                faltando.append(id)
+            else:
+                encontrados[id] = doc
+        self.acertos += len(encontrados)
+        self.falhas += len(faltando)
+
+        if faltando:
+            geracao = self._geracao
+            cursor = engine.get_collection(model).find({"_id": {"$in": faltando}}, PROJECOES[model])
+            async for doc in cursor:
+                self._guardar((model.__collection__, doc["_id"]), doc, geracao)
+                encontrados[doc["_id"]] = doc
+        return encontrados
+
+    def invalidar(self, model, id) -> None:
+        self._geracao += 1
+        self.invalidacoes += 1
+        self._itens.pop((model.__collection__, id), None)
+
+    def limpar(self) -> None:
+        self._geracao += 1
+        self._itens.clear()
+
+    def estatisticas(self) -> Dict[str, Any]:
+        total = self.acertos + self.falhas
+        return {
+            "tamanho": len(self._itens),
+            "capacidade": self.tamanho,
+            "ttl": self.ttl,
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "taxa_acerto": self.acertos / total if total else 0.0,
+            "remocoes": self.remocoes,
+            "invalidacoes": self.invalidacoes,
+        }
+
+
+# Instância única por worker, compartilhada por todas as rotas
+referencias = CacheReferencias()
+
+
+async def vigiar_invalidacoes(engine, cache: CacheReferencias = referencias) -> None:
+    """Invalida o cache a partir do change stream (alterações feitas por outros workers).
+
+    Em um mongod standalone não há change stream: o cache passa a depender só do TTL.
+    """
+    modelos = {model.__collection__: model for model in PROJECOES}
+    pipeline = [
+        {"$match": {
+            "ns.coll": {"$in": list(modelos)},
+            "operationType": {"$in": ["update", "replace", "delete"]},
+        }}
+    ]
+    while True:
+        try:
+            async with engine.database.watch(pipeline) as stream:
+                # Eventos perdidos durante a reconexão podem ter deixado entradas velhas
+                cache.limpar()
+                async for evento in stream:
+                    model = modelos[evento["ns"]["coll"]]
+                    if evento["operationType"] == "update":
+                        alterados = evento["updateDescription"]["updatedFields"].keys() | set(
+                            evento["updateDescription"].get("removedFields", [])
+                        )
+                        # Ex.: contadores da Cia não afetam o que está no cache
+                        if not any(campo.split(".")[0] in PROJECOES[model] for campo in alterados):
+                            continue
+                    cache.invalidar(model, evento["documentKey"]["_id"])
+        except OperationFailure as e:
+            # 40573: change streams só existem em replica set/cluster
+            if e.code == 40573:
+                logger.warning("Change stream indisponível (%s); cache invalidado apenas por TTL", e)
+                return
+            logger.warning("Change stream interrompido (%s); reconectando", e)
+            await asyncio.sleep(1)
+        except PyMongoError as e:
+            logger.warning("Change stream interrompido (%s); reconectando", e)
+            await asyncio.sleep(1)
@@ -0,0 +1,264 @@
+import asyncio
+import os
+import time
+import uuid
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from models import Voo
+
+# Duração máxima de um voo: limita o intervalo do índice lido em cada verificação,
+# por isso voos mais longos são recusados (ficariam invisíveis para as verificações seguintes)
+DURACAO_MAXIMA_VOO = timedelta(hours=float(os.getenv("DURACAO_MAXIMA_VOO_HORAS", "24")))
+# Quanto as verificações olham para trás da partida: a duração máxima, ou o voo mais longo
+# gravado antes dela existir (medido uma vez pela migração, ver ampliar_alcance)
+ALCANCE_SOBREPOSICAO = DURACAO_MAXIMA_VOO
+
+# Agenda de cada aeronave: reserva curta que serializa a verificação de conflito e a gravação
+COLECAO_AGENDAS = "agendas_aeronaves"
+# Prazo da reserva: vence sozinha se o worker cair no meio da gravação
+PRAZO_AGENDA = float(os.getenv("PRAZO_AGENDA_SEGUNDOS", "30"))
+# Quanto uma gravação espera pela agenda ocupada antes de responder 503
+ESPERA_AGENDA = float(os.getenv("ESPERA_AGENDA_SEGUNDOS", "5"))
+INTERVALO_AGENDA = 0.02
+CODIGO_CHAVE_DUPLICADA = 11000
+# Campos do voo que ocupam a agenda da aeronave
+CAMPOS_AGENDA = {"aeronave": 1, "hr_partida": 1, "hr_chegada": 1}
+
+
+def instante(valor) -> Optional[datetime]:
+    """Como o banco devolve: UTC sem fuso, em milissegundos.
+
+    As datas da API podem vir com fuso ("...Z") e microssegundos; sem
+    normalizar, compará-las com as lidas do banco levanta TypeError.
+    """
+    if not isinstance(valor, datetime):
+        return None
+    if valor.tzinfo is not None:
+        valor = valor.astimezone(timezone.utc).replace(tzinfo=None)
+    return valor.replace(microsecond=valor.microsecond // 1000 * 1000)
+
+
+def filtro_sobreposicao(aeronave, partida, chegada) -> Dict[str, Any]:
+    # Sobreposição: começa antes da nova chegada e termina depois da nova partida.
+    # O limite inferior em hr_partida mantém a varredura do índice
+    # (aeronave, hr_partida, hr_chegada) proporcional à janela, não ao histórico.
+    return {
+        "aeronave": aeronave,
+        "hr_partida": {"$lt": chegada, "$gt": partida - ALCANCE_SOBREPOSICAO},
+        "hr_chegada": {"$gt": partida},
+    }
+
+
+def ampliar_alcance(maior_duracao: Optional[timedelta]) -> None:
+    """Estende a busca para trás até o voo mais longo já gravado, se ele passa do máximo.
+
+    Voos antigos, gravados antes do limite de duração, continuam no banco; sem
+    isso ficariam fora da janela e um voo novo poderia se sobrepor a eles.
+    """
+    global ALCANCE_SOBREPOSICAO
+    ALCANCE_SOBREPOSICAO = max(DURACAO_MAXIMA_VOO, maior_duracao or DURACAO_MAXIMA_VOO)
+
+
+async def maior_duracao(engine) -> Optional[timedelta]:
+    """Duração do voo mais longo gravado (uma varredura; roda só na migração)."""
+    cursor = engine.get_collection(Voo).aggregate([
+        {"$group": {"_id": None, "maior": {"$max": {"$subtract": ["$hr_chegada", "$hr_partida"]}}}},
+    ])
+    async for doc in cursor:
+        if doc.get("maior") is not None:
+            return timedelta(milliseconds=doc["maior"])
+    return None
+
+
+@asynccontextmanager
+async def agenda(engine, aeronaves: Iterable[Any]) -> AsyncIterator[None]:
+    """Reserva as aeronaves enquanto o bloco confere conflitos e grava.
+
+    Sem a reserva, duas gravações simultâneas para o mesmo horário passam
+    ambas pela verificação antes de qualquer uma gravar. As aeronaves são
+    reservadas todas juntas ou nenhuma, então lotes com aeronaves em comum
+    não esperam um pelo outro em ciclo; ocupadas por mais de ESPERA_AGENDA,
+    a gravação responde 503.
+    """
+    ids = sorted(set(aeronaves))
+    dono = uuid.uuid4().hex
+    colecao = engine.database[COLECAO_AGENDAS]
+    limite = time.monotonic() + ESPERA_AGENDA
+    while ids:
+        agora = datetime.utcnow()
+        try:
+            await colecao.bulk_write(
+                [
+                    UpdateOne(
+                        {"_id": aeronave, "ate": {"$lte": agora}},
+                        {"$set": {"dono": dono, "ate": agora + timedelta(seconds=PRAZO_AGENDA)}},
+                        upsert=True,
+                    )
+                    for aeronave in ids
+                ],
+                ordered=False,
+            )
+            break
+        except BulkWriteError as e:
+            # Chave duplicada: a agenda já tem reserva válida de outra gravação
+            if any(erro.get("code") != CODIGO_CHAVE_DUPLICADA for erro in e.details.get("writeErrors", [])):
+                raise
+        # Devolve as que conseguiu e tenta todas de novo
+        await colecao.delete_many({"_id": {"$in": ids}, "dono": dono})
+        if time.monotonic() >= limite:
+            raise HTTPException(
+                status_code=503,
+                detail="Aeronave com outra gravação em andamento; tente novamente",
+                headers={"Retry-After": "1"},
+            )
+        await asyncio.sleep(INTERVALO_AGENDA)
+    try:
+        yield
+    finally:
+        await colecao.delete_many({"_id": {"$in": ids}, "dono": dono})
+
+
+@asynccontextmanager
+async def agenda_voo(engine, voo_id, aeronave_nova=None) -> AsyncIterator[Dict[str, Any]]:
+    """Reserva a aeronave atual do voo e a nova; devolve o voo relido dentro da reserva.
+
+    A aeronave que o voo deixa também entra: outra alteração do mesmo voo
+    pode estar conferindo conflitos com ele ainda nela.
+    """
+    colecao = engine.get_collection(Voo)
+    while True:
+        atual = await colecao.find_one({"_id": voo_id}, CAMPOS_AGENDA)
+        if not atual:
+            raise HTTPException(status_code=404, detail="Voo não encontrado")
+        async with agenda(engine, {atual["aeronave"], aeronave_nova or atual["aeronave"]}):
+            relido = await colecao.find_one({"_id": voo_id}, CAMPOS_AGENDA)
+            if not relido:
+                raise HTTPException(status_code=404, detail="Voo não encontrado")
+            # Mudou de aeronave antes da reserva: reserva a nova e confere de novo
+            if relido["aeronave"] == atual["aeronave"]:
+                yield relido
+                return
+
+
+def agenda_lote(engine, validos: List[Tuple[int, Voo]]):
+    return agenda(engine, (voo.aeronave for _, voo in validos))
+
+
+def erro_horarios(partida, chegada) -> Optional[str]:
+    if chegada <= partida:
+        return "hr_chegada deve ser posterior a hr_partida"
+    if chegada - partida > DURACAO_MAXIMA_VOO:
+        return f"Duração do voo maior que o máximo de {DURACAO_MAXIMA_VOO.total_seconds() / 3600:g} horas"
+    return None
+
+
+def validar_horarios(partida, chegada) -> None:
+    erro = erro_horarios(partida, chegada)
+    if erro:
+        raise HTTPException(status_code=400, detail=erro)
+
+
+async def verificar_conflito(engine, aeronave, partida, chegada, ignorar_id=None) -> None:
+    """Responde 409 se a aeronave já tiver um voo no intervalo [partida, chegada)."""
+    partida, chegada = instante(partida), instante(chegada)
+    validar_horarios(partida, chegada)
+    filtro = filtro_sobreposicao(aeronave, partida, chegada)
+    if ignorar_id is not None:
+        filtro["_id"] = {"$ne": ignorar_id}
+    conflito = await engine.get_collection(Voo).find_one(filtro, {"_id": 1})
+    if conflito:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Aeronave já alocada no voo {conflito['_id']} nesse horário",
+        )
+
+
+class IndiceIntervalos:
+    """Intervalos de uma aeronave ordenados pela partida, com o máximo das chegadas acumulado.
+
+    `sobreposto` responde em O(log n) se algum intervalo cruza [partida, chegada).
+    """
+
+    def __init__(self, intervalos: List[Tuple[Any, Any, Any]]):
+        self._intervalos = sorted(intervalos, key=lambda item: item[0])
+        self._partidas = [item[0] for item in self._intervalos]
+        self._max_chegada = []
+        maximo = None
+        for _, chegada, _ in self._intervalos:
+            maximo = chegada if maximo is None or chegada > maximo else maximo
+            self._max_chegada.append(maximo)
+
+    def sobreposto(self, partida, chegada) -> Optional[Any]:
+        # Candidatos: todos que partem antes da nova chegada
+        fim = bisect_left(self._partidas, chegada)
+        if fim == 0 or self._max_chegada[fim - 1] <= partida:
+            return None
+        # Existe conflito; procura qual é (só percorre quando há conflito)
+        for posicao in range(fim - 1, -1, -1):
+            if self._intervalos[posicao][1] > partida:
+                return self._intervalos[posicao][2]
+        return None
+
+
+async def conflitos_lote(engine, validos: List[Tuple[int, Voo]]) -> Dict[int, str]:
+    """Conflitos de horário de um lote de voos novos, por índice do item.
+
+    Uma consulta busca os voos existentes das aeronaves do lote na janela do
+    lote; cada aeronave ganha um IndiceIntervalos. Os voos novos são então
+    comparados entre si por varredura ordenada.
+    """
+    erros: Dict[int, str] = {}
+    # (índice, aeronave, partida, chegada), com os horários já comparáveis aos do banco
+    candidatos = []
+    for indice, voo in validos:
+        partida, chegada = instante(voo.hr_partida), instante(voo.hr_chegada)
+        erro = erro_horarios(partida, chegada)
+        if erro:
+            erros[indice] = erro
+        else:
+            candidatos.append((indice, voo.aeronave, partida, chegada))
+    if not candidatos:
+        return erros
+
+    inicio = min(partida for _, _, partida, _ in candidatos)
+    fim = max(chegada for _, _, _, chegada in candidatos)
+    existentes = defaultdict(list)
+    cursor = engine.get_collection(Voo).find(
+        {
+            "aeronave": {"$in": list({aeronave for _, aeronave, _, _ in candidatos})},
+            "hr_partida": {"$lt": fim, "$gt": inicio - ALCANCE_SOBREPOSICAO},
+            "hr_chegada": {"$gt": inicio},
+        },
+        {"aeronave": 1, "hr_partida": 1, "hr_chegada": 1},
+    )
+    async for doc in cursor:
+        existentes[doc["aeronave"]].append((doc["hr_partida"], doc["hr_chegada"], doc["_id"]))
+    indices = {aeronave: IndiceIntervalos(intervalos) for aeronave, intervalos in existentes.items()}
+
+    por_aeronave = defaultdict(list)
+    for indice, aeronave, partida, chegada in candidatos:
+        indice_existentes = indices.get(aeronave)
+        conflito = indice_existentes.sobreposto(partida, chegada) if indice_existentes else None
+        if conflito is not None:
+            erros[indice] = f"Aeronave já alocada no voo {conflito} nesse horário"
+        else:
+            por_aeronave[aeronave].append((indice, partida, chegada))
+
+    # Entre os voos novos: ordenados pela partida, cada um deve começar após o último aceito
+    for novos in por_aeronave.values():
+        novos.sort(key=lambda item: item[1])
+        ultimo = None
+        for indice, partida, chegada in novos:
+            if ultimo is not None and partida < ultimo[2]:
+                erros[indice] = f"Conflito de horário com o item {ultimo[0]} do lote"
+            else:
+                ultimo = (indice, partida, chegada)
+    return erros
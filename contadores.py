@@ -0,0 +1,31 @@
+from models import Cia, Aeronave, Voo
+from versoes import versoes
+
+# Contadores materializados no documento da Cia
+TOTAL_AERONAVES = "total_aeronaves"
+TOTAL_VOOS = "total_voos"
+
+
+async def incrementar(engine, cia_id, campo: str, valor: int = 1) -> None:
+    # $inc é atômico: criações/remoções concorrentes não perdem contagem
+    await engine.get_collection(Cia).update_one({"_id": cia_id}, {"$inc": {campo: valor}})
+    versoes.alterar(Cia, {campo})
+
+
+async def transferir(engine, cia_antiga, cia_nova, campo: str) -> None:
+    # Documento mudou de companhia: decrementa uma e incrementa a outra
+    if cia_antiga == cia_nova:
+        return
+    await incrementar(engine, cia_antiga, campo, -1)
+    await incrementar(engine, cia_nova, campo, 1)
+
+
+async def recalcular(engine) -> None:
+    """Recalcula os contadores de todas as companhias a partir das coleções."""
+    colecao = engine.get_collection(Cia)
+    await colecao.update_many({}, {"$set": {TOTAL_AERONAVES: 0, TOTAL_VOOS: 0}})
+    for model, campo in ((Aeronave, TOTAL_AERONAVES), (Voo, TOTAL_VOOS)):
+        pipeline = [{"$group": {"_id": "$cia", "total": {"$sum": 1}}}]
+        async for grupo in engine.get_collection(model).aggregate(pipeline):
+            await colecao.update_one({"_id": grupo["_id"]}, {"$set": {campo: grupo["total"]}})
+    versoes.alterar(Cia, {TOTAL_AERONAVES, TOTAL_VOOS})
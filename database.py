@@ -1,19 +1,108 @@
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
 from odmantic import AIOEngine
+from pymongo import monitoring
+from models import Cia, Aeronave, Voo
+from busca import COLECAO_SUGESTOES, INDICES_BUSCA, INDICES_SUGESTOES
+import asyncio
 import os
 
 #carregando variaveis do arquivo .env
 load_dotenv()
 
-#conectando ao banco de dados
 MONGO_URI = os.getenv("MONGO_URI")
-client = AsyncIOMotorClient(MONGO_URI)
-db = client.gerenc_voos
-engine = AIOEngine(client=client, database="gerenc_voos")
+MONGO_DB = os.getenv("MONGO_DB", "gerenc_voos")
+
+# O cliente é criado no lifespan de cada worker (depois do fork), nunca na importação
+client = None
+engine = None
+
+
+class EstadoPool(monitoring.ConnectionPoolListener):
+    """Acompanha as conexões do pool para o endpoint de prontidão."""
+
+    def __init__(self):
+        self.abertas = 0
+        self.em_uso = 0
+        self.falhas_checkout = 0
+        self.pronto = False
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): self.pronto = True
+    def pool_cleared(self, event): self.pronto = False
+    def pool_closed(self, event): self.pronto = False
+    def connection_created(self, event): self.abertas += 1
+    def connection_ready(self, event): pass
+    def connection_closed(self, event): self.abertas -= 1
+    def connection_check_out_started(self, event): pass
+    def connection_check_out_failed(self, event): self.falhas_checkout += 1
+    def connection_checked_out(self, event): self.em_uso += 1
+    def connection_checked_in(self, event): self.em_uso -= 1
+
+    def resumo(self) -> dict:
+        return {
+            "pronto": self.pronto,
+            "conexoes_abertas": self.abertas,
+            "conexoes_em_uso": self.em_uso,
+            "falhas_checkout": self.falhas_checkout,
+        }
+
+
+estado_pool = EstadoPool()
+
+
+def configuracao_cliente() -> dict:
+    """Opções do pool e de timeouts a partir das variáveis de ambiente."""
+    opcoes = {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL", "100")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL", "0")),
+        "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_MS", "0")) or None,
+        "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "0")) or None,
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+        "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+        "socketTimeoutMS": int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0")) or None,
+    }
+    # Ex.: MONGO_COMPRESSORS=zstd,snappy,zlib (zstd/snappy exigem os pacotes opcionais)
+    compressores = os.getenv("MONGO_COMPRESSORS")
+    if compressores:
+        opcoes["compressors"] = compressores
+    return {chave: valor for chave, valor in opcoes.items() if valor is not None}
+
+
+async def conectar(listeners=None) -> AIOEngine:
+    """Cria o cliente deste worker e aquece o pool até minPoolSize conexões."""
+    global client, engine
+    opcoes = configuracao_cliente()
+    client = AsyncIOMotorClient(
+        MONGO_URI, event_listeners=[estado_pool, *(listeners or [])], **opcoes
+    )
+    engine = AIOEngine(client=client, database=MONGO_DB)
+
+    # Comandos simultâneos abrem conexões em paralelo; sem minPoolSize, só valida o acesso
+    await asyncio.gather(*(client.admin.command("ping") for _ in range(max(1, opcoes["minPoolSize"]))))
+    return engine
+
+
+def desconectar() -> None:
+    global client, engine
+    if client is not None:
+        client.close()
+    client = None
+    engine = None
+
 
 def get_engine() -> AIOEngine:
+    if engine is None:
+        raise RuntimeError("Banco de dados não conectado (o lifespan da aplicação não foi iniciado)")
     return engine
 
 def get_db() -> AIOEngine:
-    return engine  # Ou retorna a conexão com o MongoDB
\ No newline at end of file
+    return get_engine()  # Ou retorna a conexão com o MongoDB
+
+async def criar_indices(engine: AIOEngine) -> None:
+    # Cria os índices declarados nos modelos; é idempotente (índices existentes são mantidos)
+    await engine.configure_database([Cia, Aeronave, Voo])
+    # Chaves de busca normalizadas ficam fora dos modelos (ver busca.py)
+    for model, indices in INDICES_BUSCA.items():
+        await engine.get_collection(model).create_indexes(indices)
+    await engine.database[COLECAO_SUGESTOES].create_indexes(INDICES_SUGESTOES)
@@ -0,0 +1,72 @@
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from odmantic import ObjectId
+from models import Aeronave, Cia, Voo
+from busca import TERMOS, COD_IATA, filtro_prefixo
+from conflitos import filtro_sobreposicao
+
+logger = logging.getLogger(__name__)
+
+# Ativa a verificação de planos de consulta na inicialização
+MODO_EXPLAIN = os.getenv("MONGO_EXPLAIN", "").lower() in ("1", "true", "sim")
+
+_ID = ObjectId()
+_DATA = datetime(2024, 1, 1)
+
+# Formato das consultas usadas pelas rotas: (nome, modelo, filtro, ordenação).
+# Uma consulta nova nas rotas entra aqui para ser verificada pelo explain
+FORMAS_CONSULTA: List[Tuple[str, Any, Dict[str, Any], Optional[List[Tuple[str, int]]]]] = [
+    ("voos_filtro_periodo", Voo, {"hr_partida": {"$gte": _DATA, "$lte": _DATA}}, None),
+    ("voos_filtro_ordenado", Voo, {"hr_partida": {"$gte": _DATA}}, [("hr_partida", -1), ("_id", -1)]),
+    ("voos_count_cia", Voo, {"cia": _ID}, None),
+    ("voos_conflito_aeronave", Voo, filtro_sobreposicao(_ID, _DATA, _DATA), None),
+    ("voos_cursor", Voo, {"_id": {"$gt": _ID}}, [("_id", 1)]),
+    ("voos_da_cia", Voo, {"cia": _ID}, [("hr_partida", -1), ("_id", -1)]),
+    ("aeronaves_filtro_cia", Aeronave, {"cia": _ID}, None),
+    ("aeronaves_filtro_last_check", Aeronave, {"last_check": {"$gte": _DATA, "$lte": _DATA}}, None),
+    ("aeronaves_filtro_next_check", Aeronave, {"next_check": {"$gte": _DATA, "$lte": _DATA}}, None),
+    ("aeronaves_count_cia", Aeronave, {"cia": _ID}, None),
+    ("aeronaves_da_cia", Aeronave, {"cia": _ID}, [("_id", 1)]),
+    ("voos_busca_texto", Voo, filtro_prefixo(TERMOS, "gru"), None),
+    ("aeronaves_busca_modelo", Aeronave, filtro_prefixo(TERMOS, "737"), None),
+    ("cias_busca_nome", Cia, filtro_prefixo(TERMOS, "gol"), None),
+    ("cias_busca_cod_iata", Cia, filtro_prefixo(COD_IATA, "g3"), None),
+    ("cias_ordenadas_nome", Cia, {"nome": {"$gt": ""}}, [("nome", 1), ("_id", 1)]),
+    ("cias_ordenadas_cod_iata", Cia, {}, [("cod_iata", -1), ("_id", -1)]),
+]
+
+
+def _estagios(plano: Dict[str, Any]):
+    # Percorre o plano vencedor (estágios aninhados em inputStage/inputStages)
+    yield plano.get("stage")
+    if "inputStage" in plano:
+        yield from _estagios(plano["inputStage"])
+    for entrada in plano.get("inputStages", []):
+        yield from _estagios(entrada)
+    if "queryPlan" in plano:
+        yield from _estagios(plano["queryPlan"])
+
+
+async def explicar(engine, model, filtro, ordenacao=None) -> List[str]:
+    cursor = engine.get_collection(model).find(filtro)
+    if ordenacao:
+        cursor = cursor.sort(ordenacao)
+    plano = await cursor.explain()
+    return list(_estagios(plano["queryPlanner"]["winningPlan"]))
+
+
+async def formas_com_collscan(engine) -> List[str]:
+    """Nomes das formas de consulta registradas cujo plano faz COLLSCAN."""
+    resultado = []
+    for nome, model, filtro, ordenacao in FORMAS_CONSULTA:
+        if "COLLSCAN" in await explicar(engine, model, filtro, ordenacao):
+            resultado.append(nome)
+    return resultado
+
+
+async def verificar_formas(engine) -> None:
+    for nome in await formas_com_collscan(engine):
+        logger.warning("Consulta '%s' faz COLLSCAN (sem índice adequado)", nome)
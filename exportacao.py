@@ -0,0 +1,83 @@
+import csv
+import io
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List
+
+from fastapi.responses import StreamingResponse
+from bson import ObjectId
+from serializacao import dumps
+
+# Documentos pedidos ao Mongo por ida ao banco durante a exportação
+TAMANHO_LOTE_EXPORTACAO = 1000
+
+FORMATOS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _valor(valor: Any) -> Any:
+    if isinstance(valor, ObjectId):
+        return str(valor)
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    return valor
+
+
+def _linha(doc: Dict[str, Any], campos: List[str]) -> Dict[str, Any]:
+    linha = {"id": str(doc["_id"])}
+    for campo in campos:
+        linha[campo] = _valor(doc.get(campo))
+    return linha
+
+
+async def _ndjson(cursor, campos: List[str], tamanho_lote: int) -> AsyncIterator[bytes]:
+    bloco = []
+    async for doc in cursor:
+        bloco.append(dumps(_linha(doc, campos)))
+        if len(bloco) >= tamanho_lote:
+            yield b"\n".join(bloco) + b"\n"
+            bloco = []
+    if bloco:
+        yield b"\n".join(bloco) + b"\n"
+
+
+async def _csv(cursor, campos: List[str], tamanho_lote: int) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    escritor = csv.DictWriter(buffer, fieldnames=["id", *campos])
+    escritor.writeheader()
+    linhas = 0
+    async for doc in cursor:
+        escritor.writerow(_linha(doc, campos))
+        linhas += 1
+        if linhas >= tamanho_lote:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            linhas = 0
+    yield buffer.getvalue()
+
+
+def exportar(
+    engine,
+    model,
+    filtros: Dict[str, Any],
+    campos: List[str],
+    formato: str,
+    tamanho_lote: int = TAMANHO_LOTE_EXPORTACAO,
+    ordenacao=None,
+    nome_arquivo: str = "exportacao",
+) -> StreamingResponse:
+    """Resposta em streaming (NDJSON ou CSV) direto do cursor do Motor.
+
+    Só um lote de `tamanho_lote` documentos fica em memória por vez e os
+    primeiros bytes saem antes de a consulta terminar.
+    """
+    projecao = {campo: 1 for campo in campos}
+    cursor = engine.get_collection(model).find(filtros, projecao).batch_size(tamanho_lote)
+    if ordenacao:
+        cursor = cursor.sort(ordenacao)
+
+    gerador = _csv if formato == "csv" else _ndjson
+    return StreamingResponse(
+        gerador(cursor, campos, tamanho_lote),
+        media_type=FORMATOS[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nome_arquivo}.{formato}"'},
+    )
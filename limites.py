@@ -0,0 +1,219 @@
+import asyncio
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Optional
+
+from fastapi.responses import JSONResponse
+
+from metricas import rota_template
+
+LIMITES_ATIVO = os.getenv("LIMITES_ATIVO", "1") == "1"
+# Latência recente acima de TOLERANCIA x latência base da rota é sinal de fila no banco: o limite cai
+TOLERANCIA_LATENCIA = float(os.getenv("LIMITES_TOLERANCIA", "2.0"))
+FATOR_REDUCAO = 0.9  # redução multiplicativa
+PESO_RECENTE = 0.1  # média móvel exponencial da latência recente (relativa à base)
+# Base de cada rota: média móvel lenta, quase parada durante congestionamento
+# para não "aprender" a latência de sobrecarga como normal
+PESO_BASE = 0.02
+PESO_BASE_CONGESTIONADO = 0.002
+RETRY_AFTER = "1"  # segundos sugeridos ao cliente recusado
+
+# Rotas limitadas (prefixos) e as que ficam de fora: conexões longas, com limites próprios,
+# e o painel, respondido da memória sem ir ao banco
+PREFIXOS_LIMITADOS = ("/voos", "/aeronaves", "/cias")
+PREFIXOS_SEM_LIMITE = ("/voos/painel/",)
+SUFIXOS_SEM_LIMITE = ("/stream", "/export", "/bulk")
+
+
+@dataclass
+class ConfiguracaoLimite:
+    inicial: int
+    minimo: int
+    maximo: int
+    espera: float  # segundos na fila antes do 503
+
+
+def _configuracao(classe: str, inicial: int, minimo: int, maximo: int, espera: float) -> ConfiguracaoLimite:
+    prefixo = f"LIMITES_{classe.upper()}"
+    return ConfiguracaoLimite(
+        inicial=int(os.getenv(f"{prefixo}_INICIAL", str(inicial))),
+        minimo=int(os.getenv(f"{prefixo}_MINIMO", str(minimo))),
+        maximo=int(os.getenv(f"{prefixo}_MAXIMO", str(maximo))),
+        espera=float(os.getenv(f"{prefixo}_ESPERA", str(espera))),
+    )
+
+
+CLASSES = {
+    "leitura": _configuracao("leitura", 64, 4, 512, 0.05),
+    "completo": _configuracao("completo", 8, 1, 64, 0.2),  # agregações e relatórios
+    "escrita": _configuracao("escrita", 32, 2, 256, 0.1),
+}
+
+
+class Sobrecarga(Exception):
+    """Sem vaga dentro do tempo de espera."""
+
+
+class LimiteAdaptativo:
+    """Limite de requisições simultâneas ajustado pela latência (AIMD).
+
+    A latência de cada resposta é comparada com a base da sua rota (uma
+    classe mistura rotas de custos diferentes). Cada resposta rápida soma
+    1/limite (cerca de +1 por limite de respostas); latência recente acima
+    da tolerância, ou erro 5xx, multiplica o limite por FATOR_REDUCAO, no
+    máximo uma vez por latência recente para não reagir várias vezes ao
+    mesmo congestionamento. Quem não consegue vaga
+    espera numa fila curta (FIFO, no máximo `limite` posições) e é recusado
+    ao fim da espera.
+    """
+
+    def __init__(self, configuracao: ConfiguracaoLimite):
+        self.configuracao = configuracao
+        self.limite = float(configuracao.inicial)
+        self.em_uso = 0
+        self.fila: Deque[asyncio.Future] = deque()
+        self.aceitas = 0
+        self.enfileiradas = 0
+        self.recusadas = 0
+        self.reducoes = 0
+        self.relativa = 1.0
+        self.recente: Optional[float] = None
+        self.bases: Dict[str, float] = {}
+        self._ultima_reducao = 0.0
+
+    async def reservar(self) -> None:
+        if self.em_uso < int(self.limite) and not self.fila:
+            self.em_uso += 1
+            self.aceitas += 1
+            return
+        if len(self.fila) >= int(self.limite):
+            self.recusadas += 1
+            raise Sobrecarga()
+
+        vaga = asyncio.get_running_loop().create_future()
+        self.fila.append(vaga)
+        self.enfileiradas += 1
+        try:
+            await asyncio.wait({vaga}, timeout=self.configuracao.espera)
+        except asyncio.CancelledError:
+            # Cliente desistiu: devolve a vaga se ela chegou junto com o cancelamento
+            if vaga.done():
+                self.liberar()
+            else:
+                self.fila.remove(vaga)
+            raise
+        if not vaga.done():
+            self.fila.remove(vaga)
+            self.recusadas += 1
+            raise Sobrecarga()
+        self.aceitas += 1
+
+    def liberar(self) -> None:
+        # A vaga passa direto para o próximo da fila (em_uso não muda), a menos que o limite tenha caído
+        if self.fila and self.em_uso <= int(self.limite):
+            self.fila.popleft().set_result(None)
+            return
+        self.em_uso -= 1
+
+    def observar(self, rota: str, duracao: float, erro: bool, em_uso: int) -> None:
+        agora = time.monotonic()
+        self.recente = duracao if self.recente is None else self.recente + PESO_RECENTE * (duracao - self.recente)
+        base = self.bases.get(rota)
+        if base is None:
+            base = self.bases[rota] = duracao
+        if base > 0:
+            self.relativa += PESO_RECENTE * (duracao / base - self.relativa)
+
+        congestionado = erro or self.relativa > TOLERANCIA_LATENCIA
+        if not erro:
+            peso = PESO_BASE_CONGESTIONADO if congestionado else PESO_BASE
+            self.bases[rota] = base + peso * (duracao - base)
+        if congestionado:
+            if agora - self._ultima_reducao >= self.recente:
+                self.limite = max(self.configuracao.minimo, self.limite * FATOR_REDUCAO)
+                self._ultima_reducao = agora
+                self.reducoes += 1
+        # Só cresce se o limite atual está de fato sendo usado
+        elif em_uso * 2 >= self.limite:
+            self.limite = min(self.configuracao.maximo, self.limite + 1 / self.limite)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "limite": int(self.limite),
+            "em_uso": self.em_uso,
+            "fila": len(self.fila),
+            "aceitas": self.aceitas,
+            "enfileiradas": self.enfileiradas,
+            "recusadas": self.recusadas,
+            "reducoes": self.reducoes,
+            "latencia_recente": self.recente,
+            "latencia_relativa": self.relativa,
+        }
+
+
+# Um limite por classe de rota, por worker
+limites = {classe: LimiteAdaptativo(configuracao) for classe, configuracao in CLASSES.items()}
+
+
+def classificar(metodo: str, caminho: str) -> Optional[str]:
+    """Classe da requisição (leitura, completo, escrita) ou None para rotas sem limite."""
+    if not caminho.startswith(PREFIXOS_LIMITADOS) or caminho.startswith(PREFIXOS_SEM_LIMITE):
+        return None
+    if caminho.rstrip("/").endswith(SUFIXOS_SEM_LIMITE):
+        return None
+    if metodo not in ("GET", "HEAD"):
+        return "escrita"
+    if "complet" in caminho or caminho.rstrip("/").endswith("/relatorio"):
+        return "completo"
+    return "leitura"
+
+
+class MiddlewareLimites:
+    """Middleware ASGI que aplica o limite da classe da rota antes de chegar ao banco.
+
+    Com o Mongo lento, as requisições além do limite esperam pouco e recebem
+    503 com Retry-After, em vez de se acumularem no pool do Motor.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        classe = classificar(scope["method"], scope["path"]) if scope["type"] == "http" and LIMITES_ATIVO else None
+        if classe is None:
+            await self.app(scope, receive, send)
+            return
+
+        limite = limites[classe]
+        try:
+            await limite.reservar()
+        except Sobrecarga:
+            resposta = JSONResponse(
+                {"detail": "Serviço sobrecarregado, tente novamente em instantes"},
+                status_code=503,
+                headers={"Retry-After": RETRY_AFTER},
+            )
+            await resposta(scope, receive, send)
+            return
+
+        status = 500
+        em_uso = limite.em_uso
+        inicio = time.perf_counter()
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            limite.liberar()
+            limite.observar(rota_template(scope), time.perf_counter() - inicio, status >= 500, em_uso)
+
+
+def estatisticas() -> Dict[str, Any]:
+    return {"ativo": LIMITES_ATIVO, **{classe: limite.estatisticas() for classe, limite in limites.items()}}
@@ -0,0 +1,176 @@
+import json
+from collections import Counter
+from contextlib import nullcontext
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from atualizacao import carimbar
+from busca import chaves, registrar_sugestoes
+from cache import referencias
+from models import Cia
+from versoes import versoes
+
+# Quantidade de itens validados e gravados por vez
+TAMANHO_LOTE = 1000
+
+
+async def _linhas_ndjson(request: Request) -> AsyncIterator[bytes]:
+    # Lê o corpo em partes, sem carregar o NDJSON inteiro em memória
+    resto = b""
+    async for parte in request.stream():
+        resto += parte
+        *linhas, resto = resto.split(b"\n")
+        for linha in linhas:
+            if linha.strip():
+                yield linha
+    if resto.strip():
+        yield resto
+
+
+async def _itens(request: Request) -> AsyncIterator[Tuple[Any, Optional[str]]]:
+    """Itens do corpo (array JSON ou NDJSON) com o erro de leitura de cada um."""
+    tipo = request.headers.get("content-type", "")
+    if "ndjson" in tipo or "jsonlines" in tipo:
+        async for linha in _linhas_ndjson(request):
+            try:
+                yield json.loads(linha), None
+            except ValueError as e:
+                yield None, f"JSON inválido: {e}"
+        return
+
+    try:
+        dados = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="O corpo deve ser um array JSON ou NDJSON")
+    if not isinstance(dados, list):
+        raise HTTPException(status_code=400, detail="O corpo deve ser um array JSON ou NDJSON")
+    for item in dados:
+        yield item, None
+
+
+def _mensagem(erro: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(parte) for parte in detalhe['loc'])}: {detalhe['msg']}"
+        for detalhe in erro.errors()
+    )
+
+
+def _documento(model, inst) -> Dict[str, Any]:
+    # Documento já com as chaves de busca, sem precisar de uma segunda gravação
+    doc = carimbar(model, inst.model_dump_doc())
+    doc.update(chaves(model, doc))
+    return doc
+
+
+async def _existentes(engine, model, ids) -> set:
+    # Cache de referências; o que faltar sai em uma única consulta $in por lote
+    return set(await referencias.obter_varios(engine, model, ids))
+
+
+async def _gravar_lote(
+    engine, model, lote, campos_referencia, contador, resultado, validar_lote=None, reservar_lote=None
+) -> None:
+    erros = resultado["erros"]
+
+    validos = []
+    for indice, item in lote:
+        try:
+            validos.append((indice, model.model_validate(item)))
+        except ValidationError as e:
+            erros.append({"indice": indice, "erro": _mensagem(e)})
+
+    for campo, ref_model in campos_referencia.items():
+        existentes = await _existentes(engine, ref_model, {getattr(inst, campo) for _, inst in validos})
+        aceitos = []
+        for indice, inst in validos:
+            if getattr(inst, campo) in existentes:
+                aceitos.append((indice, inst))
+            else:
+                erros.append({"indice": indice, "erro": f"{campo} não encontrado(a)"})
+        validos = aceitos
+
+    if not validos:
+        return
+
+    # A reserva (ex.: agenda das aeronaves) vale da validação do lote até a gravação
+    falhas: Dict[int, str] = {}
+    async with reservar_lote(engine, validos) if reservar_lote else nullcontext():
+        # Validação específica do modelo sobre o lote inteiro (ex.: conflitos de horário)
+        if validar_lote:
+            rejeitados = await validar_lote(engine, validos)
+            for indice, erro in rejeitados.items():
+                erros.append({"indice": indice, "erro": erro})
+            validos = [(indice, inst) for indice, inst in validos if indice not in rejeitados]
+
+        if not validos:
+            return
+
+        # Inserção não ordenada: um documento com erro não interrompe os demais
+        docs = [_documento(model, inst) for _, inst in validos]
+        try:
+            await engine.get_collection(model).insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            for falha in e.details.get("writeErrors", []):
+                falhas[falha["index"]] = falha.get("errmsg", "Erro de gravação")
+
+    inseridos = []
+    for posicao, (indice, inst) in enumerate(validos):
+        if posicao in falhas:
+            erros.append({"indice": indice, "erro": falhas[posicao]})
+        else:
+            inseridos.append(inst)
+    resultado["inseridos"] += len(inseridos)
+    if inseridos:
+        versoes.alterar(model)
+        await registrar_sugestoes(engine, model, [doc for posicao, doc in enumerate(docs) if posicao not in falhas])
+
+    # Contadores da Cia: um $inc por companhia do lote
+    totais = Counter(inst.cia for inst in inseridos)
+    if totais:
+        await engine.get_collection(Cia).bulk_write(
+            [UpdateOne({"_id": cia_id}, {"$inc": {contador: total}}) for cia_id, total in totais.items()],
+            ordered=False,
+        )
+        versoes.alterar(Cia, {contador})
+
+
+async def importar(
+    engine,
+    request: Request,
+    model,
+    campos_referencia: Dict[str, Any],
+    contador: str,
+    tamanho_lote: int = TAMANHO_LOTE,
+    validar_lote=None,
+    reservar_lote=None,
+) -> Dict[str, Any]:
+    """Importa itens em lotes, validando as referências com uma consulta por lote.
+
+    `campos_referencia` mapeia o campo do item para o modelo referenciado e
+    `validar_lote`, se informado, devolve os erros extras por índice do item;
+    `reservar_lote` devolve o contexto que a validação e a gravação do lote ocupam.
+    Devolve o total inserido e os erros por índice do item na entrada.
+    """
+    resultado: Dict[str, Any] = {"inseridos": 0, "erros": []}
+    lote: List[Tuple[int, Any]] = []
+    indice = 0
+
+    async for item, erro in _itens(request):
+        if erro:
+            resultado["erros"].append({"indice": indice, "erro": erro})
+        else:
+            lote.append((indice, item))
+        indice += 1
+        if len(lote) >= tamanho_lote:
+            await _gravar_lote(engine, model, lote, campos_referencia, contador, resultado, validar_lote, reservar_lote)
+            lote = []
+
+    if lote:
+        await _gravar_lote(engine, model, lote, campos_referencia, contador, resultado, validar_lote, reservar_lote)
+
+    resultado["erros"].sort(key=lambda erro: erro["indice"])
+    return resultado
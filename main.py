@@ -1,10 +1,72 @@
-from fastapi import FastAPI
-from routes import aeronave, voo, cia
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from fastapi import FastAPI, Depends
+from routes import aeronave, voo, cia, sistema, analises as rotas_analises
+from database import conectar, desconectar, criar_indices
+from diagnostico import MODO_EXPLAIN, verificar_formas
+from cache import vigiar_invalidacoes
+from versoes import vigiar_alteracoes
+from transmissao import difusor
+from arquivamento import HORIZONTE_ARQUIVO, agendar_arquivamento, criar_indices_arquivo
+from painel import JANELA_PAINEL, agendar_painel, painel
+from analises import INTERVALO_ANALISES, agendar_analises, criar_indices_analises
+from migracoes import migrar
+from limites import MiddlewareLimites
+from metricas import MiddlewareMetricas, marcar_rota, ouvinte_comandos, registrar_rotas
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Um cliente (e um pool) por worker, criado depois do fork
+    engine = await conectar(listeners=[ouvinte_comandos])
+    # Garante os índices declarados em models.py
+    await criar_indices(engine)
+    await criar_indices_arquivo(engine)
+    await criar_indices_analises(engine)
+    # Remove campos e índices de versões anteriores (idempotente)
+    await migrar(engine)
+    # Modo de depuração: avisa sobre consultas que fazem COLLSCAN
+    if MODO_EXPLAIN:
+        await verificar_formas(engine)
+
+    # Painel dos aeroportos: o change stream de voos fica aberto para manter o índice em memória
+    if JANELA_PAINEL:
+        difusor.ouvintes.append(painel.ao_alterar)
+        difusor.manter(engine)
+        await painel.carregar(engine)
+
+    # Invalidação dos caches e das versões (ETags) por alterações de outros workers
+    vigias = [
+        asyncio.create_task(vigiar_invalidacoes(engine)),
+        asyncio.create_task(vigiar_alteracoes(engine)),
+    ]
+    # Voos antigos saem da coleção principal (desligado sem ARQUIVO_HORIZONTE_DIAS)
+    if HORIZONTE_ARQUIVO:
+        vigias.append(asyncio.create_task(agendar_arquivamento(engine)))
+    if JANELA_PAINEL:
+        vigias.append(asyncio.create_task(agendar_painel(engine)))
+    # Visões materializadas de /analises, atualizadas a partir da marca d'água
+    if INTERVALO_ANALISES:
+        vigias.append(asyncio.create_task(agendar_analises(engine)))
+    yield
+    for vigia in vigias:
+        vigia.cancel()
+        with suppress(asyncio.CancelledError):
+            await vigia
+    await difusor.parar()
+    desconectar()
+
 
 # Inicializa o aplicativo FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, dependencies=[Depends(marcar_rota)])
+
+# Limite adaptativo de requisições simultâneas por classe de rota (503 + Retry-After quando cheio)
+app.add_middleware(MiddlewareLimites)
+# Latência por rota e comandos Mongo por requisição (expostos em /metrics); por fora, conta também os 503
+app.add_middleware(MiddlewareMetricas)
 
 # Rotas para Endpoints
-app.include_router(aeronave.router)
-app.include_router(voo.router)
-app.include_router(cia.router)
+for roteador in (aeronave.router, voo.router, cia.router, sistema.router, rotas_analises.router):
+    app.include_router(roteador)
+    # 503 do limite sai antes do roteamento: as métricas acham o template nas rotas registradas
+    registrar_rotas(roteador.routes)
@@ -0,0 +1,270 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import Request
+from pymongo import monitoring
+from starlette.routing import BaseRoute, Match
+
+# Limites dos baldes dos histogramas (segundos)
+LIMITES_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Limites dos baldes de comandos Mongo por requisição
+LIMITES_COMANDOS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+QUANTIS = (0.5, 0.95, 0.99)
+
+SEM_ROTA = "-"
+# Caminho que não corresponde a nenhuma rota da aplicação
+NAO_ENCONTRADA = "nao_encontrada"
+
+# Rotas dos routers incluídos no app (main.py), para achar o template sem passar pelo roteamento
+_rotas: List[BaseRoute] = []
+
+
+def registrar_rotas(rotas: Iterable[BaseRoute]) -> None:
+    _rotas.extend(rotas)
+
+
+class Histograma:
+    def __init__(self, limites: Tuple[float, ...] = LIMITES_LATENCIA):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float) -> None:
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    def quantil(self, q: float) -> float:
+        """Estimativa por interpolação linear dentro do balde (como histogram_quantile)."""
+        if not self.total:
+            return 0.0
+        alvo = q * self.total
+        acumulado = 0
+        for posicao, contagem in enumerate(self.contagens):
+            if acumulado + contagem >= alvo and contagem:
+                if posicao == len(self.limites):
+                    return self.limites[-1]
+                inicio = self.limites[posicao - 1] if posicao else 0.0
+                fim = self.limites[posicao]
+                return inicio + (fim - inicio) * (alvo - acumulado) / contagem
+            acumulado += contagem
+        return self.limites[-1]
+
+
+class EstadoRequisicao:
+    """Comandos Mongo emitidos durante uma requisição (compartilhado via contextvar)."""
+
+    __slots__ = ("rota", "comandos")
+
+    def __init__(self):
+        self.rota = SEM_ROTA
+        self.comandos = 0
+
+
+# O Motor copia o contexto para as threads do executor, então o listener enxerga a requisição
+requisicao_atual: ContextVar[Optional[EstadoRequisicao]] = ContextVar("requisicao_atual", default=None)
+
+
+def _rota() -> str:
+    estado = requisicao_atual.get()
+    return estado.rota if estado is not None else SEM_ROTA
+
+
+async def marcar_rota(request: Request) -> None:
+    """Dependência global: registra o template da rota (ex.: /voos/{id}) antes do handler."""
+    estado = requisicao_atual.get()
+    rota = request.scope.get("route")
+    if estado is not None and rota is not None:
+        estado.rota = rota.path
+
+
+def rota_template(scope) -> str:
+    """Template da rota da requisição, mesmo sem ela ter passado pelo roteamento.
+
+    Respostas dadas antes do roteamento (ex.: 503 do MiddlewareLimites) não
+    têm scope["route"]; a rota é então procurada nas rotas registradas,
+    como o roteador faria.
+    """
+    rota = scope.get("route")
+    if rota is not None:
+        return rota.path
+    parcial = None
+    for candidata in _rotas:
+        correspondencia, _ = candidata.matches(scope)
+        if correspondencia == Match.FULL:
+            return candidata.path
+        if correspondencia == Match.PARTIAL and parcial is None:
+            # Caminho certo com outro método (405)
+            parcial = candidata.path
+    return parcial or NAO_ENCONTRADA
+
+
+class Metricas:
+    """Contadores e histogramas em memória por worker.
+
+    O listener do pymongo roda nas threads do executor do Motor, por isso
+    toda escrita passa por um lock (operações curtas, sem I/O).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requisicoes: Dict[Tuple[str, str, int], int] = {}
+        self.latencia: Dict[str, Histograma] = {}
+        self.comandos_por_requisicao: Dict[str, Histograma] = {}
+        self.mongo_comandos: Dict[Tuple[str, str], int] = {}
+        self.mongo_falhas: Dict[Tuple[str, str], int] = {}
+        self.mongo_documentos: Dict[Tuple[str, str], int] = {}
+        self.mongo_latencia: Dict[Tuple[str, str], Histograma] = {}
+
+    def registrar_requisicao(self, metodo: str, rota: str, status: int, duracao: float, comandos: int) -> None:
+        with self._lock:
+            chave = (metodo, rota, status)
+            self.requisicoes[chave] = self.requisicoes.get(chave, 0) + 1
+            self.latencia.setdefault(rota, Histograma()).observar(duracao)
+            self.comandos_por_requisicao.setdefault(rota, Histograma(LIMITES_COMANDOS)).observar(comandos)
+
+    def registrar_comando(self, rota: str, comando: str, duracao: float, documentos: int, falhou: bool) -> None:
+        chave = (rota, comando)
+        with self._lock:
+            self.mongo_comandos[chave] = self.mongo_comandos.get(chave, 0) + 1
+            self.mongo_latencia.setdefault(chave, Histograma()).observar(duracao)
+            if documentos:
+                self.mongo_documentos[chave] = self.mongo_documentos.get(chave, 0) + documentos
+            if falhou:
+                self.mongo_falhas[chave] = self.mongo_falhas.get(chave, 0) + 1
+
+    def exportar(self) -> str:
+        """Texto no formato de exposição do Prometheus."""
+        with self._lock:
+            linhas: List[str] = []
+            _contador(linhas, "http_requests_total", "Requisições HTTP por rota e status", {
+                (("method", m), ("route", r), ("status", str(s))): v for (m, r, s), v in self.requisicoes.items()
+            })
+            _histogramas(linhas, "http_request_duration_seconds", "Latência das requisições HTTP", {
+                (("route", r),): h for r, h in self.latencia.items()
+            })
+            _histogramas(linhas, "http_request_mongo_commands", "Comandos Mongo por requisição", {
+                (("route", r),): h for r, h in self.comandos_por_requisicao.items()
+            })
+            _contador(linhas, "mongo_commands_total", "Comandos Mongo por rota", {
+                (("route", r), ("command", c)): v for (r, c), v in self.mongo_comandos.items()
+            })
+            _contador(linhas, "mongo_command_failures_total", "Comandos Mongo com falha por rota", {
+                (("route", r), ("command", c)): v for (r, c), v in self.mongo_falhas.items()
+            })
+            _contador(linhas, "mongo_documents_returned_total", "Documentos devolvidos pelo Mongo por rota", {
+                (("route", r), ("command", c)): v for (r, c), v in self.mongo_documentos.items()
+            })
+            _histogramas(linhas, "mongo_command_duration_seconds", "Latência dos comandos Mongo", {
+                (("route", r), ("command", c)): h for (r, c), h in self.mongo_latencia.items()
+            })
+        return "\n".join(linhas) + "\n"
+
+
+def _rotulos(pares) -> str:
+    valores = ",".join(
+        f'{nome}="{str(valor).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), " ")}"'
+        for nome, valor in pares
+    )
+    return "{" + valores + "}" if valores else ""
+
+
+def _contador(linhas: List[str], nome: str, ajuda: str, series) -> None:
+    linhas.append(f"# HELP {nome} {ajuda}")
+    linhas.append(f"# TYPE {nome} counter")
+    for rotulos, valor in sorted(series.items()):
+        linhas.append(f"{nome}{_rotulos(rotulos)} {valor}")
+
+
+def _histogramas(linhas: List[str], nome: str, ajuda: str, series) -> None:
+    linhas.append(f"# HELP {nome} {ajuda}")
+    linhas.append(f"# TYPE {nome} histogram")
+    for rotulos, histograma in sorted(series.items()):
+        acumulado = 0
+        for limite, contagem in zip(histograma.limites, histograma.contagens):
+            acumulado += contagem
+            linhas.append(f"{nome}_bucket{_rotulos(rotulos + (('le', repr(float(limite))),))} {acumulado}")
+        linhas.append(f"{nome}_bucket{_rotulos(rotulos + (('le', '+Inf'),))} {histograma.total}")
+        linhas.append(f"{nome}_sum{_rotulos(rotulos)} {histograma.soma}")
+        linhas.append(f"{nome}_count{_rotulos(rotulos)} {histograma.total}")
+
+    # p50/p95/p99 já calculados, para quem lê o endpoint sem Prometheus
+    linhas.append(f"# HELP {nome}_quantile {ajuda} (quantis estimados dos baldes)")
+    linhas.append(f"# TYPE {nome}_quantile gauge")
+    for rotulos, histograma in sorted(series.items()):
+        for q in QUANTIS:
+            linhas.append(f"{nome}_quantile{_rotulos(rotulos + (('quantile', str(q)),))} {histograma.quantil(q)}")
+
+
+# Instância única por worker
+metricas = Metricas()
+
+
+def _documentos(resposta) -> int:
+    cursor = resposta.get("cursor") if isinstance(resposta, dict) else None
+    if cursor:
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    return resposta.get("n", 0) if isinstance(resposta, dict) else 0
+
+
+class OuvinteComandos(monitoring.CommandListener):
+    """Atribui cada comando Mongo à rota da requisição em andamento."""
+
+    def started(self, event):
+        estado = requisicao_atual.get()
+        if estado is not None:
+            estado.comandos += 1
+
+    def succeeded(self, event):
+        metricas.registrar_comando(
+            _rota(), event.command_name, event.duration_micros / 1e6, _documentos(event.reply), False
+        )
+
+    def failed(self, event):
+        metricas.registrar_comando(_rota(), event.command_name, event.duration_micros / 1e6, 0, True)
+
+
+ouvinte_comandos = OuvinteComandos()
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI que mede a latência e os comandos Mongo de cada requisição.
+
+    A rota é identificada pelo template (ex.: /voos/{id}) para não explodir a
+    cardinalidade; a medição inclui o envio do corpo de respostas em streaming.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        estado = EstadoRequisicao()
+        token = requisicao_atual.set(estado)
+        status = 500
+        inicio = time.perf_counter()
+
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            metricas.registrar_requisicao(
+                scope["method"],
+                rota_template(scope),
+                status,
+                time.perf_counter() - inicio,
+                estado.comandos,
+            )
+            requisicao_atual.reset(token)
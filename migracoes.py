@@ -0,0 +1,121 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List
+
+from pymongo.errors import OperationFailure
+
+from busca import reindexar_todos
+import conflitos
+from contadores import recalcular
+from models import Aeronave, Cia, Voo
+import tarefas
+
+logger = logging.getLogger(__name__)
+
+# Listas de ids que os documentos antigos carregavam; os relacionamentos saem do campo 'cia'
+# (e 'aeronave') dos documentos filhos, pelos índices
+CAMPOS_REMOVIDOS = {Cia: ["aeronaves", "voos"], Aeronave: ["voos"]}
+
+# Índices de versões anteriores, trocados por compostos que também cobrem a ordenação
+# (listas da companhia, cursores por _id, conflitos de horário). Cada um é prefixo de
+# um índice atual: não atende consulta nenhuma a mais e ainda custa em toda gravação
+INDICES_SUBSTITUIDOS = {
+    Cia: ["cod_iata"],  # cod_iata_id
+    Aeronave: ["cia"],  # cia_id
+    Voo: ["cia_hr_partida", "aeronave_hr_partida", "hr_partida"],  # cia_hr_partida_id, aeronave_hr_partida_hr_chegada, hr_partida_id
+}
+
+CODIGO_INDICE_INEXISTENTE = 27
+
+# Marcadores das migrações de dados que rodam uma única vez por banco
+COLECAO_MIGRACOES = "migracoes"
+MIGRACAO_CONTADORES = "contadores_cia"
+MIGRACAO_BUSCA = "chaves_busca"
+MIGRACAO_DURACAO = "duracao_voos"
+# Guardado no marcador da MIGRACAO_DURACAO e lido a cada inicialização
+MAIOR_DURACAO = "maior_duracao_segundos"
+# Prazo da reserva de uma migração: outro worker só a assume se esta inicialização cair no meio
+RESERVA_MIGRACAO = 3600
+
+
+async def remover_listas_embutidas(engine) -> Dict[str, int]:
+    """Apaga os arrays de ids embutidos; idempotente (só toca documentos que ainda os têm)."""
+    alterados = {}
+    for model, campos in CAMPOS_REMOVIDOS.items():
+        resultado = await engine.get_collection(model).update_many(
+            {"$or": [{campo: {"$exists": True}} for campo in campos]},
+            {"$unset": {campo: "" for campo in campos}},
+        )
+        alterados[model.__collection__] = resultado.modified_count
+    return alterados
+
+
+async def remover_indices_substituidos(engine) -> List[str]:
+    removidos = []
+    for model, nomes in INDICES_SUBSTITUIDOS.items():
+        colecao = engine.get_collection(model)
+        existentes = await colecao.index_information()
+        for nome in nomes:
+            if nome not in existentes:
+                continue
+            try:
+                await colecao.drop_index(nome)
+            except OperationFailure as e:
+                # Outro worker removeu primeiro
+                if e.code != CODIGO_INDICE_INEXISTENTE:
+                    raise
+            removidos.append(f"{model.__collection__}.{nome}")
+    return removidos
+
+
+async def executar_uma_vez(engine, nome: str, passo: Callable[..., Awaitable]) -> bool:
+    """Roda `passo` se o marcador `nome` ainda não existe; o marcador só é gravado depois do passo.
+
+    Um passo interrompido roda de novo na próxima inicialização, então ele
+    precisa ser idempotente. Entre workers que sobem juntos, só quem tem a
+    reserva executa; os demais seguem sem esperar.
+    """
+    marcadores = engine.database[COLECAO_MIGRACOES]
+    if await marcadores.find_one({"_id": nome}):
+        return False
+    tarefa = f"migracao_{nome}"
+    if not await tarefas.reservar(engine, tarefa, RESERVA_MIGRACAO):
+        return False
+    try:
+        await passo(engine)
+        await marcadores.update_one({"_id": nome}, {"$set": {"executada_em": datetime.utcnow()}}, upsert=True)
+    finally:
+        await tarefas.liberar(engine, tarefa)
+    return True
+
+
+async def medir_voos_longos(engine) -> None:
+    """Grava no marcador a duração do voo mais longo; voos de antes do limite de duração podem passar dele."""
+    maior = await conflitos.maior_duracao(engine)
+    if maior is not None:
+        await engine.database[COLECAO_MIGRACOES].update_one(
+            {"_id": MIGRACAO_DURACAO}, {"$set": {MAIOR_DURACAO: maior.total_seconds()}}, upsert=True
+        )
+
+
+async def migrar(engine) -> None:
+    """Migrações de esquema da inicialização, depois de criar os índices novos."""
+    alterados = await remover_listas_embutidas(engine)
+    if any(alterados.values()):
+        logger.info("Listas de ids embutidas removidas: %s", alterados)
+    removidos = await remover_indices_substituidos(engine)
+    if removidos:
+        logger.info("Índices substituídos removidos: %s", ", ".join(removidos))
+    # Chaves de busca e sugestões dos documentos gravados antes delas existirem
+    if await executar_uma_vez(engine, MIGRACAO_BUSCA, reindexar_todos):
+        logger.info("Chaves de busca preenchidas nos documentos existentes")
+    # Contadores materializados das companhias que existiam antes deles
+    if await executar_uma_vez(engine, MIGRACAO_CONTADORES, recalcular):
+        logger.info("Contadores das companhias recalculados")
+    # Voos antigos mais longos que o máximo continuam visíveis para a verificação de conflitos
+    await executar_uma_vez(engine, MIGRACAO_DURACAO, medir_voos_longos)
+    marcador = await engine.database[COLECAO_MIGRACOES].find_one({"_id": MIGRACAO_DURACAO}) or {}
+    if marcador.get(MAIOR_DURACAO):
+        conflitos.ampliar_alcance(timedelta(seconds=marcador[MAIOR_DURACAO]))
+    if conflitos.ALCANCE_SOBREPOSICAO > conflitos.DURACAO_MAXIMA_VOO:
+        logger.warning("Há voos mais longos que o máximo; conflitos conferidos até %s antes da partida", conflitos.ALCANCE_SOBREPOSICAO)
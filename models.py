@@ -1,13 +1,24 @@
-from odmantic import Model, Reference, Field, ObjectId
-from typing import List, Optional
+from odmantic import Model, Reference, Field, ObjectId, Index
+from pydantic import BaseModel, model_validator
+from typing import Optional
 from datetime import datetime
 
 # Modelo de Companhia Aérea (Cia)
 class Cia(Model):
     nome: str
     cod_iata: str
-    aeronaves: List[ObjectId] = Field(default_factory=list)  # Armazena apenas IDs
-    voos: List[ObjectId] = Field(default_factory=list)  # Armazena apenas IDs
+    # Contadores mantidos pelas rotas de criação/remoção (ver contadores.py)
+    total_aeronaves: int = 0
+    total_voos: int = 0
+    versao: int = 0  # incrementada a cada atualização (If-Match/ETag)
+
+    # Índices criados na inicialização (database.criar_indices)
+    model_config = {
+        "indexes": lambda: [
+            Index(Cia.nome, Cia.id, name="nome_id"),  # ordenação/cursor por nome
+            Index(Cia.cod_iata, Cia.id, name="cod_iata_id"),
+        ]
+    }
 
 # Modelo de Aeronave
 class Aeronave(Model):
@@ -16,7 +27,15 @@ class Aeronave(Model):
     last_check: datetime = Field(default_factory=datetime.utcnow)
     next_check: datetime = Field(default_factory=datetime.utcnow)
     cia: ObjectId  # Referência para Companhia Aérea
-    voos: Optional[List[ObjectId]] = []  # Lista de referências para Voo
+    versao: int = 0  # incrementada a cada atualização (If-Match/ETag)
+
+    model_config = {
+        "indexes": lambda: [
+            Index(Aeronave.cia, Aeronave.id, name="cia_id"),  # filtros, contagem e aeronaves da companhia em ordem de _id
+            Index(Aeronave.last_check, name="last_check"),
+            Index(Aeronave.next_check, name="next_check"),
+        ]
+    }
 
 # Modelo de Voo
 class Voo(Model):
@@ -28,13 +47,47 @@ class Voo(Model):
     status: str
     aeronave: ObjectId  # Relação com Aeronave
     cia: ObjectId  # Relação com Cia
+    versao: int = 0  # incrementada a cada atualização (If-Match/ETag)
+    atualizado_em: Optional[datetime] = None  # última gravação (UTC); ausente em voos antigos
+
+    model_config = {
+        "indexes": lambda: [
+            Index(Voo.cia, Voo.hr_partida, Voo.id, name="cia_hr_partida_id"),  # voos da companhia por data; também atende contagem por cia
+            Index(Voo.aeronave, Voo.hr_partida, Voo.hr_chegada, name="aeronave_hr_partida_hr_chegada"),  # conflitos de horário
+            Index(Voo.hr_partida, Voo.id, name="hr_partida_id"),  # intervalo de datas e ordenação em /voos/filtros
+            Index(Voo.hr_chegada, Voo.id, name="hr_chegada_id"),
+            Index(Voo.numero_voo, Voo.id, name="numero_voo_id"),
+            Index(Voo.atualizado_em, Voo.id, name="atualizado_em_id"),  # alterações recentes (stream sem change stream)
+        ]
+    }
+
+# Atualizações parciais (PATCH): só os campos enviados são alterados
+class Parcial(BaseModel):
+    # Campo omitido fica como está; enviado como null seria gravado e o documento deixaria de carregar no modelo
+    @model_validator(mode="after")
+    def recusar_nulos(self):
+        nulos = sorted(campo for campo in self.model_fields_set if getattr(self, campo) is None)
+        if nulos:
+            raise ValueError(f"Campos não podem ser nulos: {', '.join(nulos)}")
+        return self
+
+class CiaParcial(Parcial):
+    nome: Optional[str] = None
+    cod_iata: Optional[str] = None
 
-# Resolver referências circulares
-Aeronave.model_rebuild()
-Voo.model_rebuild()
-Cia.model_rebuild()
+class AeronaveParcial(Parcial):
+    modelo: Optional[str] = None
+    capacidade: Optional[int] = None
+    last_check: Optional[datetime] = None
+    next_check: Optional[datetime] = None
+    cia: Optional[ObjectId] = None
 
-# Resolver referências circulares
-Cia.update_forward_refs()
-Aeronave.update_forward_refs()
-Voo.update_forward_refs()
\ No newline at end of file
+class VooParcial(Parcial):
+    numero_voo: Optional[int] = None
+    origem: Optional[str] = None
+    destino: Optional[str] = None
+    hr_partida: Optional[datetime] = None
+    hr_chegada: Optional[datetime] = None
+    status: Optional[str] = None
+    aeronave: Optional[ObjectId] = None
+    cia: Optional[ObjectId] = None
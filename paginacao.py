@@ -0,0 +1,188 @@
+import base64
+import binascii
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import json_util
+from fastapi import HTTPException, Response
+from odmantic import query
+
+# Cabeçalho com o cursor da próxima página (modo keyset)
+CABECALHO_CURSOR = "X-Next-Cursor"
+
+
+def validar_ordenacao(ordenacao: Optional[str], permitidos) -> str:
+    """Campo de ordenação aceito pela rota; sem ordenação a página segue o _id."""
+    if not ordenacao:
+        return "_id"
+    if ordenacao not in permitidos:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Ordenação inválida, use um de: {', '.join(sorted(permitidos))}",
+        )
+    return ordenacao
+
+
+def codificar_cursor(campo: str, valor: Any, ultimo_id, decrescente: bool) -> str:
+    """Gera um cursor opaco com a posição do último item da página."""
+    conteudo = json_util.dumps({"c": campo, "v": valor, "id": ultimo_id, "d": decrescente})
+    return base64.urlsafe_b64encode(conteudo.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str, campo: str, decrescente: bool) -> Dict[str, Any]:
+    try:
+        preenchimento = "=" * (-len(cursor) % 4)
+        dados = json_util.loads(base64.urlsafe_b64decode(cursor + preenchimento))
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+    # O cursor só vale para a mesma ordenação em que foi gerado
+    if not isinstance(dados, dict) or dados.get("c") != campo or dados.get("d") != decrescente:
+        raise HTTPException(status_code=400, detail="Cursor não corresponde à ordenação pedida")
+    return dados
+
+
+def filtro_cursor(campo: str, dados: Dict[str, Any], decrescente: bool) -> Dict[str, Any]:
+    """Condição "depois do último item" sobre (campo, _id), atendida pelo índice."""
+    operador = "$lt" if decrescente else "$gt"
+    if campo == "_id":
+        return {"_id": {operador: dados["id"]}}
+    return {
+        "$or": [
+            {campo: {operador: dados["v"]}},
+            {campo: dados["v"], "_id": {operador: dados["id"]}},
+        ]
+    }
+
+
+def combinar_filtros(filtros: Optional[Dict[str, Any]], extra: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not extra:
+        return filtros or {}
+    if not filtros:
+        return extra
+    return {"$and": [filtros, extra]}
+
+
+def ordenacao_mongo(campo: str, decrescente: bool) -> List[Tuple[str, int]]:
+    direcao = -1 if decrescente else 1
+    if campo == "_id":
+        return [("_id", direcao)]
+    return [(campo, direcao), ("_id", direcao)]
+
+
+def ordenacao_odmantic(model, campo: str, decrescente: bool):
+    direcao = query.desc if decrescente else query.asc
+    proxies = [getattr(model, "id")]
+    if campo != "_id":
+        proxies.insert(0, getattr(model, campo))
+    return tuple(direcao(proxy) for proxy in proxies)
+
+
+def proximo_cursor(itens: List[Any], limit: int, campo: str, decrescente: bool) -> Optional[str]:
+    # Página incompleta significa que não há mais itens
+    if not itens or len(itens) < limit:
+        return None
+    ultimo = itens[-1]
+    if isinstance(ultimo, dict):
+        valor = ultimo.get(campo)
+        ultimo_id = ultimo["_id"]
+    else:
+        valor = getattr(ultimo, "id" if campo == "_id" else campo)
+        ultimo_id = ultimo.id
+    return codificar_cursor(campo, None if campo == "_id" else valor, ultimo_id, decrescente)
+
+
+def definir_cursor(response: Response, cursor: Optional[str]) -> None:
+    if cursor:
+        response.headers[CABECALHO_CURSOR] = cursor
+
+
+def _preparar(filtros, offset: int, cursor: Optional[str], ordenacao: str, decrescente: bool):
+    # Com cursor o offset é ignorado e a consulta começa depois do último item visto
+    if cursor:
+        dados = decodificar_cursor(cursor, ordenacao, decrescente)
+        return combinar_filtros(filtros, filtro_cursor(ordenacao, dados, decrescente)), 0
+    return filtros or {}, offset
+
+
+async def paginar(
+    engine,
+    model,
+    filtros: Optional[Dict[str, Any]],
+    limit: int,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    ordenacao: str = "_id",
+    decrescente: bool = False,
+) -> Tuple[list, Optional[str]]:
+    """Busca uma página por keyset (cursor) ou, por compatibilidade, por offset.
+
+    Com `cursor` o offset é ignorado e a consulta começa direto depois do
+    último item visto, então a página 10.000 custa o mesmo que a primeira.
+    """
+    filtros, offset = _preparar(filtros, offset, cursor, ordenacao, decrescente)
+
+    itens = await engine.find(
+        model,
+        filtros,
+        sort=ordenacao_odmantic(model, ordenacao, decrescente),
+        skip=offset,
+        limit=limit,
+    )
+    return itens, proximo_cursor(itens, limit, ordenacao, decrescente)
+
+
+async def paginar_documentos(
+    engine,
+    model,
+    filtros: Optional[Dict[str, Any]],
+    limit: int,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    ordenacao: str = "_id",
+    decrescente: bool = False,
+    projecao: Optional[Dict[str, int]] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Mesma paginação de `paginar`, mas devolve os documentos crus do Motor (sem hidratar)."""
+    filtros, offset = _preparar(filtros, offset, cursor, ordenacao, decrescente)
+
+    busca = (
+        engine.get_collection(model)
+        .find(filtros, projecao)
+        .sort(ordenacao_mongo(ordenacao, decrescente))
+        .skip(offset)
+        .limit(limit)
+    )
+    docs = await busca.to_list(length=limit)
+    return docs, proximo_cursor(docs, limit, ordenacao, decrescente)
+
+
+async def paginar_com_arquivo(
+    engine,
+    model,
+    arquivo: str,
+    filtros: Optional[Dict[str, Any]],
+    limit: int,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    ordenacao: str = "_id",
+    decrescente: bool = False,
+    projecao: Optional[Dict[str, int]] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Mesma paginação de `paginar_documentos`, somando a coleção `arquivo` ($unionWith).
+
+    Cada coleção já entrega só as primeiras offset + limit linhas pela própria
+    ordenação indexada; apenas essas linhas são reordenadas juntas.
+    """
+    filtros, offset = _preparar(filtros, offset, cursor, ordenacao, decrescente)
+
+    ordem = dict(ordenacao_mongo(ordenacao, decrescente))
+    ramo: List[Dict[str, Any]] = [{"$match": filtros}, {"$sort": ordem}, {"$limit": offset + limit}]
+    if projecao:
+        ramo.append({"$project": projecao})
+    pipeline = ramo + [{"$unionWith": {"coll": arquivo, "pipeline": ramo}}, {"$sort": ordem}]
+    if offset:
+        pipeline.append({"$skip": offset})
+    pipeline.append({"$limit": limit})
+
+    docs = await engine.get_collection(model).aggregate(pipeline).to_list(length=limit)
+    return docs, proximo_cursor(docs, limit, ordenacao, decrescente)
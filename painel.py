@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import os
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo.errors import PyMongoError
+
+from atualizacao import VERSAO
+from conflitos import instante
+from models import Voo
+from serializacao import documento
+
+logger = logging.getLogger(__name__)
+
+JANELA_PAINEL = float(os.getenv("PAINEL_JANELA_HORAS", "24"))  # horas à frente mantidas em memória; 0 desliga
+PASSADO_PAINEL = float(os.getenv("PAINEL_PASSADO_HORAS", "2"))  # horas para trás (partidas e chegadas recentes)
+RECARGA_PAINEL = float(os.getenv("PAINEL_RECARGA", "600"))  # segundos entre recargas completas
+
+PARTIDAS = "partidas"
+CHEGADAS = "chegadas"
+
+Chave = Tuple[datetime, ObjectId]
+
+
+@dataclass
+class Entrada:
+    versao: int
+    origem: Optional[str]
+    partida: Optional[Chave]
+    destino: Optional[str]
+    chegada: Optional[Chave]
+    voo: Dict[str, Any]  # já no formato da resposta
+
+
+def _aeroporto(codigo) -> str:
+    return str(codigo or "").strip().upper()
+
+
+class Painel:
+    """Índice em memória dos voos próximos por aeroporto, ordenado por horário.
+
+    Cada aeroporto tem uma lista de partidas (hr_partida, _id) e outra de
+    chegadas (hr_chegada, _id), mantidas ordenadas com bisect: a consulta do
+    painel é uma busca binária e uma fatia, sem ir ao banco. A janela é
+    recarregada periodicamente (avança com o relógio e corrige remoções não
+    notificadas); entre recargas, as rotas de escrita e o change stream
+    aplicam as alterações. A versão do voo descarta eventos fora de ordem.
+    """
+
+    def __init__(self, janela: timedelta = timedelta(hours=JANELA_PAINEL), passado: timedelta = timedelta(hours=PASSADO_PAINEL)):
+        self.janela = janela
+        self.passado = passado
+        self.carregado_em: Optional[datetime] = None
+        self.inicio: Optional[datetime] = None
+        self.fim: Optional[datetime] = None
+        self.recargas = 0
+        self.eventos = 0
+        self._voos: Dict[ObjectId, Entrada] = {}
+        self._partidas: Dict[str, List[Chave]] = {}
+        self._chegadas: Dict[str, List[Chave]] = {}
+        self._removidos: set = set()
+        # Eventos recebidos durante uma recarga, reaplicados sobre o índice novo
+        self._pendentes: Optional[List[Tuple[str, Any]]] = None
+
+    def _na_janela(self, instante) -> bool:
+        return isinstance(instante, datetime) and self.inicio <= instante <= self.fim
+
+    def _retirar(self, voo_id) -> None:
+        entrada = self._voos.pop(voo_id, None)
+        if entrada is None:
+            return
+        for indice, aeroporto, chave in (
+            (self._partidas, entrada.origem, entrada.partida),
+            (self._chegadas, entrada.destino, entrada.chegada),
+        ):
+            if chave is None:
+                continue
+            lista = indice[aeroporto]
+            posicao = bisect_left(lista, chave)
+            if posicao < len(lista) and lista[posicao] == chave:
+                del lista[posicao]
+            if not lista:
+                del indice[aeroporto]
+
+    def _colocar(self, doc: Dict[str, Any]) -> None:
+        voo_id = doc["_id"]
+        atual = self._voos.get(voo_id)
+        versao = doc.get(VERSAO, 0)
+        if voo_id in self._removidos or (atual is not None and versao < atual.versao):
+            return
+        self._retirar(voo_id)
+
+        doc = {campo: instante(valor) if isinstance(valor, datetime) else valor for campo, valor in doc.items()}
+        partida, chegada = doc.get("hr_partida"), doc.get("hr_chegada")
+        if not (self._na_janela(partida) or self._na_janela(chegada)):
+            return
+        entrada = Entrada(versao, _aeroporto(doc.get("origem")), None, _aeroporto(doc.get("destino")), None, documento(Voo, doc))
+        if self._na_janela(partida):
+            entrada.partida = (partida, voo_id)
+            insort(self._partidas.setdefault(entrada.origem, []), entrada.partida)
+        if self._na_janela(chegada):
+            entrada.chegada = (chegada, voo_id)
+            insort(self._chegadas.setdefault(entrada.destino, []), entrada.chegada)
+        self._voos[voo_id] = entrada
+
+    def aplicar(self, doc: Dict[str, Any]) -> None:
+        """Voo criado ou alterado (documento do banco ou `model_dump_doc()` do modelo)."""
+        self.eventos += 1
+        if self._pendentes is not None:
+            self._pendentes.append(("aplicar", doc))
+        if self.carregado_em is not None:
+            self._colocar(doc)
+
+    def remover(self, voo_id) -> None:
+        self.eventos += 1
+        if self._pendentes is not None:
+            self._pendentes.append(("remover", voo_id))
+        if self.carregado_em is not None:
+            self._removidos.add(voo_id)
+            self._retirar(voo_id)
+
+    def ao_alterar(self, operacao: str, doc: Optional[Dict[str, Any]], voo_id) -> None:
+        """Ouvinte do change stream de voos (ver `transmissao.difusor`)."""
+        if operacao == "delete":
+            self.remover(voo_id)
+        elif doc is not None:
+            self.aplicar(doc)
+
+    async def carregar(self, engine) -> int:
+        """Monta um índice novo para a janela a partir de agora e troca pelo atual."""
+        agora = datetime.utcnow()
+        # Vai até a próxima recarga, para a janela pedida estar sempre coberta
+        inicio, fim = agora - self.passado, agora + self.janela + timedelta(seconds=RECARGA_PAINEL)
+        novo = Painel(self.janela, self.passado)
+        novo.inicio, novo.fim = inicio, fim
+
+        self._pendentes = []
+        try:
+            filtro = {"$or": [{"hr_partida": {"$gte": inicio, "$lte": fim}}, {"hr_chegada": {"$gte": inicio, "$lte": fim}}]}
+            async for doc in engine.get_collection(Voo).find(filtro):
+                novo._colocar(doc)
+            for operacao, valor in self._pendentes:
+                if operacao == "aplicar":
+                    novo._colocar(valor)
+                else:
+                    novo._removidos.add(valor)
+                    novo._retirar(valor)
+        finally:
+            pendentes, self._pendentes = self._pendentes, None
+
+        self._voos, self._partidas, self._chegadas = novo._voos, novo._partidas, novo._chegadas
+        # Ids removidos durante a carga ainda podem chegar atrasados; os anteriores já saíram do banco
+        self._removidos = {valor for operacao, valor in pendentes if operacao == "remover"}
+        self.inicio, self.fim = inicio, fim
+        self.carregado_em = agora
+        self.recargas += 1
+        return len(self._voos)
+
+    def consultar(self, aeroporto: str, tipo: str, inicio: datetime, fim: datetime, limit: int) -> List[Dict[str, Any]]:
+        if self.carregado_em is None:
+            raise HTTPException(status_code=503, detail="Painel ainda não carregado", headers={"Retry-After": "5"})
+        inicio, fim = instante(inicio), instante(fim)
+        # Fora da janela em memória a resposta sairia incompleta
+        if inicio < self.inicio or fim > self.fim:
+            raise HTTPException(status_code=400, detail=f"Intervalo fora da janela do painel ({self.inicio.isoformat()} a {self.fim.isoformat()})")
+        lista = (self._partidas if tipo == PARTIDAS else self._chegadas).get(_aeroporto(aeroporto), [])
+        resultado = []
+        primeiro = bisect_left(lista, (inicio,))
+        for posicao in range(primeiro, min(len(lista), primeiro + limit)):
+            horario, voo_id = lista[posicao]
+            if horario > fim:
+                break
+            resultado.append(self._voos[voo_id].voo)
+        return resultado
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "carregado_em": self.carregado_em,
+            "inicio": self.inicio,
+            "fim": self.fim,
+            "voos": len(self._voos),
+            "aeroportos": len(self._partidas.keys() | self._chegadas.keys()),
+            "recargas": self.recargas,
+            "eventos": self.eventos,
+        }
+
+
+# Instância única por worker
+painel = Painel()
+
+
+async def agendar_painel(engine) -> None:
+    """Recarrega a janela periodicamente (a primeira carga é feita na inicialização)."""
+    while True:
+        await asyncio.sleep(RECARGA_PAINEL)
+        try:
+            total = await painel.carregar(engine)
+            logger.debug("Painel recarregado: %d voos", total)
+        except PyMongoError as e:
+            logger.warning("Falha ao recarregar o painel (%s); mantendo o índice atual", e)
@@ -0,0 +1,132 @@
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+from fastapi import HTTPException
+
+from models import Aeronave, Cia, Voo
+
+try:
+    import numpy as np
+except ImportError:  # numpy é opcional (extra "relatorios"); sem ele a rota responde 503
+    np = None
+
+# Voos lidos por vez do cursor; a memória do relatório fica limitada a um lote mais os totais
+TAMANHO_LOTE_RELATORIO = int(os.getenv("RELATORIO_TAMANHO_LOTE", "50000"))
+
+MS_POR_HORA = 3_600_000
+MS_POR_DIA = 24 * MS_POR_HORA
+
+
+def _exigir_numpy() -> None:
+    if np is None:
+        raise HTTPException(status_code=503, detail="Relatório indisponível: instale o extra 'relatorios' (numpy)")
+
+
+def _datas(valores) -> "np.ndarray":
+    return np.array(valores, dtype="datetime64[ms]")
+
+
+async def relatorio_frota(engine, dias: int, limit: int, tamanho_lote: int = TAMANHO_LOTE_RELATORIO) -> Dict[str, Any]:
+    """Manutenções a vencer e horas de bloco por aeronave e por companhia desde o último check.
+
+    Os voos vêm só com as colunas usadas, em lotes grandes do cursor, e são
+    convertidos em arrays: durações, filtros e somas por aeronave/companhia
+    são operações vetorizadas do numpy (np.bincount), sem laço por voo além
+    da tradução do ObjectId para a posição no array. As horas por companhia
+    usam a companhia do voo.
+    """
+    _exigir_numpy()
+    inicio_execucao = time.perf_counter()
+    agora = datetime.utcnow()
+    agora_ms = np.datetime64(agora, "ms").astype(np.int64)
+
+    aeronaves = await engine.get_collection(Aeronave).find(
+        {}, {"modelo": 1, "cia": 1, "last_check": 1, "next_check": 1}
+    ).to_list(length=None)
+    cias = await engine.get_collection(Cia).find({}, {"nome": 1}).to_list(length=None)
+
+    posicao_aeronave = {doc["_id"]: posicao for posicao, doc in enumerate(aeronaves)}
+    posicao_cia = {doc["_id"]: posicao for posicao, doc in enumerate(cias)}
+    last_check = _datas([doc.get("last_check") or agora for doc in aeronaves])
+    next_check = _datas([doc.get("next_check") or agora for doc in aeronaves])
+
+    horas_aeronave = np.zeros(len(aeronaves))
+    voos_aeronave = np.zeros(len(aeronaves), dtype=np.int64)
+    horas_cia = np.zeros(len(cias))
+    voos_cia = np.zeros(len(cias), dtype=np.int64)
+    processados = 0
+
+    if aeronaves:
+        # Só voos já concluídos depois do check mais antigo da frota (índice hr_partida_id). As datas
+        # chegam como inteiros (ms desde a época): converter datetimes em Python custaria mais que o resto
+        pipeline = [
+            {"$match": {"hr_partida": {"$gte": last_check.min().item(), "$lt": agora}}},
+            {"$project": {
+                "_id": 0,
+                "aeronave": 1,
+                "cia": 1,
+                "partida": {"$ifNull": [{"$toLong": "$hr_partida"}, 0]},
+                "chegada": {"$ifNull": [{"$toLong": "$hr_chegada"}, 0]},
+            }},
+        ]
+        cursor = engine.get_collection(Voo).aggregate(pipeline, batchSize=tamanho_lote)
+        check_ms = last_check.astype(np.int64)
+        while True:
+            lote = await cursor.to_list(length=tamanho_lote)
+            if not lote:
+                break
+            processados += len(lote)
+
+            aeronave = np.fromiter((posicao_aeronave.get(doc.get("aeronave"), -1) for doc in lote), dtype=np.int64, count=len(lote))
+            cia = np.fromiter((posicao_cia.get(doc.get("cia"), -1) for doc in lote), dtype=np.int64, count=len(lote))
+            partida = np.fromiter((doc["partida"] for doc in lote), dtype=np.int64, count=len(lote))
+            chegada = np.fromiter((doc["chegada"] for doc in lote), dtype=np.int64, count=len(lote))
+
+            # Voos de aeronaves conhecidas, depois do check delas e já pousados
+            validos = (aeronave >= 0) & (chegada > partida) & (chegada <= agora_ms)
+            validos &= partida >= check_ms[np.where(aeronave >= 0, aeronave, 0)]
+            horas = (chegada - partida) / MS_POR_HORA
+
+            aeronave_validos, horas_validas = aeronave[validos], horas[validos]
+            horas_aeronave += np.bincount(aeronave_validos, weights=horas_validas, minlength=len(aeronaves))
+            voos_aeronave += np.bincount(aeronave_validos, minlength=len(aeronaves))
+
+            da_cia = validos & (cia >= 0)
+            horas_cia += np.bincount(cia[da_cia], weights=horas[da_cia], minlength=len(cias))
+            voos_cia += np.bincount(cia[da_cia], minlength=len(cias))
+
+    dias_restantes = (next_check.astype(np.int64) - agora_ms) / MS_POR_DIA
+    vencendo = np.flatnonzero(dias_restantes <= dias)
+    vencendo = vencendo[np.argsort(dias_restantes[vencendo], kind="stable")]
+    mais_usadas = np.argsort(-horas_aeronave, kind="stable")[:limit]
+
+    def linha_aeronave(posicao: int) -> Dict[str, Any]:
+        doc = aeronaves[posicao]
+        return {
+            "aeronave": str(doc["_id"]),
+            "modelo": doc.get("modelo"),
+            "cia": str(doc["cia"]) if doc.get("cia") else None,
+            "last_check": doc.get("last_check"),
+            "next_check": doc.get("next_check"),
+            "dias_para_check": float(dias_restantes[posicao]),
+            "horas_desde_check": float(horas_aeronave[posicao]),
+            "voos_desde_check": int(voos_aeronave[posicao]),
+        }
+
+    por_cia: List[Dict[str, Any]] = [
+        {"cia": str(doc["_id"]), "nome": doc.get("nome"), "horas": float(horas_cia[posicao]), "voos": int(voos_cia[posicao])}
+        for posicao, doc in enumerate(cias)
+    ]
+    por_cia.sort(key=lambda linha: linha["horas"], reverse=True)
+
+    return {
+        "gerado_em": agora,
+        "dias": dias,
+        "voos_processados": processados,
+        "duracao_segundos": time.perf_counter() - inicio_execucao,
+        "manutencao": [linha_aeronave(posicao) for posicao in vencendo[:limit]],
+        "aeronaves": [linha_aeronave(posicao) for posicao in mais_usadas],
+        "cias": por_cia,
+    }
@@ -0,0 +1,270 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Iterable, Optional, Set, Tuple
+
+from fastapi.responses import Response
+
+from atualizacao import ATUALIZADO_EM, VERSAO
+from busca import COD_IATA, TERMOS
+from contadores import TOTAL_AERONAVES, TOTAL_VOOS
+from models import Aeronave, Cia, Voo
+from paginacao import CABECALHO_CURSOR
+from serializacao import dumps
+from versoes import versoes
+
+logger = logging.getLogger(__name__)
+
+RESPOSTAS_TTL = float(os.getenv("RESPOSTAS_TTL", "2"))  # segundos servindo direto do cache
+RESPOSTAS_OBSOLETO = float(os.getenv("RESPOSTAS_OBSOLETO", "10"))  # segundos extras servindo a versão velha enquanto recalcula
+RESPOSTAS_BYTES = int(os.getenv("RESPOSTAS_BYTES", str(64 * 1024 * 1024)))  # tamanho máximo dos corpos guardados
+
+CABECALHO_CACHE = "X-Cache"
+
+# Campos que nenhuma rota "completa" devolve: alterá-los não invalida respostas
+CAMPOS_IGNORADOS = {VERSAO, ATUALIZADO_EM, TOTAL_AERONAVES, TOTAL_VOOS, TERMOS, COD_IATA}
+
+# Campos que decidem quais documentos entram em uma resposta (junção e ordem das listas
+# aninhadas de /cias/cia_completa): alterá-los invalida a coleção inteira. Os demais só
+# invalidam as respostas que mostram o documento alterado.
+CAMPOS_POSICAO = {Voo.__collection__: {"cia", "hr_partida"}, Aeronave.__collection__: {"cia"}}
+
+# Chaves das respostas "completas" que trazem documentos de outra coleção
+CHAVES_REFERENCIA = {
+    "cia": Cia.__collection__,
+    "aeronave": Aeronave.__collection__,
+    "aeronaves": Aeronave.__collection__,
+    "voos": Voo.__collection__,
+}
+
+# Rota "completa" devolve o conteúdo e o cursor da próxima página
+Calculo = Callable[[], Awaitable[Tuple[Any, Optional[str]]]]
+
+
+@dataclass
+class Entrada:
+    corpo: bytes
+    cursor: Optional[str]
+    criada: float
+    colecoes: FrozenSet[str]
+    documentos: FrozenSet[Tuple[str, str]]  # (coleção, id) de cada documento mostrado
+
+
+def documentos_mostrados(conteudo: Any, colecao: str) -> FrozenSet[Tuple[str, str]]:
+    """(coleção, id) dos itens da resposta e das referências embutidas neles."""
+    mostrados = set()
+    for item in conteudo if isinstance(conteudo, list) else ():
+        if not isinstance(item, dict):
+            continue
+        mostrados.add((colecao, str(item.get("id"))))
+        for chave, outra in CHAVES_REFERENCIA.items():
+            valor = item.get(chave)
+            for ref in valor if isinstance(valor, list) else [valor]:
+                if isinstance(ref, dict) and ref.get("id"):
+                    mostrados.add((outra, str(ref["id"])))
+    return frozenset(mostrados)
+
+
+class CacheRespostas:
+    """Cache LRU (limitado em bytes) dos corpos já serializados das rotas "completas".
+
+    Dentro do TTL a resposta sai do cache; depois dele, por mais `obsoleto`
+    segundos, a versão velha continua sendo servida enquanto uma única tarefa
+    recalcula em segundo plano (stale-while-revalidate). Falhas concorrentes
+    da mesma chave compartilham um único cálculo. Inserções, remoções e
+    mudanças de posição invalidam por coleção as respostas que dependem dela;
+    as demais atualizações, só as respostas que mostram o documento (ver
+    `versoes.alterar`).
+    """
+
+    def __init__(self, limite_bytes: int = RESPOSTAS_BYTES, ttl: float = RESPOSTAS_TTL, obsoleto: float = RESPOSTAS_OBSOLETO):
+        self.limite_bytes = limite_bytes
+        self.ttl = ttl
+        self.obsoleto = obsoleto
+        self._itens: "OrderedDict[tuple, Entrada]" = OrderedDict()
+        self._por_colecao: Dict[str, Set[tuple]] = {}
+        self._por_documento: Dict[Tuple[str, str], Set[tuple]] = {}
+        # Documentos alterados durante cada cálculo em andamento (o resultado não é guardado se os mostra)
+        self._alterados_no_calculo: Dict[tuple, Set[Tuple[str, str]]] = {}
+        self._pendentes: Dict[tuple, asyncio.Future] = {}
+        self._tarefas: Set[asyncio.Task] = set()
+        self._geracoes: Dict[str, int] = {}
+        self._limpezas = 0
+        self.bytes = 0
+        self.acertos = 0
+        self.obsoletos = 0
+        self.falhas = 0
+        self.coalescidas = 0
+        self.remocoes = 0
+        self.invalidacoes = 0
+
+    def _remover(self, chave) -> None:
+        entrada = self._itens.pop(chave, None)
+        if entrada is None:
+            return
+        self.bytes -= len(entrada.corpo)
+        for colecao in entrada.colecoes:
+            self._por_colecao[colecao].discard(chave)
+        for doc in entrada.documentos:
+            chaves = self._por_documento.get(doc)
+            if chaves is not None:
+                chaves.discard(chave)
+                if not chaves:
+                    del self._por_documento[doc]
+
+    def _guardar(self, chave, entrada: Entrada, geracoes: Dict[Optional[str], int], alterados: Set) -> None:
+        # Houve escrita em alguma coleção usada (ou limpeza) enquanto o cálculo rodava
+        if geracoes != self._geracoes_atuais(entrada.colecoes) or not alterados.isdisjoint(entrada.documentos):
+            return
+        if len(entrada.corpo) > self.limite_bytes:
+            return
+        self._remover(chave)
+        self._itens[chave] = entrada
+        self.bytes += len(entrada.corpo)
+        for colecao in entrada.colecoes:
+            self._por_colecao.setdefault(colecao, set()).add(chave)
+        for doc in entrada.documentos:
+            self._por_documento.setdefault(doc, set()).add(chave)
+        while self.bytes > self.limite_bytes:
+            self._remover(next(iter(self._itens)))
+            self.remocoes += 1
+
+    def _geracoes_atuais(self, colecoes: FrozenSet[str]) -> Dict[Optional[str], int]:
+        geracoes: Dict[Optional[str], int] = {colecao: self._geracoes.get(colecao, 0) for colecao in colecoes}
+        geracoes[None] = self._limpezas
+        return geracoes
+
+    async def _calcular(self, chave, colecao: str, colecoes: FrozenSet[str], calcular: Calculo) -> Entrada:
+        pendente = self._pendentes.get(chave)
+        if pendente is not None:
+            self.coalescidas += 1
+            return await asyncio.shield(pendente)
+
+        futuro = asyncio.get_running_loop().create_future()
+        self._pendentes[chave] = futuro
+        geracoes = self._geracoes_atuais(colecoes)
+        alterados = self._alterados_no_calculo[chave] = set()
+        try:
+            conteudo, cursor = await calcular()
+            entrada = Entrada(dumps(conteudo), cursor, time.monotonic(), colecoes, documentos_mostrados(conteudo, colecao))
+            self._guardar(chave, entrada, geracoes, alterados)
+            futuro.set_result(entrada)
+            return entrada
+        except BaseException as e:
+            futuro.set_exception(e)
+            # Evita aviso de exceção não lida quando ninguém estava esperando
+            futuro.exception()
+            raise
+        finally:
+            del self._pendentes[chave]
+            del self._alterados_no_calculo[chave]
+
+    def _revalidar(self, chave, colecao: str, colecoes: FrozenSet[str], calcular: Calculo) -> None:
+        if chave in self._pendentes:
+            return
+        # Contexto vazio: os comandos da revalidação não contam na requisição que a disparou
+        tarefa = asyncio.create_task(self._calcular(chave, colecao, colecoes, calcular), context=contextvars.Context())
+        self._tarefas.add(tarefa)
+        tarefa.add_done_callback(self._revalidada)
+
+    def _revalidada(self, tarefa: asyncio.Task) -> None:
+        self._tarefas.discard(tarefa)
+        if not tarefa.cancelled() and tarefa.exception() is not None:
+            logger.warning("Falha ao revalidar resposta em cache: %s", tarefa.exception())
+
+    async def obter(self, chave, colecao: str, colecoes: FrozenSet[str], calcular: Calculo) -> Tuple[Entrada, str]:
+        entrada = self._itens.get(chave)
+        if entrada is not None:
+            idade = time.monotonic() - entrada.criada
+            if idade < self.ttl:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return entrada, "HIT"
+            if idade < self.ttl + self.obsoleto:
+                self._itens.move_to_end(chave)
+                self.obsoletos += 1
+                self._revalidar(chave, colecao, colecoes, calcular)
+                return entrada, "STALE"
+            self._remover(chave)
+
+        self.falhas += 1
+        return await self._calcular(chave, colecao, colecoes, calcular), "MISS"
+
+    async def responder(self, rota: str, parametros: Dict[str, Any], models: Iterable, calcular: Calculo) -> Response:
+        """Resposta JSON da rota, vinda do cache ou de `calcular`.
+
+        A chave usa os parâmetros já validados, então `?limit=10` e a ausência
+        de `limit` caem na mesma entrada. O primeiro de `models` é o dos itens
+        da resposta.
+        """
+        chave = (rota, tuple(sorted((nome, str(valor)) for nome, valor in parametros.items() if valor is not None)))
+        models = list(models)
+        colecoes = frozenset(model.__collection__ for model in models)
+        entrada, estado = await self.obter(chave, models[0].__collection__, colecoes, calcular)
+
+        cabecalhos = {CABECALHO_CACHE: estado}
+        if entrada.cursor:
+            cabecalhos[CABECALHO_CURSOR] = entrada.cursor
+        return Response(content=entrada.corpo, media_type="application/json", headers=cabecalhos)
+
+    def invalidar(self, model, campos: Optional[Set[str]] = None, id: Optional[Any] = None) -> None:
+        """Invalida as respostas que dependem da coleção, ou só as que mostram o documento `id`.
+
+        Basta invalidar pelo documento quando se sabe quais campos mudaram e
+        nenhum deles muda quais documentos entram nas respostas.
+        """
+        colecao = model.__collection__
+        self.invalidacoes += 1
+        if id is not None and campos is not None and not campos & CAMPOS_POSICAO.get(colecao, set()):
+            doc = (colecao, str(id))
+            for alterados in self._alterados_no_calculo.values():
+                alterados.add(doc)
+            for chave in list(self._por_documento.get(doc, ())):
+                self._remover(chave)
+            return
+        self._geracoes[colecao] = self._geracoes.get(colecao, 0) + 1
+        for chave in list(self._por_colecao.get(colecao, ())):
+            self._remover(chave)
+
+    def limpar(self) -> None:
+        self._limpezas += 1
+        self._itens.clear()
+        self._por_colecao.clear()
+        self._por_documento.clear()
+        self.bytes = 0
+
+    def estatisticas(self) -> Dict[str, Any]:
+        total = self.acertos + self.obsoletos + self.falhas
+        return {
+            "tamanho": len(self._itens),
+            "bytes": self.bytes,
+            "limite_bytes": self.limite_bytes,
+            "ttl": self.ttl,
+            "obsoleto": self.obsoleto,
+            "acertos": self.acertos,
+            "obsoletos": self.obsoletos,
+            "falhas": self.falhas,
+            "coalescidas": self.coalescidas,
+            "taxa_acerto": (self.acertos + self.obsoletos) / total if total else 0.0,
+            "remocoes": self.remocoes,
+            "invalidacoes": self.invalidacoes,
+        }
+
+
+# Instância única por worker, compartilhada pelas rotas "completas"
+respostas = CacheRespostas()
+
+
+def _ao_alterar(model, campos: Optional[Set[str]], id: Optional[Any]) -> None:
+    # Ex.: contadores da Cia e chaves de busca não aparecem nas respostas
+    if campos is not None and campos <= CAMPOS_IGNORADOS:
+        return
+    respostas.invalidar(model, campos, id)
+
+
+versoes.ouvintes.append(_ao_alterar)
+
@@ -1,8 +1,20 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi import APIRouter, HTTPException, Query, Depends, Request, Header
 from odmantic import ObjectId, AIOEngine
 from typing import List
-from models import Aeronave, Cia
+from models import Aeronave, AeronaveParcial, Cia
 from database import get_engine
+from agregacoes import agregar, anexar_referencias, paginar_agregacao, pipeline_aeronaves_completas, formatar_aeronave_completa, CAMPOS_AERONAVE
+from paginacao import paginar_documentos, definir_cursor
+from serializacao import RespostaJSON, documento, projecao
+from exportacao import exportar, TAMANHO_LOTE_EXPORTACAO
+from contadores import incrementar, transferir, TOTAL_AERONAVES
+from lote import importar, TAMANHO_LOTE
+from cache import referencias
+from respostas import respostas
+from versoes import versoes
+from busca import TERMOS, filtro_prefixo, inserir
+from atualizacao import alterados, atualizar_parcial, etag, VERSAO
+from relatorios import relatorio_frota
 from datetime import datetime
 
 router = APIRouter(
@@ -10,11 +22,12 @@ router = APIRouter(
     tags=["Aeronaves"],   # Tag para documentação automática
 )
 
-engine = get_engine()
+# Campos substituídos pelo PUT (versão é do servidor)
+CAMPOS_PUT_AERONAVE = {"modelo", "capacidade", "last_check", "next_check", "cia"}
 
 # Create
 @router.post("/", response_model=Aeronave)
-async def create_aeronave(aeronave_data: Aeronave):
+async def create_aeronave(aeronave_data: Aeronave, engine: AIOEngine = Depends(get_engine)):
     # Verificar se as datas de last_check e next_check estão no formato correto
     if isinstance(aeronave_data.last_check, str):
         aeronave_data.last_check = datetime.fromisoformat(aeronave_data.last_check.replace("Z", "+00:00"))
@@ -22,48 +35,83 @@ async def create_aeronave(aeronave_data: Aeronave):
         aeronave_data.next_check = datetime.fromisoformat(aeronave_data.next_check.replace("Z", "+00:00"))
     
     # Verificar se a companhia aérea existe
-    cia = await engine.find_one(Cia, Cia.id == ObjectId(aeronave_data.cia))
+    cia = await referencias.obter(engine, Cia, ObjectId(aeronave_data.cia))
     if not cia:
         raise HTTPException(status_code=404, detail="Companhia aérea não encontrada")
 
     # Atribuir o ID da cia à aeronave
-    aeronave_data.cia = cia.id
+    aeronave_data.cia = cia["_id"]
     
     # Salvar a aeronave no banco de dados
-    await engine.save(aeronave_data)
+    await inserir(engine, Aeronave, aeronave_data)
+    versoes.alterar(Aeronave)
+    await incrementar(engine, cia["_id"], TOTAL_AERONAVES)
     return aeronave_data
 
 
+# Create - Importação em lote (array JSON ou NDJSON)
+@router.post("/bulk")
+async def create_aeronaves_bulk(
+    request: Request,
+    tamanho_lote: int = Query(TAMANHO_LOTE, gt=0, le=10000, description="Itens gravados por lote"),
+    engine: AIOEngine = Depends(get_engine),
+):
+    return await importar(engine, request, Aeronave, {"cia": Cia}, TOTAL_AERONAVES, tamanho_lote)
+
+
 # Listar todas as aeronaves com paginação
 @router.get("/read", response_model=List[Aeronave])
 async def listar_aeronvaes(
     offset: int = Query(0, ge=0, description="Número de itens a pular"),
-    limit: int = Query(10, gt=0, le=100, description="Número máximo de itens a retornar")
+    limit: int = Query(10, gt=0, le=100, description="Número máximo de itens a retornar"),
+    cursor: str = Query(None, description="Cursor da próxima página (cabeçalho X-Next-Cursor da resposta anterior)"),
+    engine: AIOEngine = Depends(get_engine),
 ):
-    return await engine.find(Aeronave, skip=offset, limit=limit)
+    # Caminho rápido: documentos crus do Motor com projeção, sem hidratar o modelo
+    docs, proximo = await paginar_documentos(
+        engine, Aeronave, None, limit, offset, cursor, projecao=projecao(Aeronave)
+    )
+    resposta = RespostaJSON([documento(Aeronave, doc) for doc in docs])
+    definir_cursor(resposta, proximo)
+    return resposta
 
 # Update
 @router.put("/{id}", response_model=Aeronave)
-async def update_aeronave(id: str, aeronave_data: Aeronave):
-    # Buscar a aeronave pelo ID
-    aeronave = await engine.find_one(Aeronave, Aeronave.id == ObjectId(id))
-    if not aeronave:
-        raise HTTPException(status_code=404, detail="Aeronave não encontrada")
-    
-    # Atualizar os dados da aeronave
-    aeronave.modelo = aeronave_data.modelo
-    aeronave.capacidade = aeronave_data.capacidade
-    aeronave.last_check = aeronave_data.last_check
-    aeronave.next_check = aeronave_data.next_check
-    aeronave.cia = ObjectId(aeronave_data.cia)
-    
-    # Salvar as alterações
-    await engine.save(aeronave)
-    return aeronave
+async def update_aeronave(
+    id: str,
+    aeronave_data: Aeronave,
+    if_match: str = Header(None, description="Versão esperada (ETag); responde 412 se o documento mudou"),
+    engine: AIOEngine = Depends(get_engine),
+):
+    # Mesmo caminho do PATCH ($set + $inc na versão em uma operação): um PATCH simultâneo não é sobrescrito
+    antes, depois = await atualizar_parcial(
+        engine, Aeronave, ObjectId(id), aeronave_data.model_dump_doc(include=CAMPOS_PUT_AERONAVE), if_match,
+        "Aeronave não encontrada",
+    )
+    referencias.invalidar(Aeronave, antes["_id"])
+    versoes.alterar(Aeronave, alterados(antes, depois), antes["_id"])
+    await transferir(engine, antes["cia"], depois["cia"], TOTAL_AERONAVES)
+    return RespostaJSON(documento(Aeronave, depois), headers={"ETag": etag(depois[VERSAO])})
+
+# Update parcial (PATCH): só os campos enviados, em uma única operação atômica
+@router.patch("/{id}", response_model=Aeronave)
+async def patch_aeronave(
+    id: str,
+    dados: AeronaveParcial,
+    if_match: str = Header(None, description="Versão esperada (ETag); responde 412 se o documento mudou"),
+    engine: AIOEngine = Depends(get_engine),
+):
+    antes, depois = await atualizar_parcial(
+        engine, Aeronave, ObjectId(id), dados.model_dump(exclude_unset=True), if_match, "Aeronave não encontrada"
+    )
+    referencias.invalidar(Aeronave, antes["_id"])
+    versoes.alterar(Aeronave, alterados(antes, depois), antes["_id"])
+    await transferir(engine, antes["cia"], depois["cia"], TOTAL_AERONAVES)
+    return RespostaJSON(documento(Aeronave, depois), headers={"ETag": etag(depois[VERSAO])})
 
 # Delete
 @router.delete("/{id}", response_model=Aeronave)
-async def delete_aeronave(id: str):
+async def delete_aeronave(id: str, engine: AIOEngine = Depends(get_engine)):
     # Buscar a aeronave pelo ID
     aeronave = await engine.find_one(Aeronave, Aeronave.id == ObjectId(id))
     if not aeronave:
@@ -71,12 +119,13 @@ async def delete_aeronave(id: str):
     
     # Deletar a aeronave
     await engine.delete(aeronave)
+    referencias.invalidar(Aeronave, aeronave.id)
+    versoes.alterar(Aeronave)
+    await incrementar(engine, aeronave.cia, TOTAL_AERONAVES, -1)
     return aeronave
 
 
-# Read (com filtros)
-@router.get("/filtros", response_model=list[Aeronave])
-async def read_aeronaves_filtro(
+def montar_filtros_aeronave(
     id: str = None,
     modelo: str = None,
     capacidade: int = None,
@@ -93,13 +142,13 @@ async def read_aeronaves_filtro(
     next_check_end: datetime = Query(
         None, description="Fim do intervalo de next_check (ISO format)"
     )
-):
+) -> dict:
     filters = {}
     
     if id:
         filters["_id"] = ObjectId(id)
     if modelo:
-        filters["modelo"] = {"$regex": modelo, "$options": "i"}
+        filters.update(filtro_prefixo(TERMOS, modelo))  # prefixo de qualquer palavra do modelo
     if capacidade:
         filters["capacidade"] = capacidade
     if cia_id:
@@ -122,7 +171,13 @@ async def read_aeronaves_filtro(
             filters["next_check"]["$lte"] = next_check_end
         if not filters["next_check"]:
             del filters["next_check"]
-    
+
+    return filters
+
+
+# Read (com filtros)
+@router.get("/filtros", response_model=list[Aeronave])
+async def read_aeronaves_filtro(filters: dict = Depends(montar_filtros_aeronave), engine: AIOEngine = Depends(get_engine)):
     aeronaves = await engine.find(Aeronave, filters)
     if not aeronaves:
         raise HTTPException(status_code=404, detail="Aeronave não encontrada")
@@ -130,54 +185,65 @@ async def read_aeronaves_filtro(
     return aeronaves
 
 
+# Exportação em streaming (mesmos filtros de /aeronaves/filtros)
+@router.get("/export")
+async def exportar_aeronaves(
+    filters: dict = Depends(montar_filtros_aeronave),
+    formato: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Formato: 'ndjson' ou 'csv'"),
+    tamanho_lote: int = Query(TAMANHO_LOTE_EXPORTACAO, gt=0, le=10000, description="Documentos por lote do cursor"),
+    engine: AIOEngine = Depends(get_engine),
+):
+    return exportar(
+        engine,
+        Aeronave,
+        filters,
+        CAMPOS_AERONAVE + ["cia"],
+        formato,
+        tamanho_lote,
+        ordenacao=[("_id", 1)],
+        nome_arquivo="aeronaves",
+    )
+
+
+# Relatório da frota: checks a vencer e horas de bloco por aeronave e por companhia (requer numpy)
+@router.get("/relatorio")
+async def relatorio_aeronaves(
+    dias: int = Query(30, ge=0, le=3650, description="Aeronaves com next_check em até N dias (vencidos incluídos)"),
+    limit: int = Query(100, gt=0, le=10000, description="Número máximo de aeronaves em cada lista"),
+    engine: AIOEngine = Depends(get_engine),
+):
+    return RespostaJSON(await relatorio_frota(engine, dias, limit))
+
+
 # Consultar aeronaves com informações completas (incluindo companhia aérea e voos)
 @router.get("/completa", response_model=list[dict])
 async def aeronaves_completas(
     id: str = None,  # Torna o 'id' opcional
     offset: int = Query(0, ge=0, description="Número de itens a pular"),
-    limit: int = Query(10, gt=0, le=100, description="Número máximo de itens a retornar")
+    limit: int = Query(10, gt=0, le=100, description="Número máximo de itens a retornar"),
+    cursor: str = Query(None, description="Cursor da próxima página (cabeçalho X-Next-Cursor da resposta anterior)"),
+    engine: AIOEngine = Depends(get_engine),
 ):
-    # Se 'id' for fornecido, buscar a aeronave específica
-    if id:
-        aeronave = await engine.find_one(Aeronave, Aeronave.id == ObjectId(id))
-        
-        if not aeronave:
-            raise HTTPException(status_code=404, detail="Aeronave não encontrada")
-        
-        # Obter informações da companhia aérea
-        cia = await engine.find_one(Cia, Cia.id == aeronave.cia)
-        
-        # Retorno com as informações completas da aeronave
-        return [{
-            "id": str(aeronave.id),
-            "modelo": aeronave.modelo,
-            "capacidade": aeronave.capacidade,
-            "last_check": aeronave.last_check,
-            "next_check": aeronave.next_check,
-            "cia": {
-                "id": str(cia.id) if cia else None,
-                "nome": cia.nome if cia else None,
-                "cod_iata": cia.cod_iata if cia else None
-            }
-        }]
-    
-    # Se 'id' não for fornecido, retorna todas as aeronaves com paginação
-    aeronaves = await engine.find(Aeronave, skip=offset, limit=limit)
-    
-    resultado = []
-    for aeronave in aeronaves:
-        cia = await engine.find_one(Cia, Cia.id == aeronave.cia)
-        resultado.append({
-            "id": str(aeronave.id),
-            "modelo": aeronave.modelo,
-            "capacidade": aeronave.capacidade,
-            "last_check": aeronave.last_check,
-            "next_check": aeronave.next_check,
-            "cia": {
-                "id": str(cia.id) if cia else None,
-                "nome": cia.nome if cia else None,
-                "cod_iata": cia.cod_iata if cia else None
-            }
-        })
-    
-    return resultado
\ No newline at end of file
+    async def calcular():
+        # Se 'id' for fornecido, buscar a aeronave específica
+        if id:
+            pipeline = pipeline_aeronaves_completas({"_id": ObjectId(id)}, 0, 1)
+            aeronaves = await agregar(engine, Aeronave, pipeline)
+
+            if not aeronaves:
+                raise HTTPException(status_code=404, detail="Aeronave não encontrada")
+
+            await anexar_referencias(engine, aeronaves, "cia", Cia)
+            return [formatar_aeronave_completa(aeronaves[0])], None
+
+        # Se 'id' não for fornecido, retorna todas as aeronaves com paginação
+        # Uma consulta para a página; a companhia aérea vem do cache de referências
+        aeronaves, proximo = await paginar_agregacao(
+            engine, Aeronave, pipeline_aeronaves_completas, None, limit, offset, cursor
+        )
+        await anexar_referencias(engine, aeronaves, "cia", Cia)
+        return [formatar_aeronave_completa(aeronave) for aeronave in aeronaves], proximo
+
+    # Pedidos idênticos e simultâneos compartilham o mesmo cálculo
+    parametros = {"id": id, "offset": offset, "limit": limit, "cursor": cursor}
+    return await respostas.responder("/aeronaves/completa", parametros, (Aeronave, Cia), calcular)
@@ -0,0 +1,74 @@
+from fastapi import APIRouter, HTTPException, Query, Depends
+from odmantic import ObjectId, AIOEngine
+from database import get_engine
+import analises
+import tarefas
+from analises import INTERVALO_ANALISES, RESERVA_ANALISES, VISOES, estado
+
+router = APIRouter(
+    prefix="/analises",  # Prefixo para todas as rotas
+    tags=["Análises"],   # Tag para documentação automática
+)
+
+# Padrão AAAA-MM-DD: os dias são comparados como texto nas visões
+PADRAO_DIA = r"^\d{4}-\d{2}-\d{2}$"
+
+# Rotas (origem-destino) com mais voos; lidas da visão materializada, sem varrer voos
+@router.get("/rotas")
+async def rotas_mais_voadas(
+    origem: str = Query(None, description="Só rotas saindo deste aeroporto"),
+    destino: str = Query(None, description="Só rotas chegando a este aeroporto"),
+    limit: int = Query(20, gt=0, le=1000, description="Número máximo de rotas a retornar"),
+    engine: AIOEngine = Depends(get_engine),
+):
+    return await analises.rotas(engine, origem, destino, limit)
+
+# Partidas por companhia e dia (dia da hora de partida, UTC)
+@router.get("/partidas")
+async def partidas_por_dia(
+    cia_id: str = Query(None, description="Só partidas desta companhia aérea"),
+    data_inicio: str = Query(None, pattern=PADRAO_DIA, description="Primeiro dia (AAAA-MM-DD)"),
+    data_fim: str = Query(None, pattern=PADRAO_DIA, description="Último dia (AAAA-MM-DD)"),
+    limit: int = Query(366, gt=0, le=10000, description="Número máximo de linhas (companhia, dia)"),
+    engine: AIOEngine = Depends(get_engine),
+):
+    cia = ObjectId(cia_id) if cia_id else None
+    return await analises.partidas(engine, cia, data_inicio, data_fim, limit)
+
+# Voos por status e proporções de pontualidade e cancelamento
+@router.get("/status")
+async def voos_por_status(
+    cia_id: str = Query(None, description="Só voos desta companhia aérea"),
+    engine: AIOEngine = Depends(get_engine),
+):
+    cia = ObjectId(cia_id) if cia_id else None
+    return await analises.status(engine, cia)
+
+# Marca d'água e última execução do job que mantém as visões
+@router.get("/situacao")
+async def situacao_analises(engine: AIOEngine = Depends(get_engine)):
+    situacao = await tarefas.ler(engine, analises.TAREFA) or {}
+    return {
+        "visoes": list(VISOES),
+        "intervalo": INTERVALO_ANALISES,
+        "marca": situacao.get("marca"),
+        "reconstruido_em": situacao.get("reconstruido_em"),
+        "atualizado_em": situacao.get("atualizado_em"),
+        **estado,
+    }
+
+# Atualiza as visões agora; completa=true recalcula tudo a partir dos voos
+@router.post("/atualizar")
+async def atualizar_analises(
+    completa: bool = Query(False, description="Reconstrói as visões do zero em vez de aplicar só as alterações"),
+    engine: AIOEngine = Depends(get_engine),
+):
+    # A reserva barra outros workers; o estado local, outra chamada neste mesmo worker
+    if estado["em_execucao"] or not await tarefas.reservar(engine, analises.TAREFA, RESERVA_ANALISES):
+        raise HTTPException(status_code=409, detail="Atualização das análises já em execução")
+    try:
+        return {"processados": await analises.executar(engine, completa)}
+    except tarefas.ReservaPerdida:
+        raise HTTPException(status_code=409, detail="Atualização das análises assumida por outro worker")
+    finally:
+        await tarefas.liberar(engine, analises.TAREFA)
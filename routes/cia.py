@@ -1,85 +1,126 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
-from odmantic import ObjectId
+from fastapi import APIRouter, HTTPException, Depends, Query, Response, Header
+from odmantic import ObjectId, AIOEngine
 from database import get_engine, get_db
-from models import Cia, Aeronave, Voo
+from models import Cia, CiaParcial, Aeronave, Voo
 from typing import List
+from agregacoes import agregar, paginar_agregacao, pipeline_cias_completas, formatar_cia_completa
+from paginacao import paginar, paginar_documentos, definir_cursor, validar_ordenacao
+from contadores import recalcular, TOTAL_AERONAVES, TOTAL_VOOS
+from atualizacao import alterados, atualizar_parcial, etag, VERSAO
+from serializacao import RespostaJSON, documento, projecao
+from cache import referencias
+from respostas import respostas
+from versoes import versoes, condicional
+from busca import TERMOS, COD_IATA, filtro_prefixo, inserir, sugerir
 
 router = APIRouter(
     prefix="/cias",  # Prefixo para todas as rotas
     tags=["Cias"],   # Tag para documentação automática
 )
 
-engine = get_engine()
+# Campos que podem ser usados em ordenação (todos cobertos por índice com _id)
+ORDENACOES_CIA = {"nome", "cod_iata"}
 
 # Criar uma nova companhia aérea
 @router.post("/", response_model=Cia)
-async def criar_cia(cia: Cia):
-    return await engine.save(cia)
-
-# Listar todas as companhias aéreas com paginação
-@router.get("/", response_model=List[Cia])
+async def criar_cia(cia: Cia, engine: AIOEngine = Depends(get_engine)):
+    # Companhia nova começa sem aeronaves nem voos
+    cia.total_aeronaves = 0
+    cia.total_voos = 0
+    await inserir(engine, Cia, cia)
+    versoes.alterar(Cia)
+    return cia
+
+# Listar todas as companhias aéreas com paginação (com ETag: 304 sem consultar o banco se nada mudou)
+@router.get("/", response_model=List[Cia], dependencies=[Depends(condicional(Cia))])
 async def listar_cias(
+    response: Response,
     offset: int = Query(0, ge=0, description="Número de itens a pular"),
-    limit: int = Query(10, gt=0, le=100, description="Número máximo de itens a retornar")
+    limit: int = Query(10, gt=0, le=100, description="Número máximo de itens a retornar"),
+    cursor: str = Query(None, description="Cursor da próxima página (cabeçalho X-Next-Cursor da resposta anterior)"),
+    engine: AIOEngine = Depends(get_engine),
 ):
-    return await engine.find(Cia, skip=offset, limit=limit)
+    cias, proximo = await paginar(engine, Cia, None, limit, offset, cursor)
+    definir_cursor(response, proximo)
+    return cias
 
 
 # Rota de atualização de cia
 @router.put("/{cia_id}", response_model=Cia)
-async def atualizar_cia(cia_id: str, cia_data: Cia, db: engine = Depends(get_db)):
-    cia_existente = await db.find_one(Cia, Cia.id == ObjectId(cia_id))
-    
-    if not cia_existente:
-        raise HTTPException(status_code=404, detail="Companhia não encontrada")
-
-    # Atualiza os campos com base nos dados enviados, sem precisar de uma classe separada
-    cia_existente.nome = cia_data.nome or cia_existente.nome
-    cia_existente.cod_iata = cia_data.cod_iata or cia_existente.cod_iata
-    cia_existente.aeronaves = cia_data.aeronaves or cia_existente.aeronaves
-    cia_existente.voos = cia_data.voos or cia_existente.voos
-
-    await db.save(cia_existente)
-    return cia_existente
+async def atualizar_cia(
+    cia_id: str,
+    cia_data: Cia,
+    if_match: str = Header(None, description="Versão esperada (ETag); responde 412 se o documento mudou"),
+    db: AIOEngine = Depends(get_db),
+):
+    # Campos vazios mantêm o valor atual; os contadores nunca vêm do corpo
+    alteracoes = {campo: valor for campo, valor in cia_data.model_dump_doc(include={"nome", "cod_iata"}).items() if valor}
+
+    # Mesmo caminho do PATCH ($set + $inc na versão em uma operação): um PATCH simultâneo não é sobrescrito
+    antes, depois = await atualizar_parcial(db, Cia, ObjectId(cia_id), alteracoes, if_match, "Companhia não encontrada")
+    referencias.invalidar(Cia, antes["_id"])
+    versoes.alterar(Cia, alterados(antes, depois), antes["_id"])
+    return RespostaJSON(documento(Cia, depois), headers={"ETag": etag(depois[VERSAO])})
+
+# Update parcial (PATCH): só os campos enviados, em uma única operação atômica
+@router.patch("/{cia_id}", response_model=Cia)
+async def patch_cia(
+    cia_id: str,
+    dados: CiaParcial,
+    if_match: str = Header(None, description="Versão esperada (ETag); responde 412 se o documento mudou"),
+    engine: AIOEngine = Depends(get_engine),
+):
+    antes, depois = await atualizar_parcial(
+        engine, Cia, ObjectId(cia_id), dados.model_dump(exclude_unset=True), if_match, "Companhia não encontrada"
+    )
+    referencias.invalidar(Cia, antes["_id"])
+    versoes.alterar(Cia, alterados(antes, depois), antes["_id"])
+    return RespostaJSON(documento(Cia, depois), headers={"ETag": etag(depois[VERSAO])})
 
 # Deletar uma companhia aérea
 @router.delete("/{cia_id}")
-async def deletar_cia(cia_id: str):
+async def deletar_cia(cia_id: str, engine: AIOEngine = Depends(get_engine)):
     cia = await engine.find_one(Cia, Cia.id == ObjectId(cia_id))
     if not cia:
         raise HTTPException(status_code=404, detail="Companhia aérea não encontrada")
     await engine.delete(cia)
+    referencias.invalidar(Cia, cia.id)
+    versoes.alterar(Cia)
     return {"message": "Companhia aérea deletada com sucesso"}
 
 @router.get("/filtros", response_model=list[Cia])
 async def read_cias(
+    response: Response,
     id: str = Query(None, description="Buscar por ID"),
     cod_iata: str = Query(None, description="Filtrar por código iata"),
-    busca_texto: str = Query(None, description="Filtrar por nome da companhia aérea (parcial)"),
-    ordenacao: str = Query(None, description="Campo para ordenação: 'nome'"),
+    busca_texto: str = Query(None, description="Filtrar por nome da companhia aérea (início de qualquer palavra)"),
+    ordenacao: str = Query(None, description="Campo para ordenação: 'nome' ou 'cod_iata'"),
+    ordem: str = Query("asc", pattern="^(asc|desc)$", description="Sentido da ordenação: 'asc' ou 'desc'"),
     offset: int = Query(0, ge=0, description="Número de itens a pular"),
-    limit: int = Query(10, gt=0, le=100, description="Número máximo de itens a retornar")
+    limit: int = Query(10, gt=0, le=100, description="Número máximo de itens a retornar"),
+    cursor: str = Query(None, description="Cursor da próxima página (cabeçalho X-Next-Cursor da resposta anterior)"),
+    engine: AIOEngine = Depends(get_engine),
 ):
+    campo = validar_ordenacao(ordenacao, ORDENACOES_CIA)
     filters = {}
 
     # Filtro por ID da companhia aérea
     if id:
         filters["_id"] = ObjectId(id)
 
-    # Filtro por código IATA
+    # Filtro por código IATA (prefixo, case insensitive, pelo índice)
     if cod_iata:
-        filters["cod_iata"] = {"$regex": cod_iata, "$options": "i"}
+        filters.update(filtro_prefixo(COD_IATA, cod_iata))
 
-    # Filtro por nome (case insensitive)
+    # Filtro por nome (case insensitive, pelo índice de termos)
     if busca_texto:
-        filters["nome"] = {"$regex": busca_texto, "$options": "i"}
-
-    # Busca com paginação
-    cias = await engine.find(Cia, filters, skip=offset, limit=limit)
+        filters.update(filtro_prefixo(TERMOS, busca_texto))
 
-    # Ordenação
-    if ordenacao == "nome":
-        cias = sorted(cias, key=lambda x: x.nome)
+    # Busca com ordenação e paginação feitas no banco
+    cias, proximo = await paginar(
+        engine, Cia, filters, limit, offset, cursor, ordenacao=campo, decrescente=ordem == "desc"
+    )
+    definir_cursor(response, proximo)
 
     # Verifica se encontrou alguma companhia
     if not cias:
@@ -87,94 +128,116 @@ async def read_cias(
 
     return cias
 
-# Contagem de aeronaves por companhia aérea
-@router.get("/{cia_id}/aeronaves/count", response_model=int)
-async def count_aeronaves(cia_id: str):
-    cia = await engine.find_one(Cia, Cia.id == ObjectId(cia_id))
-    if not cia:
+async def _contar(engine: AIOEngine, cia_id: str, model, campo: str, materializado: bool) -> int:
+    if materializado:
+        # Lê só o contador do documento da Cia, sem tocar na coleção contada
+        cia = await engine.get_collection(Cia).find_one({"_id": ObjectId(cia_id)}, {campo: 1})
+        if not cia:
+            raise HTTPException(status_code=404, detail="Companhia aérea não encontrada")
+        return cia.get(campo, 0)
+
+    if not await engine.count(Cia, Cia.id == ObjectId(cia_id)):
         raise HTTPException(status_code=404, detail="Companhia aérea não encontrada")
 
-    aeronaves = await engine.find(Aeronave, Aeronave.cia == cia.id)
-    return len(aeronaves)
+    # Contagem no servidor (count_documents), coberta pelo índice em 'cia'
+    return await engine.count(model, model.cia == ObjectId(cia_id))
+
+# Autocompletar nomes de companhias aéreas a partir de um prefixo
+@router.get("/autocomplete", response_model=List[str])
+async def autocompletar_cias(
+    prefixo: str = Query(..., min_length=1, description="Início do nome da companhia aérea"),
+    limit: int = Query(10, gt=0, le=50, description="Número máximo de sugestões"),
+    engine: AIOEngine = Depends(get_engine),
+):
+    return await sugerir(engine, Cia, prefixo, limit)
+
+# Contagem de aeronaves por companhia aérea
+@router.get("/{cia_id}/aeronaves/count", response_model=int)
+async def count_aeronaves(
+    cia_id: str,
+    materializado: bool = Query(False, description="Usar o contador mantido no documento da companhia"),
+    engine: AIOEngine = Depends(get_engine),
+):
+    return await _contar(engine, cia_id, Aeronave, TOTAL_AERONAVES, materializado)
 
 # Contagem de voos por companhia aérea
 @router.get("/{cia_id}/voos/count", response_model=int)
-async def count_voos(cia_id: str):
-    # Se houver uma coleção de voos, o código seria semelhante ao de aeronaves
-    cia = await engine.find_one(Cia, Cia.id == ObjectId(cia_id))
-    if not cia:
+async def count_voos(
+    cia_id: str,
+    materializado: bool = Query(False, description="Usar o contador mantido no documento da companhia"),
+    engine: AIOEngine = Depends(get_engine),
+):
+    return await _contar(engine, cia_id, Voo, TOTAL_VOOS, materializado)
+
+async def _listar_da_cia(engine: AIOEngine, response: Response, cia_id: str, model, limit: int, cursor: str, **ordenacao):
+    # Busca pelo índice que começa em 'cia', sem ler o documento da companhia
+    docs, proximo = await paginar_documentos(
+        engine, model, {"cia": ObjectId(cia_id)}, limit, 0, cursor, projecao=projecao(model), **ordenacao
+    )
+    if not docs and not cursor and not await engine.count(Cia, Cia.id == ObjectId(cia_id)):
         raise HTTPException(status_code=404, detail="Companhia aérea não encontrada")
+    definir_cursor(response, proximo)
+    return [documento(model, doc) for doc in docs]
+
+# Aeronaves da companhia aérea, paginadas por cursor (em ordem de _id)
+@router.get("/{cia_id}/aeronaves", response_model=List[Aeronave], dependencies=[Depends(condicional(Aeronave))])
+async def aeronaves_da_cia(
+    cia_id: str,
+    response: Response,
+    limit: int = Query(10, gt=0, le=100, description="Número máximo de itens a retornar"),
+    cursor: str = Query(None, description="Cursor da próxima página (cabeçalho X-Next-Cursor da resposta anterior)"),
+    engine: AIOEngine = Depends(get_engine),
+):
+    return await _listar_da_cia(engine, response, cia_id, Aeronave, limit, cursor)
+
+# Voos da companhia aérea, mais recentes primeiro, paginados por cursor
+@router.get("/{cia_id}/voos", response_model=List[Voo], dependencies=[Depends(condicional(Voo))])
+async def voos_da_cia(
+    cia_id: str,
+    response: Response,
+    limit: int = Query(10, gt=0, le=100, description="Número máximo de itens a retornar"),
+    cursor: str = Query(None, description="Cursor da próxima página (cabeçalho X-Next-Cursor da resposta anterior)"),
+    engine: AIOEngine = Depends(get_engine),
+):
+    return await _listar_da_cia(engine, response, cia_id, Voo, limit, cursor, ordenacao="hr_partida", decrescente=True)
 
-    # Supondo que há uma coleção de voos
-    voos = await engine.find(Voo, Voo.cia == cia.id)
-    return len(voos)
+# Recalcular os contadores materializados (ex.: depois de importar dados direto no banco)
+@router.post("/contadores/recalcular")
+async def recalcular_contadores(engine: AIOEngine = Depends(get_engine)):
+    await recalcular(engine)
+    return {"message": "Contadores recalculados com sucesso"}
 
- # Consultar companhias aéreas com informações completas (incluindo aeronaves e voos)
+# Consultar companhias aéreas com informações completas (incluindo as primeiras aeronaves e voos)
 @router.get("/cia_completa", response_model=list[dict])
 async def cias_completas(
     id: str = None,  # Torna o 'id' opcional
     offset: int = Query(0, ge=0, description="Número de itens a pular"),
-    limit: int = Query(10, gt=0, le=100, description="Número máximo de itens a retornar")
+    limit: int = Query(10, gt=0, le=100, description="Número máximo de itens a retornar"),
+    cursor: str = Query(None, description="Cursor da próxima página (cabeçalho X-Next-Cursor da resposta anterior)"),
+    limit_aeronaves: int = Query(10, gt=0, le=100, description="Aeronaves por companhia (as demais em /cias/{id}/aeronaves)"),
+    limit_voos: int = Query(10, gt=0, le=100, description="Voos mais recentes por companhia (os demais em /cias/{id}/voos)"),
+    engine: AIOEngine = Depends(get_engine),
 ):
-    if id:
-        cia = await engine.find_one(Cia, Cia.id == ObjectId(id))
-        if not cia:
-            raise HTTPException(status_code=404, detail="Companhia aérea não encontrada")
-        
-        # Obter as aeronaves associadas à companhia
-        aeronaves = await engine.find(Aeronave, Aeronave.id.in_(cia.aeronaves)) if cia.aeronaves else []
-        # Obter os voos associados à companhia
-        voos = await engine.find(Voo, Voo.id.in_(cia.voos)) if cia.voos else []
-        
-        return [{
-            "id": str(cia.id),
-            "nome": cia.nome,
-            "cod_iata": cia.cod_iata,
-            "aeronaves": [{
-                "id": str(aero.id),
-                "modelo": aero.modelo,
-                "capacidade": aero.capacidade,
-                "last_check": aero.last_check,
-                "next_check": aero.next_check
-            } for aero in aeronaves],
-            "voos": [{
-                "id": str(voo.id),
-                "numero_voo": voo.numero_voo,
-                "origem": voo.origem,
-                "destino": voo.destino,
-                "hr_partida": voo.hr_partida,
-                "hr_chegada": voo.hr_chegada,
-                "status": voo.status
-            } for voo in voos]
-        }]
-    
-    # Se 'id' não for fornecido, retorna todas as companhias com paginação
-    cias = await engine.find(Cia, skip=offset, limit=limit)
-    
-    resultado = []
-    for cia in cias:
-        aeronaves = await engine.find(Aeronave, Aeronave.id.in_(cia.aeronaves)) if cia.aeronaves else []
-        voos = await engine.find(Voo, Voo.id.in_(cia.voos)) if cia.voos else []
-        resultado.append({
-            "id": str(cia.id),
-            "nome": cia.nome,
-            "cod_iata": cia.cod_iata,
-            "aeronaves": [{
-                "id": str(aero.id),
-                "modelo": aero.modelo,
-                "capacidade": aero.capacidade,
-                "last_check": aero.last_check,
-                "next_check": aero.next_check
-            } for aero in aeronaves],
-            "voos": [{
-                "id": str(voo.id),
-                "numero_voo": voo.numero_voo,
-                "origem": voo.origem,
-                "destino": voo.destino,
-                "hr_partida": voo.hr_partida,
-                "hr_chegada": voo.hr_chegada,
-                "status": voo.status
-            } for voo in voos]
-        })
-    
-    return resultado
+    def pipeline(filtros, offset: int, limit: int):
+        return pipeline_cias_completas(filtros, offset, limit, limit_aeronaves, limit_voos)
+
+    async def calcular():
+        if id:
+            pipeline_id = pipeline({"_id": ObjectId(id)}, 0, 1)
+            cias = await agregar(engine, Cia, pipeline_id)
+            if not cias:
+                raise HTTPException(status_code=404, detail="Companhia aérea não encontrada")
+
+            return [formatar_cia_completa(cias[0])], None
+
+        # Se 'id' não for fornecido, retorna todas as companhias com paginação
+        # Aeronaves e voos vêm no mesmo pipeline ($lookup), uma única consulta por página
+        cias, proximo = await paginar_agregacao(engine, Cia, pipeline, None, limit, offset, cursor)
+        return [formatar_cia_completa(cia) for cia in cias], proximo
+
+    # Pedidos idênticos e simultâneos compartilham o mesmo cálculo
+    parametros = {
+        "id": id, "offset": offset, "limit": limit, "cursor": cursor,
+        "limit_aeronaves": limit_aeronaves, "limit_voos": limit_voos,
+    }
+    return await respostas.responder("/cias/cia_completa", parametros, (Cia, Aeronave, Voo), calcular)
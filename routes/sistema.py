@@ -0,0 +1,95 @@
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import PlainTextResponse
+from cache import referencias
+from respostas import respostas
+from versoes import versoes
+from transmissao import difusor
+from painel import painel
+from arquivamento import COLECAO_ARQUIVO, HORIZONTE_ARQUIVO, arquivar, estado as estado_arquivamento
+from tarefas import ReservaPerdida
+from metricas import metricas
+import limites
+import database
+from database import get_engine
+from busca import reindexar_todos
+
+router = APIRouter(
+    prefix="",  # Rotas de operação do serviço
+    tags=["Sistema"],   # Tag para documentação automática
+)
+
+# Estatísticas do cache de referências (Cia/Aeronave)
+@router.get("/cache")
+async def estatisticas_cache():
+    return referencias.estatisticas()
+
+# Estatísticas do cache de respostas das rotas "completas"
+@router.get("/cache/respostas")
+async def estatisticas_respostas():
+    return respostas.estatisticas()
+
+# Versões por coleção usadas nas ETags das listagens
+@router.get("/versoes")
+async def estatisticas_versoes():
+    return versoes.estatisticas()
+
+# Clientes conectados em /voos/stream e modo de captura das alterações
+@router.get("/stream")
+async def estatisticas_stream():
+    return difusor.estatisticas()
+
+# Índice em memória do painel dos aeroportos
+@router.get("/painel")
+async def estatisticas_painel():
+    return painel.estatisticas()
+
+# Limites adaptativos de concorrência por classe de rota
+@router.get("/limites")
+async def estatisticas_limites():
+    return limites.estatisticas()
+
+# Situação do arquivamento de voos antigos
+@router.get("/arquivamento")
+async def situacao_arquivamento():
+    return {"colecao": COLECAO_ARQUIVO, "horizonte_dias": HORIZONTE_ARQUIVO, **estado_arquivamento}
+
+# Executa o arquivamento agora (ex.: antes de uma janela de carga)
+@router.post("/arquivamento")
+async def executar_arquivamento(
+    horizonte_dias: int = Query(HORIZONTE_ARQUIVO or None, gt=0, description="Arquivar voos com partida há mais de N dias"),
+):
+    if not horizonte_dias:
+        raise HTTPException(status_code=400, detail="Informe horizonte_dias")
+    try:
+        arquivados = await arquivar(get_engine(), horizonte_dias)
+    except ReservaPerdida:
+        raise HTTPException(status_code=409, detail="Arquivamento assumido por outro worker")
+    # Outra execução, neste ou em outro worker, tem a reserva
+    if arquivados is None:
+        raise HTTPException(status_code=409, detail="Arquivamento já em execução")
+    return {"arquivados": arquivados}
+
+# Preenche as chaves de busca de documentos gravados antes delas existirem
+@router.post("/busca/reindexar")
+async def reindexar_busca():
+    return await reindexar_todos(get_engine())
+
+# Prontidão: o worker tem cliente conectado e o banco responde
+@router.get("/ready")
+async def prontidao(response: Response):
+    estado = {"banco": "desconectado", "pool": database.estado_pool.resumo()}
+    if database.client is None:
+        response.status_code = 503
+        return estado
+    try:
+        await database.client.admin.command("ping")
+        estado["banco"] = "ok"
+    except Exception as e:
+        response.status_code = 503
+        estado["banco"] = f"erro: {e}"
+    return estado
+
+# Métricas no formato de exposição do Prometheus
+@router.get("/metrics", response_class=PlainTextResponse)
+async def exportar_metricas():
+    return PlainTextResponse(metricas.exportar(), media_type="text/plain; version=0.0.4")
@@ -1,79 +1,166 @@
-from fastapi import APIRouter, HTTPException, Query
-from odmantic import ObjectId
+from fastapi import APIRouter, HTTPException, Query, Response, Request, Depends, Header
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from odmantic import ObjectId, AIOEngine
 from typing import List, Dict
-from models import Voo, Aeronave, Cia
+from models import Voo, VooParcial, Aeronave, Cia
 from database import get_engine
-from datetime import datetime
+from agregacoes import agregar, anexar_referencias, paginar_agregacao, pipeline_voos_completos, formatar_voo_completo, CAMPOS_VOO
+from paginacao import paginar, paginar_documentos, paginar_com_arquivo, definir_cursor, validar_ordenacao, ordenacao_mongo
+from serializacao import RespostaJSON, documento, projecao
+from exportacao import exportar, TAMANHO_LOTE_EXPORTACAO
+from contadores import incrementar, transferir, TOTAL_VOOS
+from lote import importar, TAMANHO_LOTE
+from atualizacao import alterados, atualizar_parcial, etag, VERSAO
+from conflitos import CAMPOS_AGENDA, agenda, agenda_lote, agenda_voo, verificar_conflito, conflitos_lote
+from busca import TERMOS, filtro_prefixo, inserir, sugerir
+from respostas import respostas
+from versoes import versoes, condicional
+from transmissao import FiltroStream, difusor, transmitir
+from arquivamento import COLECAO_ARQUIVO, remover_do_arquivo
+from analises import registrar_remocao
+from painel import painel, PARTIDAS, CHEGADAS, JANELA_PAINEL
+from datetime import datetime, timedelta
+from contextlib import nullcontext
 
 router = APIRouter(
     prefix="/voos",
     tags=["Voos"],
 )
 
-engine = get_engine()
+# Campos que podem ser usados em ordenação (todos cobertos por índice com _id)
+ORDENACOES_VOO = {"hr_partida", "hr_chegada", "numero_voo"}
+
+# Campos substituídos pelo PUT (versão e atualizado_em são do servidor)
+CAMPOS_PUT_VOO = {"numero_voo", "origem", "destino", "hr_partida", "hr_chegada", "status", "aeronave", "cia"}
+
+# Intervalo padrão do painel, dentro da janela em memória; painel desligado (janela 0) responde 503
+HORAS_PAINEL = min(2, JANELA_PAINEL) or 2
 
 # Create
 @router.post("/", response_model=Voo)
-async def create_voo(voo_data: Voo):
+async def create_voo(voo_data: Voo, engine: AIOEngine = Depends(get_engine)):
     # Conversão de datas caso sejam strings
     if isinstance(voo_data.hr_partida, str):
         voo_data.hr_partida = datetime.fromisoformat(voo_data.hr_partida.replace("Z", "+00:00"))
     if isinstance(voo_data.hr_chegada, str):
         voo_data.hr_chegada = datetime.fromisoformat(voo_data.hr_chegada.replace("Z", "+00:00"))
 
-    await engine.save(voo_data)
+    # A aeronave não pode estar em outro voo no mesmo horário; a agenda segura o horário até gravar
+    async with agenda(engine, [voo_data.aeronave]):
+        await verificar_conflito(engine, voo_data.aeronave, voo_data.hr_partida, voo_data.hr_chegada)
+        voo_data.atualizado_em = datetime.utcnow()
+        doc = await inserir(engine, Voo, voo_data)
+    versoes.alterar(Voo)
+    painel.aplicar(doc)
+    await incrementar(engine, voo_data.cia, TOTAL_VOOS)
     return voo_data
 
 
+# Create - Importação em lote (array JSON ou NDJSON)
+@router.post("/bulk")
+async def create_voos_bulk(
+    request: Request,
+    tamanho_lote: int = Query(TAMANHO_LOTE, gt=0, le=10000, description="Itens gravados por lote"),
+    engine: AIOEngine = Depends(get_engine),
+):
+    return await importar(
+        engine, request, Voo, {"cia": Cia, "aeronave": Aeronave}, TOTAL_VOOS, tamanho_lote, conflitos_lote, agenda_lote
+    )
+
+
 # Read - Listagem Paginada
 @router.get("/read", response_model=List[Voo])
 async def listar_voos(
     offset: int = Query(0, ge=0, description="Número de itens a pular"),
-    limit: int = Query(10, gt=0, le=100, description="Número máximo de itens a retornar")
+    limit: int = Query(10, gt=0, le=100, description="Número máximo de itens a retornar"),
+    cursor: str = Query(None, description="Cursor da próxima página (cabeçalho X-Next-Cursor da resposta anterior)"),
+    incluir_arquivados: bool = Query(False, description="Incluir voos antigos já movidos para o arquivo"),
+    tag: str = Depends(condicional(Voo)),  # 304 sem consultar o banco se nada mudou
+    engine: AIOEngine = Depends(get_engine),
 ):
-    return await engine.find(Voo, skip=offset, limit=limit)
+    # Caminho rápido: documentos crus do Motor com projeção, sem hidratar o modelo
+    if incluir_arquivados:
+        docs, proximo = await paginar_com_arquivo(
+            engine, Voo, COLECAO_ARQUIVO, None, limit, offset, cursor, projecao=projecao(Voo)
+        )
+    else:
+        docs, proximo = await paginar_documentos(
+            engine, Voo, None, limit, offset, cursor, projecao=projecao(Voo)
+        )
+    resposta = RespostaJSON([documento(Voo, doc) for doc in docs], headers={"ETag": tag, "Cache-Control": "no-cache"})
+    definir_cursor(resposta, proximo)
+    return resposta
 
 
 # Update
 @router.put("/{id}", response_model=Voo)
-async def update_voo(id: str, voo_data: Voo):
-    voo = await engine.find_one(Voo, Voo.id == ObjectId(id))
-    if not voo:
-        raise HTTPException(status_code=404, detail="Voo não encontrado")
+async def update_voo(
+    id: str,
+    voo_data: Voo,
+    if_match: str = Header(None, description="Versão esperada (ETag); responde 412 se o documento mudou"),
+    engine: AIOEngine = Depends(get_engine),
+):
+    async with agenda_voo(engine, ObjectId(id), voo_data.aeronave):
+        await verificar_conflito(engine, voo_data.aeronave, voo_data.hr_partida, voo_data.hr_chegada, ObjectId(id))
+
+        # Mesmo caminho do PATCH ($set + $inc na versão em uma operação): um PATCH simultâneo não é sobrescrito
+        antes, depois = await atualizar_parcial(
+            engine, Voo, ObjectId(id), voo_data.model_dump_doc(include=CAMPOS_PUT_VOO), if_match, "Voo não encontrado"
+        )
+    versoes.alterar(Voo, alterados(antes, depois), antes["_id"])
+    painel.aplicar(depois)
+    await transferir(engine, antes["cia"], depois["cia"], TOTAL_VOOS)
+    return RespostaJSON(documento(Voo, depois), headers={"ETag": etag(depois[VERSAO])})
+
+
+# Update parcial (PATCH): só os campos enviados, em uma única operação atômica
+@router.patch("/{id}", response_model=Voo)
+async def patch_voo(
+    id: str,
+    dados: VooParcial,
+    if_match: str = Header(None, description="Versão esperada (ETag); responde 412 se o documento mudou"),
+    engine: AIOEngine = Depends(get_engine),
+):
+    alteracoes = dados.model_dump(exclude_unset=True)
 
-    # Atualizando os campos
-    voo.numero_voo = voo_data.numero_voo
-    voo.origem = voo_data.origem
-    voo.destino = voo_data.destino
-    voo.hr_partida = voo_data.hr_partida
-    voo.hr_chegada = voo_data.hr_chegada
-    voo.status = voo_data.status
-    voo.aeronave = voo_data.aeronave
-    voo.cia = voo_data.cia
+    # Mudança de aeronave ou horário: confere conflito com o estado atual do voo, dentro da agenda
+    muda_agenda = alteracoes.keys() & CAMPOS_AGENDA.keys()
+    async with agenda_voo(engine, ObjectId(id), alteracoes.get("aeronave")) if muda_agenda else nullcontext() as atual:
+        if atual:
+            novo = {**atual, **alteracoes}
+            await verificar_conflito(engine, novo["aeronave"], novo["hr_partida"], novo["hr_chegada"], atual["_id"])
 
-    await engine.save(voo)
-    return voo
+        antes, depois = await atualizar_parcial(
+            engine, Voo, ObjectId(id), alteracoes, if_match, "Voo não encontrado"
+        )
+    versoes.alterar(Voo, alterados(antes, depois), antes["_id"])
+    painel.aplicar(depois)
+    await transferir(engine, antes["cia"], depois["cia"], TOTAL_VOOS)
+    return RespostaJSON(documento(Voo, depois), headers={"ETag": etag(depois[VERSAO])})
 
 
 # Delete
 @router.delete("/{id}", response_model=Dict[str, str])
-async def delete_voo(id: str):
+async def delete_voo(id: str, engine: AIOEngine = Depends(get_engine)):
     voo = await engine.find_one(Voo, Voo.id == ObjectId(id))
     if not voo:
         raise HTTPException(status_code=404, detail="Voo não encontrado")
 
     await engine.delete(voo)
+    await remover_do_arquivo(engine, voo.id)
+    versoes.alterar(Voo)
+    painel.remover(voo.id)
+    await incrementar(engine, voo.cia, TOTAL_VOOS, -1)
+    await registrar_remocao(engine, voo.id)
     return {"message": "Voo excluído com sucesso"}
 
-# Read - Filtros
-@router.get("/filtros", response_model=List[Voo])
-async def read_voos_filtro(
+def montar_filtros_voo(
     id: str = None,
     data_inicio: str = None,
     data_fim: str = None,
     busca_texto: str = None,
-    ordenacao: str = Query(None, description="Ordenar por 'hr_partida' ou 'hr_chegada'")
-):
+) -> dict:
     filtros = {}
 
     if id:
@@ -87,84 +174,157 @@ async def read_voos_filtro(
         data_fim_dt = datetime.strptime(data_fim, "%Y-%m-%d")
         filtros.setdefault("hr_partida", {})["$lte"] = data_fim_dt
     
+    # Prefixo de origem/destino (sem acento, qualquer caixa) pelo índice de termos
     if busca_texto:
-        filtros["$or"] = [
-            {"origem": {"$regex": busca_texto, "$options": "i"}},
-            {"destino": {"$regex": busca_texto, "$options": "i"}}
-        ]
+        filtros.update(filtro_prefixo(TERMOS, busca_texto))
 
-    voos = await engine.find(Voo, filtros)
-    
-    if ordenacao:
-        voos = sorted(voos, key=lambda x: getattr(x, ordenacao, None))
-    
+    return filtros
+
+
+# Read - Filtros (com ETag: 304 sem consultar o banco se nada mudou)
+@router.get("/filtros", response_model=List[Voo])
+async def read_voos_filtro(
+    response: Response,
+    id: str = None,
+    data_inicio: str = None,
+    data_fim: str = None,
+    busca_texto: str = None,
+    ordenacao: str = Query(None, description="Ordenar por 'hr_partida', 'hr_chegada' ou 'numero_voo'"),
+    ordem: str = Query("asc", pattern="^(asc|desc)$", description="Sentido da ordenação: 'asc' ou 'desc'"),
+    offset: int = Query(0, ge=0, description="Número de itens a pular"),
+    limit: int = Query(10, gt=0, le=100, description="Número máximo de itens a retornar"),
+    cursor: str = Query(None, description="Cursor da próxima página (cabeçalho X-Next-Cursor da resposta anterior)"),
+    incluir_arquivados: bool = Query(False, description="Incluir voos antigos já movidos para o arquivo"),
+    tag: str = Depends(condicional(Voo)),
+    engine: AIOEngine = Depends(get_engine),
+):
+    campo = validar_ordenacao(ordenacao, ORDENACOES_VOO)
+    filtros = montar_filtros_voo(id, data_inicio, data_fim, busca_texto)
+
+    # Arquivo só é consultado quando pedido; a coleção principal continua pequena
+    if incluir_arquivados:
+        docs, proximo = await paginar_com_arquivo(
+            engine, Voo, COLECAO_ARQUIVO, filtros, limit, offset, cursor,
+            ordenacao=campo, decrescente=ordem == "desc", projecao=projecao(Voo),
+        )
+        resposta = RespostaJSON([documento(Voo, doc) for doc in docs], headers={"ETag": tag, "Cache-Control": "no-cache"})
+        definir_cursor(resposta, proximo)
+        return resposta
+
+    # Ordenação e limite feitos no banco: memória proporcional à página
+    voos, proximo = await paginar(
+        engine, Voo, filtros, limit, offset, cursor, ordenacao=campo, decrescente=ordem == "desc"
+    )
+    definir_cursor(response, proximo)
     return voos
 
 
+# Autocompletar aeroportos (origem/destino) a partir de um prefixo
+@router.get("/autocomplete", response_model=List[str])
+async def autocompletar_aeroportos(
+    prefixo: str = Query(..., min_length=1, description="Início do nome ou código do aeroporto"),
+    limit: int = Query(10, gt=0, le=50, description="Número máximo de sugestões"),
+    engine: AIOEngine = Depends(get_engine),
+):
+    return await sugerir(engine, Voo, prefixo, limit)
+
+
+# Alterações de voos em tempo real (Server-Sent Events), no lugar de consultar /voos/filtros em intervalos
+@router.get("/stream")
+async def stream_voos(
+    cia_id: str = Query(None, description="Só voos desta companhia aérea"),
+    aeronave_id: str = Query(None, description="Só voos desta aeronave"),
+    origem: str = Query(None, description="Código do aeroporto de origem"),
+    destino: str = Query(None, description="Código do aeroporto de destino"),
+    data_inicio: str = Query(None, description="Partida a partir desta data (YYYY-MM-DD)"),
+    data_fim: str = Query(None, description="Partida até esta data (YYYY-MM-DD)"),
+    engine: AIOEngine = Depends(get_engine),
+):
+    filtro = FiltroStream(
+        cia=ObjectId(cia_id) if cia_id else None,
+        aeronave=ObjectId(aeronave_id) if aeronave_id else None,
+        origem=origem.upper() if origem else None,
+        destino=destino.upper() if destino else None,
+        data_inicio=datetime.strptime(data_inicio, "%Y-%m-%d") if data_inicio else None,
+        data_fim=datetime.strptime(data_fim, "%Y-%m-%d") if data_fim else None,
+    )
+    # Assina antes de montar a resposta: o 503 do limite sai antes dos cabeçalhos do stream
+    assinatura = difusor.assinar(engine, filtro)
+    return StreamingResponse(
+        transmitir(assinatura),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Cliente que desconecta antes do primeiro evento não chega a rodar o finally do gerador
+        background=BackgroundTask(difusor.cancelar, assinatura),
+    )
+
+
+# Painel do aeroporto (próximas partidas ou chegadas), respondido do índice em memória sem ir ao banco
+@router.get("/painel/{aeroporto}", response_model=List[Voo])
+async def painel_aeroporto(
+    aeroporto: str,
+    tipo: str = Query(PARTIDAS, pattern=f"^({PARTIDAS}|{CHEGADAS})$", description="partidas (por hr_partida) ou chegadas (por hr_chegada)"),
+    inicio: datetime = Query(None, description="A partir deste horário (UTC); padrão: agora"),
+    horas: float = Query(HORAS_PAINEL, gt=0, le=JANELA_PAINEL or None, description="Tamanho do intervalo em horas (até a janela do painel)"),
+    limit: int = Query(20, gt=0, le=200, description="Número máximo de voos a retornar"),
+):
+    inicio = inicio or datetime.utcnow()
+    return RespostaJSON(painel.consultar(aeroporto, tipo, inicio, inicio + timedelta(hours=horas), limit))
+
+
+# Read - Exportação em streaming (mesmos filtros de /voos/filtros)
+@router.get("/export")
+async def exportar_voos(
+    filtros: dict = Depends(montar_filtros_voo),
+    ordenacao: str = Query(None, description="Ordenar por 'hr_partida', 'hr_chegada' ou 'numero_voo'"),
+    ordem: str = Query("asc", pattern="^(asc|desc)$", description="Sentido da ordenação: 'asc' ou 'desc'"),
+    formato: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Formato: 'ndjson' ou 'csv'"),
+    tamanho_lote: int = Query(TAMANHO_LOTE_EXPORTACAO, gt=0, le=10000, description="Documentos por lote do cursor"),
+    engine: AIOEngine = Depends(get_engine),
+):
+    campo = validar_ordenacao(ordenacao, ORDENACOES_VOO)
+    return exportar(
+        engine,
+        Voo,
+        filtros,
+        CAMPOS_VOO + ["aeronave", "cia"],
+        formato,
+        tamanho_lote,
+        ordenacao=ordenacao_mongo(campo, ordem == "desc"),
+        nome_arquivo="voos",
+    )
+
+
 # Read - Consulta Completa de Voos (com Companhia e Aeronave)
 @router.get("/completo", response_model=list[dict])
 async def voos_completos(
     id: str = None,  # ID opcional
     offset: int = Query(0, ge=0, description="Número de itens a pular"),
-    limit: int = Query(10, gt=0, le=100, description="Número máximo de itens a retornar")
+    limit: int = Query(10, gt=0, le=100, description="Número máximo de itens a retornar"),
+    cursor: str = Query(None, description="Cursor da próxima página (cabeçalho X-Next-Cursor da resposta anterior)"),
+    engine: AIOEngine = Depends(get_engine),
 ):
-    # buscar voo específico
-    if id:
-        voo = await engine.find_one(Voo, Voo.id == ObjectId(id))
-        
-        if not voo:
-            raise HTTPException(status_code=404, detail="Voo não encontrado")
-        
-        # Obter informações da companhia e da aeronave
-        cia = await engine.find_one(Cia, Cia.id == voo.cia)
-        aeronave = await engine.find_one(Aeronave, Aeronave.id == voo.aeronave)
-
-        return [{
-            "id": str(voo.id),
-            "numero_voo": voo.numero_voo,
-            "origem": voo.origem,
-            "destino": voo.destino,
-            "hr_partida": voo.hr_partida,
-            "hr_chegada": voo.hr_chegada,
-            "status": voo.status,
-            "cia": {
-                "id": str(cia.id) if cia else None,
-                "nome": cia.nome if cia else None,
-                "cod_iata": cia.cod_iata if cia else None
-            },
-            "aeronave": {
-                "id": str(aeronave.id) if aeronave else None,
-                "modelo": aeronave.modelo if aeronave else None,
-                "capacidade": aeronave.capacidade if aeronave else None
-            }
-        }]
-
-    # Se id não for fornecido retorna todos os voos com paginação
-    voos = await engine.find(Voo, skip=offset, limit=limit)
-
-    resultado = []
-    for voo in voos:
-        cia = await engine.find_one(Cia, Cia.id == voo.cia)
-        aeronave = await engine.find_one(Aeronave, Aeronave.id == voo.aeronave)
-        
-        resultado.append({
-            "id": str(voo.id),
-            "numero_voo": voo.numero_voo,
-            "origem": voo.origem,
-            "destino": voo.destino,
-            "hr_partida": voo.hr_partida,
-            "hr_chegada": voo.hr_chegada,
-            "status": voo.status,
-            "cia": {
-                "id": str(cia.id) if cia else None,
-                "nome": cia.nome if cia else None,
-                "cod_iata": cia.cod_iata if cia else None
-            },
-            "aeronave": {
-                "id": str(aeronave.id) if aeronave else None,
-                "modelo": aeronave.modelo if aeronave else None,
-                "capacidade": aeronave.capacidade if aeronave else None
-            }
-        })
-
-    return resultado
+    async def calcular():
+        # buscar voo específico
+        if id:
+            pipeline = pipeline_voos_completos({"_id": ObjectId(id)}, 0, 1)
+            voos = await agregar(engine, Voo, pipeline)
+
+            if not voos:
+                raise HTTPException(status_code=404, detail="Voo não encontrado")
+
+            await anexar_referencias(engine, voos, "cia", Cia)
+            await anexar_referencias(engine, voos, "aeronave", Aeronave)
+
+            return [formatar_voo_completo(voos[0])], None
+
+        # Se id não for fornecido retorna todos os voos com paginação
+        # Uma consulta para a página; companhia e aeronave vêm do cache de referências
+        voos, proximo = await paginar_agregacao(engine, Voo, pipeline_voos_completos, None, limit, offset, cursor)
+        await anexar_referencias(engine, voos, "cia", Cia)
+        await anexar_referencias(engine, voos, "aeronave", Aeronave)
+        return [formatar_voo_completo(voo) for voo in voos], proximo
+
+    # Pedidos idênticos e simultâneos compartilham o mesmo cálculo
+    parametros = {"id": id, "offset": offset, "limit": limit, "cursor": cursor}
+    return await respostas.responder("/voos/completo", parametros, (Voo, Cia, Aeronave), calcular)
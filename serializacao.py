@@ -0,0 +1,54 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from fastapi.responses import Response
+from bson import ObjectId
+import orjson
+
+
+def _padrao(valor: Any) -> Any:
+    if isinstance(valor, ObjectId):
+        return str(valor)
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def dumps(conteudo: Any) -> bytes:
+    return orjson.dumps(conteudo, default=_padrao)
+
+
+class RespostaJSON(Response):
+    """Resposta JSON que serializa direto (ObjectId e datetime), sem passar pelo pydantic."""
+
+    media_type = "application/json"
+
+    def render(self, conteudo: Any) -> bytes:
+        return dumps(conteudo)
+
+
+def campos_modelo(model) -> List[str]:
+    return [campo for campo in model.model_fields if campo != "id"]
+
+
+def projecao(model) -> Dict[str, int]:
+    return {campo: 1 for campo in campos_modelo(model)}
+
+
+def documento(model, doc: Dict[str, Any], campos: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Converte um documento BSON no mesmo dicionário que o modelo ODMantic geraria.
+
+    Campos ausentes recebem o default do modelo, como na hidratação do ODMantic.
+    """
+    resultado = {}
+    for campo in campos or campos_modelo(model):
+        if campo in doc:
+            valor = doc[campo]
+        else:
+            valor = model.model_fields[campo].get_default(call_default_factory=True)
+        if isinstance(valor, list):
+            valor = [str(item) if isinstance(item, ObjectId) else item for item in valor]
+        resultado[campo] = valor
+    # O ODMantic serializa o id por último
+    resultado["id"] = str(doc["_id"])
+    return resultado
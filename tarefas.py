@@ -0,0 +1,49 @@
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+# Estado das tarefas de fundo compartilhado entre os workers (reservas e marcas d'água)
+COLECAO_TAREFAS = "tarefas"
+
+# Identifica este worker nas reservas
+DONO = uuid.uuid4().hex
+
+
+class ReservaPerdida(Exception):
+    """A reserva venceu durante a execução e outro worker assumiu a tarefa."""
+
+
+async def reservar(engine, tarefa: str, duracao: float) -> bool:
+    """Só um worker executa a tarefa por vez: reserva com prazo, renovável pelo próprio dono."""
+    agora = datetime.utcnow()
+    try:
+        await engine.database[COLECAO_TAREFAS].find_one_and_update(
+            {"_id": tarefa, "$or": [{"ate": {"$lt": agora}}, {"dono": DONO}]},
+            {"$set": {"dono": DONO, "ate": agora + timedelta(seconds=duracao)}},
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        # Outro worker tem a reserva ainda válida
+        return False
+
+
+async def renovar(engine, tarefa: str, duracao: float) -> None:
+    """Estende a reserva durante uma execução longa; interrompe a execução se ela foi perdida."""
+    if not await reservar(engine, tarefa, duracao):
+        raise ReservaPerdida(tarefa)
+
+
+async def liberar(engine, tarefa: str) -> None:
+    # Encerra o prazo só se a reserva ainda é deste worker
+    await engine.database[COLECAO_TAREFAS].update_one({"_id": tarefa, "dono": DONO}, {"$set": {"ate": datetime.utcnow()}})
+
+
+async def ler(engine, tarefa: str) -> Optional[Dict[str, Any]]:
+    return await engine.database[COLECAO_TAREFAS].find_one({"_id": tarefa})
+
+
+async def gravar(engine, tarefa: str, valores: Dict[str, Any]) -> None:
+    await engine.database[COLECAO_TAREFAS].update_one({"_id": tarefa}, {"$set": valores}, upsert=True)
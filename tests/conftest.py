@@ -0,0 +1,70 @@
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Os testes rodam contra um mongod descartável (ex.: MONGO_URI_TESTES=mongodb://localhost:27017);
+# a sessão cria um banco próprio e o apaga no final
+MONGO_URI_TESTES = os.getenv("MONGO_URI_TESTES")
+
+# Horários bem no futuro, longe dos dados de outros testes e do benchmark
+INICIO_TESTES = datetime(2200, 1, 1)
+
+
+@pytest.fixture(scope="session")
+def cliente():
+    if not MONGO_URI_TESTES:
+        pytest.skip("Defina MONGO_URI_TESTES com um mongod descartável para rodar os testes")
+    import database
+    import main
+
+    database.MONGO_URI = MONGO_URI_TESTES
+    database.MONGO_DB = f"testes_{uuid.uuid4().hex[:12]}"
+    with TestClient(main.app) as cliente:
+        yield cliente
+        cliente.portal.call(database.client.drop_database, database.MONGO_DB)
+
+
+@pytest.fixture
+def engine(cliente):
+    import database
+
+    return database.get_engine()
+
+
+@pytest.fixture
+def cia(cliente) -> str:
+    sufixo = uuid.uuid4().hex[:8]
+    resposta = cliente.post("/cias/", json={"nome": f"Companhia {sufixo}", "cod_iata": sufixo[:2].upper()})
+    assert resposta.status_code == 200, resposta.text
+    return resposta.json()["id"]
+
+
+@pytest.fixture
+def aeronave(cliente, cia) -> str:
+    resposta = cliente.post("/aeronaves/", json={"modelo": "A320", "capacidade": 180, "cia": cia})
+    assert resposta.status_code == 200, resposta.text
+    return resposta.json()["id"]
+
+
+@pytest.fixture
+def novo_voo():
+    """Corpo de um voo `horas_depois` de INICIO_TESTES, com `duracao` horas."""
+
+    def montar(aeronave: str, cia: str, horas_depois: float = 0, duracao: float = 1, **campos):
+        partida = INICIO_TESTES + timedelta(hours=horas_depois)
+        return {
+            "numero_voo": 1000,
+            "origem": "GRU",
+            "destino": "GIG",
+            "hr_partida": partida.isoformat(),
+            "hr_chegada": (partida + timedelta(hours=duracao)).isoformat(),
+            "status": "programado",
+            "aeronave": aeronave,
+            "cia": cia,
+            **campos,
+        }
+
+    return montar
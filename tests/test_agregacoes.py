@@ -0,0 +1,40 @@
+import pytest
+
+from cache import referencias
+from metricas import metricas
+
+
+@pytest.fixture
+def frota(cliente, novo_voo):
+    # Duas companhias com três aeronaves cada e 100 voos: páginas de 1 e de 100 itens têm conteúdo diferente
+    voos = []
+    for numero in range(2):
+        cia = cliente.post("/cias/", json={"nome": f"Frota {numero}", "cod_iata": f"F{numero}"}).json()["id"]
+        aeronaves = [
+            cliente.post("/aeronaves/", json={"modelo": f"E19{posicao}", "capacidade": 100, "cia": cia}).json()["id"]
+            for posicao in range(3)
+        ]
+        voos += [novo_voo(aeronaves[posicao % 3], cia, horas_depois=posicao * 2, numero_voo=posicao) for posicao in range(50)]
+    resposta = cliente.post("/voos/bulk", json=voos)
+    assert resposta.json()["inseridos"] == 100, resposta.text
+
+
+def _comandos(cliente, rota: str, limit: int):
+    # Cache de referências vazio: a página paga também a resolução de aeronave/cia
+    referencias.limpar()
+    anterior = metricas.comandos_por_requisicao.get(rota)
+    antes = anterior.soma if anterior else 0
+    resposta = cliente.get(rota, params={"limit": limit})
+    assert resposta.status_code == 200, resposta.text
+    return metricas.comandos_por_requisicao[rota].soma - antes, len(resposta.json())
+
+
+@pytest.mark.parametrize("rota", ["/voos/completo", "/aeronaves/completa", "/cias/cia_completa"])
+def test_comandos_por_pagina_nao_dependem_do_limit(cliente, frota, rota):
+    comandos_um, itens_um = _comandos(cliente, rota, 1)
+    comandos_cem, itens_cem = _comandos(cliente, rota, 100)
+
+    assert itens_um == 1 and itens_cem > 1
+    # A agregação da página e, no máximo, uma consulta $in por referência (aeronave e cia)
+    assert 0 < comandos_um <= 3
+    assert comandos_cem == comandos_um
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import analises
+from tarefas import COLECAO_TAREFAS
+
+
+def _reserva_de_outro_worker(cliente, engine, ate: datetime) -> None:
+    cliente.portal.call(
+        engine.database[COLECAO_TAREFAS].update_one,
+        {"_id": analises.TAREFA},
+        {"$set": {"dono": "outro-worker", "ate": ate}},
+        True,
+    )
+
+
+@pytest.fixture
+def reserva_devolvida(cliente, engine):
+    yield
+    _reserva_de_outro_worker(cliente, engine, datetime.utcnow() - timedelta(seconds=1))
+
+
+def test_atualizar_responde_409_com_reserva_de_outro_worker(cliente, engine, reserva_devolvida):
+    _reserva_de_outro_worker(cliente, engine, datetime.utcnow() + timedelta(minutes=1))
+    assert cliente.post("/analises/atualizar").status_code == 409
+
+    # Reserva vencida: este worker assume, e a devolve ao terminar
+    _reserva_de_outro_worker(cliente, engine, datetime.utcnow() - timedelta(seconds=1))
+    assert cliente.post("/analises/atualizar", params={"completa": True}).status_code == 200
+    assert cliente.post("/analises/atualizar").status_code == 200
+
+
+def test_atualizacao_para_quando_perde_a_reserva(cliente, engine, aeronave, cia, novo_voo, reserva_devolvida, monkeypatch):
+    assert cliente.post("/analises/atualizar", params={"completa": True}).status_code == 200
+    for horas in (0, 2, 4):
+        assert cliente.post("/voos/", json=novo_voo(aeronave, cia, horas_depois=horas)).status_code == 200
+
+    aplicados = []
+    aplicar = analises._aplicar
+
+    async def aplicar_e_perder_reserva(engine, novas):
+        await aplicar(engine, novas)
+        aplicados.append(len(novas))
+        # A reserva venceu durante o lote e outro worker a assumiu
+        await engine.database[COLECAO_TAREFAS].update_one(
+            {"_id": analises.TAREFA}, {"$set": {"dono": "outro-worker", "ate": datetime.utcnow() + timedelta(minutes=1)}}
+        )
+
+    monkeypatch.setattr(analises, "LOTE_ANALISES", 1)
+    monkeypatch.setattr(analises, "ATRASO_ANALISES", timedelta(0))
+    monkeypatch.setattr(analises, "_aplicar", aplicar_e_perder_reserva)
+    assert cliente.post("/analises/atualizar").status_code == 409
+    assert aplicados == [1]
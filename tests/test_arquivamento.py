@@ -0,0 +1,127 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+import arquivamento
+from arquivamento import COLECAO_ARQUIVO, arquivar_lote
+from conftest import INICIO_TESTES
+from models import Voo
+from routes.voo import delete_voo
+from tarefas import COLECAO_TAREFAS
+
+
+class _BancoComInterrupcao:
+    """Banco que roda `durante` logo depois da cópia para o arquivo, antes da remoção."""
+
+    def __init__(self, banco, durante):
+        self._banco = banco
+        self._durante = durante
+
+    def __getitem__(self, nome):
+        colecao = self._banco[nome]
+        if nome != COLECAO_ARQUIVO:
+            return colecao
+        durante = self._durante
+
+        class _Arquivo:
+            def __getattr__(self, atributo):
+                return getattr(colecao, atributo)
+
+            async def bulk_write(self, *args, **kwargs):
+                resultado = await colecao.bulk_write(*args, **kwargs)
+                await durante()
+                return resultado
+
+        return _Arquivo()
+
+
+class _Relogio(datetime):
+    """Agora em INICIO_TESTES: com horizonte de 0 dias, só os voos anteriores são arquivados."""
+
+    @classmethod
+    def utcnow(cls):
+        return INICIO_TESTES
+
+
+def _criar_voos_antigos(cliente, aeronave, cia, novo_voo):
+    return [
+        cliente.post("/voos/", json=novo_voo(aeronave, cia, horas_depois=horas)).json()["id"]
+        for horas in (-10, -8, -6)
+    ]
+
+
+def _sem_perdas(cliente, engine, cia, ids):
+    # Cada voo está em uma das coleções, e o contador bate com os que ficaram
+    no_arquivo = {str(voo_id) for voo_id in cliente.portal.call(engine.database[COLECAO_ARQUIVO].distinct, "_id")}
+    vivos = {
+        str(voo_id)
+        for voo_id in cliente.portal.call(engine.get_collection(Voo).distinct, "_id", {"cia": ObjectId(cia)})
+    }
+    assert set(ids) <= no_arquivo | vivos
+    assert not no_arquivo & vivos
+    assert cliente.get(f"/cias/{cia}/voos/count", params={"materializado": True}).json() == len(vivos)
+
+
+def test_arquivamento_so_desconta_o_que_removeu(cliente, engine, aeronave, cia, novo_voo, monkeypatch):
+    # Antes de INICIO_TESTES: os voos dos outros testes ficam depois do corte
+    ids = _criar_voos_antigos(cliente, aeronave, cia, novo_voo)
+    removido_pela_api, alterado, arquivado = ids
+
+    async def concorrentes():
+        await delete_voo(removido_pela_api, engine=engine)
+        await engine.get_collection(Voo).update_one({"_id": ObjectId(alterado)}, {"$inc": {"versao": 1}})
+
+    monkeypatch.setattr(engine, "database", _BancoComInterrupcao(engine.database, concorrentes))
+    assert cliente.portal.call(arquivar_lote, engine, INICIO_TESTES) == 1
+    monkeypatch.undo()
+
+    # Um desconto da API e um do arquivamento, nunca dois para o mesmo voo
+    assert cliente.get(f"/cias/{cia}/voos/count", params={"materializado": True}).json() == 1
+    no_arquivo = cliente.portal.call(engine.database[COLECAO_ARQUIVO].distinct, "_id", {"cia": ObjectId(cia)})
+    assert [str(voo_id) for voo_id in no_arquivo] == [arquivado]
+    assert cliente.get("/voos/filtros", params={"id": alterado}).status_code == 200
+
+
+def test_lotes_simultaneos_nao_perdem_voos(cliente, engine, aeronave, cia, novo_voo, monkeypatch):
+    ids = _criar_voos_antigos(cliente, aeronave, cia, novo_voo)
+    banco = engine.database
+    movidos_pelo_outro = []
+
+    async def outro_worker():
+        # Sem a reserva (ex.: venceu numa pausa longa): outro lote copia e remove os mesmos voos
+        if not movidos_pelo_outro:
+            monkeypatch.setattr(engine, "database", banco)
+            movidos_pelo_outro.append(await arquivar_lote(engine, INICIO_TESTES))
+
+    monkeypatch.setattr(engine, "database", _BancoComInterrupcao(banco, outro_worker))
+    assert cliente.portal.call(arquivar_lote, engine, INICIO_TESTES) == 0
+    monkeypatch.undo()
+
+    assert movidos_pelo_outro[0] >= len(ids)
+    _sem_perdas(cliente, engine, cia, ids)
+
+
+def test_arquivamentos_simultaneos_executam_um_por_vez(cliente, engine, aeronave, cia, novo_voo, monkeypatch):
+    ids = _criar_voos_antigos(cliente, aeronave, cia, novo_voo)
+    monkeypatch.setattr(arquivamento, "datetime", _Relogio)
+
+    async def dois_arquivamentos():
+        return await asyncio.gather(arquivamento.arquivar(engine, 0), arquivamento.arquivar(engine, 0))
+
+    primeiro, segundo = cliente.portal.call(dois_arquivamentos)
+    assert primeiro >= len(ids) and segundo is None
+    _sem_perdas(cliente, engine, cia, ids)
+
+    # Reserva de outro worker: a execução manual responde 409 sem mexer nos voos
+    tarefas = engine.database[COLECAO_TAREFAS]
+    ate = datetime.utcnow() + timedelta(minutes=1)
+    cliente.portal.call(
+        tarefas.update_one, {"_id": arquivamento.TAREFA}, {"$set": {"dono": "outro-worker", "ate": ate}}
+    )
+    try:
+        assert cliente.post("/arquivamento", params={"horizonte_dias": 1}).status_code == 409
+    finally:
+        cliente.portal.call(
+            tarefas.update_one, {"_id": arquivamento.TAREFA}, {"$set": {"ate": datetime.utcnow() - timedelta(seconds=1)}}
+        )
@@ -0,0 +1,99 @@
+import pytest
+
+
+@pytest.mark.parametrize("campo", ["nome", "cod_iata"])
+def test_patch_recusa_nulo_em_campo_obrigatorio(cliente, cia, campo):
+    resposta = cliente.patch(f"/cias/{cia}", json={campo: None})
+    assert resposta.status_code == 422, resposta.text
+
+    # Nada foi gravado: a listagem continua carregando todas as companhias
+    assert cliente.get("/cias/", params={"limit": 100}).status_code == 200
+    assert cliente.get("/cias/filtros", params={"id": cia}).json()[0][campo] is not None
+
+
+def test_patch_recusa_nulo_em_voo(cliente, aeronave, cia, novo_voo):
+    voo = cliente.post("/voos/", json=novo_voo(aeronave, cia)).json()["id"]
+    assert cliente.patch(f"/voos/{voo}", json={"status": "embarque", "hr_partida": None}).status_code == 422
+    assert cliente.get("/voos/read").status_code == 200
+
+
+def test_put_incrementa_versao_no_banco(cliente, cia):
+    # Cada gravação ganha uma versão própria, seja PUT ou PATCH
+    assert cliente.patch(f"/cias/{cia}", json={"nome": "Primeiro"}).headers["etag"] == '"1"'
+    resposta = cliente.put(f"/cias/{cia}", json={"nome": "Segundo", "cod_iata": "SG", "total_voos": 99})
+    assert resposta.status_code == 200, resposta.text
+    assert resposta.headers["etag"] == '"2"'
+    assert resposta.json()["versao"] == 2
+    # Os contadores não vêm do corpo do PUT
+    assert resposta.json()["total_voos"] == 0
+
+
+def test_put_com_if_match_desatualizado_responde_412(cliente, aeronave, cia):
+    corpo = {"modelo": "A321", "capacidade": 220, "cia": cia}
+    assert cliente.put(f"/aeronaves/{aeronave}", json=corpo, headers={"If-Match": '"0"'}).status_code == 200
+    # Outra gravação já levou a aeronave para a versão 1
+    resposta = cliente.put(f"/aeronaves/{aeronave}", json=corpo, headers={"If-Match": '"0"'})
+    assert resposta.status_code == 412
+
+
+def test_put_de_voo_usa_a_versao_atual(cliente, aeronave, cia, novo_voo):
+    voo = cliente.post("/voos/", json=novo_voo(aeronave, cia)).json()["id"]
+    cliente.patch(f"/voos/{voo}", json={"status": "embarque"})
+    resposta = cliente.put(f"/voos/{voo}", json=novo_voo(aeronave, cia, status="partiu"))
+    assert resposta.status_code == 200, resposta.text
+    assert resposta.json()["versao"] == 2 and resposta.json()["status"] == "partiu"
+    assert cliente.put(f"/voos/{cia}", json=novo_voo(aeronave, cia)).status_code == 404
+
+
+@pytest.fixture
+def documentos(aeronave, cia, cliente, novo_voo):
+    """Por modelo: caminho do documento, corpo de PATCH, corpo de PUT e uma listagem com ETag."""
+    voo = cliente.post("/voos/", json=novo_voo(aeronave, cia)).json()["id"]
+    return {
+        "cia": (f"/cias/{cia}", {"nome": "Renomeada"}, {"nome": "Substituta", "cod_iata": "SB"}, "/cias/"),
+        "aeronave": (
+            f"/aeronaves/{aeronave}", {"capacidade": 150},
+            {"modelo": "A321", "capacidade": 220, "cia": cia}, f"/cias/{cia}/aeronaves",
+        ),
+        "voo": (f"/voos/{voo}", {"status": "embarque"}, novo_voo(aeronave, cia, status="partiu"), "/voos/read"),
+    }
+
+
+@pytest.mark.parametrize("modelo", ["cia", "aeronave", "voo"])
+def test_etag_e_if_match_nas_gravacoes(cliente, documentos, modelo):
+    caminho, parcial, completo, _ = documentos[modelo]
+
+    # Cada gravação devolve a nova versão como ETag
+    resposta = cliente.patch(caminho, json=parcial)
+    assert resposta.status_code == 200, resposta.text
+    assert resposta.headers["etag"] == '"1"' and resposta.json()["versao"] == 1
+
+    # If-Match com a versão atual (forte, fraca ou '*') grava
+    assert cliente.put(caminho, json=completo, headers={"If-Match": '"1"'}).headers["etag"] == '"2"'
+    assert cliente.patch(caminho, json=parcial, headers={"If-Match": 'W/"2"'}).headers["etag"] == '"3"'
+    assert cliente.patch(caminho, json=parcial, headers={"If-Match": "*"}).headers["etag"] == '"4"'
+
+    # Versão antiga: 412 nos dois métodos e nada gravado
+    assert cliente.put(caminho, json=completo, headers={"If-Match": '"3"'}).status_code == 412
+    assert cliente.patch(caminho, json=parcial, headers={"If-Match": '"3"'}).status_code == 412
+    assert cliente.patch(caminho, json=parcial, headers={"If-Match": "versao"}).status_code == 400
+    assert cliente.patch(caminho, json=parcial).headers["etag"] == '"5"'
+
+
+@pytest.mark.parametrize("modelo", ["cia", "aeronave", "voo"])
+def test_if_none_match_responde_304_ate_a_proxima_gravacao(cliente, documentos, modelo):
+    caminho, parcial, _, listagem = documentos[modelo]
+    tag = cliente.get(listagem).headers["etag"]
+
+    repetida = cliente.get(listagem, headers={"If-None-Match": tag})
+    assert repetida.status_code == 304
+    assert repetida.headers["etag"] == tag and not repetida.content
+    # Lista de ETags e comparação fraca também valem
+    assert cliente.get(listagem, headers={"If-None-Match": f'"outra", {tag.removeprefix("W/")}'}).status_code == 304
+
+    # A gravação muda a versão da coleção: a ETag antiga deixa de valer
+    assert cliente.patch(caminho, json=parcial).status_code == 200
+    resposta = cliente.get(listagem, headers={"If-None-Match": tag})
+    assert resposta.status_code == 200
+    assert resposta.headers["etag"] != tag
+
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from busca import COLECAO_SUGESTOES, TERMOS
+from migracoes import COLECAO_MIGRACOES, MIGRACAO_BUSCA, migrar
+from models import Voo
+from tarefas import COLECAO_TAREFAS
+
+AEROPORTOS = ["ZQA", "ZQB", "ZQC", "ZQD", "ZQE"]
+
+
+def test_autocomplete_traz_valores_distintos_ate_o_limit(cliente, aeronave, cia, novo_voo):
+    # Muitos voos por aeroporto, gravados em sequência: a sugestão não pode se esgotar nos voos do primeiro
+    voos = [
+        novo_voo(aeronave, cia, horas_depois=posicao * 2, origem=AEROPORTOS[posicao // 250], destino="XKW")
+        for posicao in range(250 * len(AEROPORTOS))
+    ]
+    assert cliente.post("/voos/bulk", json=voos).json()["inseridos"] == len(voos)
+
+    resposta = cliente.get("/voos/autocomplete", params={"prefixo": "zq", "limit": 4})
+    assert resposta.json() == AEROPORTOS[:4]
+    assert cliente.get("/voos/autocomplete", params={"prefixo": "zq", "limit": 10}).json() == AEROPORTOS
+
+
+def _encontrados(cliente, texto):
+    resposta = cliente.get("/voos/filtros", params={"busca_texto": texto, "limit": 100})
+    return [voo["id"] for voo in resposta.json()] if resposta.status_code == 200 else []
+
+
+def test_chaves_de_busca_gravadas_com_o_documento(cliente, aeronave, cia, novo_voo):
+    voo = cliente.post("/voos/", json=novo_voo(aeronave, cia, origem="Wyvern", destino="Kestrel")).json()["id"]
+    assert voo in _encontrados(cliente, "wyv")
+
+    # PATCH só da origem: os termos continuam incluindo o destino atual
+    assert cliente.patch(f"/voos/{voo}", json={"origem": "Quokka"}).status_code == 200
+    assert voo in _encontrados(cliente, "quok")
+    assert voo in _encontrados(cliente, "kestrel")
+    assert voo not in _encontrados(cliente, "wyv")
+
+
+def test_put_de_cia_atualiza_chaves_de_busca(cliente, cia):
+    cliente.put(f"/cias/{cia}", json={"nome": "Aerovias Pelicano", "cod_iata": "PZ"})
+    nomes = [item["id"] for item in cliente.get("/cias/filtros", params={"busca_texto": "pelic"}).json()]
+    assert cia in nomes
+    assert cliente.get("/cias/autocomplete", params={"prefixo": "pelic"}).json() == ["Aerovias Pelicano"]
+
+
+def _sugestoes(cliente, prefixo):
+    return cliente.get("/voos/autocomplete", params={"prefixo": prefixo}).json()
+
+
+def test_autocomplete_vem_da_colecao_de_sugestoes(cliente, engine, aeronave, cia, novo_voo):
+    ids = [
+        cliente.post("/voos/", json=novo_voo(aeronave, cia, horas_depois=horas, origem="Zanzibar", destino="Zagora")).json()["id"]
+        for horas in (0, 2)
+    ]
+    assert _sugestoes(cliente, "zan") == ["Zanzibar"]
+    # Um documento por valor, não por voo
+    sugestoes = engine.database[COLECAO_SUGESTOES]
+    assert cliente.portal.call(sugestoes.count_documents, {"modelo": "voo", "valor": "Zanzibar"}) == 1
+
+    assert cliente.patch(f"/voos/{ids[0]}", json={"origem": "Zermatt"}).status_code == 200
+    assert _sugestoes(cliente, "zer") == ["Zermatt"]
+
+    # Valor sem nenhum voo continua sugerido até a reindexação
+    assert cliente.delete(f"/voos/{ids[1]}").status_code == 200
+    assert _sugestoes(cliente, "zan") == ["Zanzibar"]
+    assert cliente.post("/busca/reindexar").status_code == 200
+    assert _sugestoes(cliente, "zan") == []
+    assert _sugestoes(cliente, "zer") == ["Zermatt"]
+
+
+def test_inicializacao_preenche_chaves_de_busca_uma_vez(cliente, engine, aeronave, cia, novo_voo):
+    voo = cliente.post("/voos/", json=novo_voo(aeronave, cia, origem="Narwhal", destino="XKW")).json()["id"]
+    voos = engine.get_collection(Voo)
+    marcadores = engine.database[COLECAO_MIGRACOES]
+    # Documento gravado por uma versão sem chaves de busca, banco sem o marcador
+    cliente.portal.call(voos.update_one, {"_id": ObjectId(voo)}, {"$unset": {TERMOS: ""}})
+    cliente.portal.call(marcadores.delete_one, {"_id": MIGRACAO_BUSCA})
+    assert voo not in _encontrados(cliente, "narw")
+
+    # Outro worker subindo ao mesmo tempo tem a reserva: este segue sem migrar
+    tarefa = {"_id": f"migracao_{MIGRACAO_BUSCA}"}
+    reserva = {"$set": {"dono": "outro-worker", "ate": datetime.utcnow() + timedelta(minutes=1)}}
+    cliente.portal.call(engine.database[COLECAO_TAREFAS].update_one, tarefa, reserva, True)
+    cliente.portal.call(migrar, engine)
+    assert voo not in _encontrados(cliente, "narw")
+
+    cliente.portal.call(engine.database[COLECAO_TAREFAS].delete_one, tarefa)
+    cliente.portal.call(migrar, engine)
+    assert voo in _encontrados(cliente, "narw")
+    assert cliente.portal.call(marcadores.find_one, {"_id": MIGRACAO_BUSCA})
+
+    # Já migrado: a próxima inicialização não reindexa de novo
+    cliente.portal.call(voos.update_one, {"_id": ObjectId(voo)}, {"$unset": {TERMOS: ""}})
+    cliente.portal.call(migrar, engine)
+    assert voo not in _encontrados(cliente, "narw")
+    cliente.post("/busca/reindexar")
@@ -0,0 +1,115 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+import conflitos
+import routes.voo as rotas_voo
+from conftest import INICIO_TESTES
+from migracoes import COLECAO_MIGRACOES, MIGRACAO_DURACAO, migrar
+from models import Voo
+
+
+def _z(horas: float) -> str:
+    # Mesmo horário em UTC com fuso explícito, como um cliente JavaScript envia
+    return (INICIO_TESTES + timedelta(hours=horas)).isoformat() + "Z"
+
+
+def test_patch_com_horario_em_utc_explicito(cliente, aeronave, cia, novo_voo):
+    voo = cliente.post("/voos/", json=novo_voo(aeronave, cia)).json()["id"]
+
+    resposta = cliente.patch(f"/voos/{voo}", json={"hr_chegada": _z(2)})
+    assert resposta.status_code == 200, resposta.text
+
+    outro = cliente.post("/voos/", json=novo_voo(aeronave, cia, horas_depois=3)).json()["id"]
+    # Sobrepõe o primeiro voo (0h-2h): conflito, não erro de comparação
+    assert cliente.patch(f"/voos/{outro}", json={"hr_partida": _z(1.5)}).status_code == 409
+
+
+def test_create_com_um_horario_em_utc_explicito(cliente, aeronave, cia, novo_voo):
+    resposta = cliente.post("/voos/", json=novo_voo(aeronave, cia, hr_chegada=_z(1)))
+    assert resposta.status_code == 200, resposta.text
+    assert cliente.post("/voos/", json=novo_voo(aeronave, cia, hr_partida=_z(0.5), hr_chegada=_z(2))).status_code == 409
+
+
+def test_bulk_com_horarios_em_utc_explicito(cliente, aeronave, cia, novo_voo):
+    assert cliente.post("/voos/", json=novo_voo(aeronave, cia)).status_code == 200
+
+    lote = [
+        novo_voo(aeronave, cia, hr_partida=_z(0.5), hr_chegada=_z(1.5)),  # cruza o voo existente
+        novo_voo(aeronave, cia, hr_partida=_z(2), hr_chegada=_z(3)),
+        novo_voo(aeronave, cia, hr_partida=_z(2.5), hr_chegada=_z(4)),  # cruza o item anterior do lote
+    ]
+    resposta = cliente.post("/voos/bulk", json=lote)
+    assert resposta.status_code == 200, resposta.text
+    assert resposta.json()["inseridos"] == 1
+    assert [erro["indice"] for erro in resposta.json()["erros"]] == [0, 2]
+
+
+def test_voo_acima_da_duracao_maxima_e_recusado(cliente, aeronave, cia, novo_voo):
+    # Um voo de 30h ficaria fora da janela das verificações seguintes e permitiria dupla alocação
+    assert cliente.post("/voos/", json=novo_voo(aeronave, cia, duracao=30)).status_code == 400
+
+    voo = cliente.post("/voos/", json=novo_voo(aeronave, cia, duracao=2)).json()["id"]
+    assert cliente.patch(f"/voos/{voo}", json={"hr_chegada": _z(30)}).status_code == 400
+
+    resposta = cliente.post("/voos/bulk", json=[novo_voo(aeronave, cia, horas_depois=10, duracao=30)])
+    assert resposta.json()["inseridos"] == 0
+    assert "Duração" in resposta.json()["erros"][0]["erro"]
+
+
+def test_criacoes_simultaneas_no_mesmo_horario(cliente, engine, aeronave, cia, novo_voo, monkeypatch):
+    verificar = rotas_voo.verificar_conflito
+
+    async def verificar_e_demorar(*args):
+        await verificar(*args)
+        # A outra criação roda entre a verificação e a gravação desta
+        await asyncio.sleep(0.05)
+
+    monkeypatch.setattr(rotas_voo, "verificar_conflito", verificar_e_demorar)
+
+    async def criar_dois():
+        return await asyncio.gather(
+            *(rotas_voo.create_voo(Voo.model_validate(novo_voo(aeronave, cia)), engine=engine) for _ in range(2)),
+            return_exceptions=True,
+        )
+
+    resultados = cliente.portal.call(criar_dois)
+    assert sorted(getattr(resultado, "status_code", 200) for resultado in resultados) == [200, 409]
+    assert cliente.portal.call(engine.get_collection(Voo).count_documents, {"aeronave": ObjectId(aeronave)}) == 1
+
+
+def test_agenda_ocupada_responde_503(cliente, engine, aeronave, cia, novo_voo, monkeypatch):
+    agendas = engine.database[conflitos.COLECAO_AGENDAS]
+    # Gravação de outro worker em andamento para a mesma aeronave
+    reserva = {"$set": {"dono": "outro-worker", "ate": datetime.utcnow() + timedelta(minutes=1)}}
+    cliente.portal.call(agendas.update_one, {"_id": ObjectId(aeronave)}, reserva, True)
+    monkeypatch.setattr(conflitos, "ESPERA_AGENDA", 0.05)
+
+    resposta = cliente.post("/voos/", json=novo_voo(aeronave, cia))
+    assert resposta.status_code == 503
+    assert resposta.headers["Retry-After"] == "1"
+    assert cliente.post("/voos/bulk", json=[novo_voo(aeronave, cia)]).status_code == 503
+
+    # Prazo vencido (worker caiu no meio): a próxima gravação assume a agenda
+    cliente.portal.call(agendas.update_one, {"_id": ObjectId(aeronave)}, {"$set": {"ate": datetime.utcnow()}})
+    assert cliente.post("/voos/", json=novo_voo(aeronave, cia)).status_code == 200
+
+
+def test_voos_antigos_mais_longos_que_o_maximo_continuam_conferidos(cliente, engine, aeronave, cia, novo_voo, monkeypatch):
+    monkeypatch.setattr(conflitos, "ALCANCE_SOBREPOSICAO", conflitos.ALCANCE_SOBREPOSICAO)
+    voos = engine.get_collection(Voo)
+    marcadores = engine.database[COLECAO_MIGRACOES]
+    # Voo de 30h gravado antes do limite de duração existir
+    antigo = Voo.model_validate(novo_voo(aeronave, cia, duracao=30)).model_dump_doc()
+    cliente.portal.call(voos.insert_one, antigo)
+    cliente.portal.call(marcadores.delete_one, {"_id": MIGRACAO_DURACAO})
+    try:
+        cliente.portal.call(migrar, engine)
+        # Parte 26h depois do início do antigo, ainda dentro dele
+        assert cliente.post("/voos/", json=novo_voo(aeronave, cia, horas_depois=26)).status_code == 409
+        resposta = cliente.post("/voos/bulk", json=[novo_voo(aeronave, cia, horas_depois=26)])
+        assert resposta.json()["inseridos"] == 0
+    finally:
+        cliente.portal.call(voos.delete_one, {"_id": antigo["_id"]})
+        cliente.portal.call(marcadores.delete_one, {"_id": MIGRACAO_DURACAO})
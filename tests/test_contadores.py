@@ -0,0 +1,55 @@
+import uuid
+
+from bson import ObjectId
+
+from contadores import TOTAL_AERONAVES, TOTAL_VOOS
+from migracoes import COLECAO_MIGRACOES, MIGRACAO_CONTADORES, migrar
+from models import Cia
+
+
+def _totais(cliente, cia):
+    doc = cliente.get("/cias/filtros", params={"id": cia}).json()[0]
+    return doc[TOTAL_AERONAVES], doc[TOTAL_VOOS]
+
+
+def _nova_cia(cliente):
+    sufixo = uuid.uuid4().hex[:8]
+    return cliente.post("/cias/", json={"nome": f"Companhia {sufixo}", "cod_iata": sufixo[:2].upper()}).json()["id"]
+
+
+def test_contadores_acompanham_criacao_troca_e_remocao(cliente, cia, novo_voo):
+    outra = _nova_cia(cliente)
+    aeronave = cliente.post("/aeronaves/", json={"modelo": "A320", "capacidade": 180, "cia": cia}).json()["id"]
+    voo = cliente.post("/voos/", json=novo_voo(aeronave, cia)).json()["id"]
+    assert _totais(cliente, cia) == (1, 1)
+
+    # Troca de companhia: sai de uma e entra na outra
+    assert cliente.patch(f"/voos/{voo}", json={"cia": outra}).status_code == 200
+    assert cliente.patch(f"/aeronaves/{aeronave}", json={"cia": outra}).status_code == 200
+    assert _totais(cliente, cia) == (0, 0)
+    assert _totais(cliente, outra) == (1, 1)
+
+    # PUT de volta, com a companhia original
+    assert cliente.put(f"/voos/{voo}", json=novo_voo(aeronave, cia)).status_code == 200
+    assert _totais(cliente, cia) == (0, 1) and _totais(cliente, outra) == (1, 0)
+
+    assert cliente.delete(f"/voos/{voo}").status_code == 200
+    assert cliente.delete(f"/aeronaves/{aeronave}").status_code == 200
+    assert _totais(cliente, cia) == (0, 0) and _totais(cliente, outra) == (0, 0)
+
+
+def test_inicializacao_recalcula_contadores_uma_vez(cliente, engine, aeronave, cia, novo_voo):
+    cliente.post("/voos/", json=novo_voo(aeronave, cia))
+    cias = engine.get_collection(Cia)
+    # Banco de uma versão sem contadores: documentos sem os campos e sem o marcador
+    cliente.portal.call(cias.update_one, {"_id": ObjectId(cia)}, {"$unset": {TOTAL_AERONAVES: "", TOTAL_VOOS: ""}})
+    cliente.portal.call(engine.database[COLECAO_MIGRACOES].delete_one, {"_id": MIGRACAO_CONTADORES})
+
+    cliente.portal.call(migrar, engine)
+    assert _totais(cliente, cia) == (1, 1)
+
+    # Já migrado: a próxima inicialização não recalcula de novo
+    cliente.portal.call(cias.update_one, {"_id": ObjectId(cia)}, {"$set": {TOTAL_VOOS: 7}})
+    cliente.portal.call(migrar, engine)
+    assert _totais(cliente, cia) == (1, 7)
+    cliente.post("/cias/contadores/recalcular")
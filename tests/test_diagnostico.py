@@ -0,0 +1,13 @@
+from diagnostico import FORMAS_CONSULTA, explicar, formas_com_collscan
+from models import Voo
+
+
+def test_formas_de_consulta_usam_indice(cliente, engine):
+    # Os índices já foram criados pelo lifespan; as formas das rotas estão listadas em diagnostico.py
+    assert FORMAS_CONSULTA
+    assert cliente.portal.call(formas_com_collscan, engine) == []
+
+
+def test_consulta_sem_indice_e_detectada(cliente, engine):
+    # 'status' não tem índice: garante que o teste acima de fato enxergaria um COLLSCAN
+    assert "COLLSCAN" in cliente.portal.call(explicar, engine, Voo, {"status": "programado"})
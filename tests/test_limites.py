@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+import limites
+from limites import ConfiguracaoLimite, LimiteAdaptativo, MiddlewareLimites, Sobrecarga, classificar
+from metricas import metricas
+
+
+class _Relogio:
+    """Cada leitura avança um segundo: toda resposta lenta pode reduzir o limite."""
+
+    def __init__(self):
+        self.agora = 0.0
+
+    def monotonic(self):
+        self.agora += 1
+        return self.agora
+
+
+def _limite(inicial=10, minimo=2, maximo=20, espera=0.01):
+    return LimiteAdaptativo(ConfiguracaoLimite(inicial, minimo, maximo, espera))
+
+
+@pytest.mark.parametrize(
+    "metodo, caminho, classe",
+    [
+        ("GET", "/voos/read", "leitura"),
+        ("GET", "/voos/completo", "completo"),
+        ("GET", "/aeronaves/relatorio", "completo"),
+        ("PATCH", "/cias/abc", "escrita"),
+        ("GET", "/voos/stream", None),
+        ("GET", "/voos/export", None),
+        ("POST", "/voos/bulk", None),
+        # Painel sai da memória: não disputa vaga com as rotas que vão ao banco
+        ("GET", "/voos/painel/GRU", None),
+        ("GET", "/voos/painel/GRU/", None),
+        ("GET", "/analises/rotas", None),
+    ],
+)
+def test_classificar(metodo, caminho, classe):
+    assert classificar(metodo, caminho) == classe
+
+
+def test_503_do_limite_registrado_com_o_template_da_rota(cliente, monkeypatch):
+    async def cheio():
+        raise Sobrecarga()
+
+    monkeypatch.setattr(limites, "LIMITES_ATIVO", True)
+    monkeypatch.setattr(limites.limites["leitura"], "reservar", cheio)
+    antes = dict(metricas.requisicoes)
+
+    # Recusada antes do roteamento: a métrica ainda sai pelo template, não como rota desconhecida
+    assert cliente.get("/voos/filtros").status_code == 503
+    assert cliente.get("/cias/abc/voos/count").status_code == 503
+    novas = {chave: total - antes.get(chave, 0) for chave, total in metricas.requisicoes.items() if total != antes.get(chave, 0)}
+    assert novas == {("GET", "/voos/filtros", 503): 1, ("GET", "/cias/{cia_id}/voos/count", 503): 1}
+
+
+def test_respostas_rapidas_somam_um_por_limite_de_respostas():
+    limite = _limite()
+    for _ in range(10):
+        limite.observar("/r", 0.01, False, 10)
+    assert 10.9 < limite.limite < 11
+
+    # Limite ocioso (menos da metade em uso) não cresce
+    ocioso = _limite()
+    for _ in range(10):
+        ocioso.observar("/r", 0.01, False, 4)
+    assert ocioso.limite == 10
+
+
+def test_resposta_lenta_ou_erro_reduz_o_limite():
+    lento = _limite()
+    for _ in range(5):
+        lento.observar("/r", 0.01, False, 0)
+    # Latência relativa passa da tolerância na segunda resposta lenta; as seguintes,
+    # ainda dentro da mesma latência recente, não reduzem de novo
+    for _ in range(4):
+        lento.observar("/r", 0.1, False, 0)
+    assert lento.limite == pytest.approx(10 * limites.FATOR_REDUCAO)
+    assert lento.reducoes == 1
+
+    erro = _limite()
+    erro.observar("/r", 0.01, True, 0)
+    assert erro.limite == pytest.approx(10 * limites.FATOR_REDUCAO)
+
+
+def test_limite_fica_entre_minimo_e_maximo(monkeypatch):
+    monkeypatch.setattr(limites, "time", _Relogio())
+    limite = _limite()
+    for _ in range(500):
+        limite.observar("/r", 0.01, False, 20)
+    assert limite.limite == 20
+
+    for _ in range(100):
+        limite.observar("/r", 0.01, True, 20)
+    assert limite.limite == 2
+    assert limite.estatisticas()["limite"] == 2
+
+
+def test_requisicoes_alem_do_limite_recebem_503(monkeypatch):
+    monkeypatch.setattr(limites, "LIMITES_ATIVO", True)
+    monkeypatch.setattr(limites, "limites", {**limites.limites, "leitura": _limite(inicial=1, minimo=1, maximo=1)})
+
+    async def lenta(scope, receive, send):
+        await asyncio.sleep(0.05)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    async def pedir(app):
+        mensagens = []
+
+        async def enviar(mensagem):
+            mensagens.append(mensagem)
+
+        scope = {"type": "http", "method": "GET", "path": "/voos/read", "headers": [], "query_string": b""}
+        await app(scope, None, enviar)
+        inicio = mensagens[0]
+        return inicio["status"], dict(inicio["headers"])
+
+    async def cenario():
+        app = MiddlewareLimites(lenta)
+        # A segunda espera na fila além do tempo de espera; a terceira encontra a fila cheia
+        return await asyncio.gather(*(pedir(app) for _ in range(3)))
+
+    respostas = asyncio.run(cenario())
+    assert [status for status, _ in respostas] == [200, 503, 503]
+    assert all(cabecalhos[b"retry-after"] == limites.RETRY_AFTER.encode() for _, cabecalhos in respostas[1:])
+    estatisticas = limites.limites["leitura"].estatisticas()
+    assert estatisticas["recusadas"] == 2 and estatisticas["em_uso"] == 0
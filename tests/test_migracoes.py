@@ -0,0 +1,49 @@
+from bson import ObjectId
+from pymongo import IndexModel
+
+from migracoes import remover_indices_substituidos, remover_listas_embutidas
+from models import Aeronave, Cia, Voo
+
+# Índices que as versões anteriores criavam e que já não estão nos modelos
+INDICES_ANTIGOS = {
+    Cia: {"cod_iata": ["cod_iata"]},
+    Aeronave: {"cia": ["cia"]},
+    Voo: {
+        "cia_hr_partida": ["cia", "hr_partida"],
+        "aeronave_hr_partida": ["aeronave", "hr_partida"],
+        "hr_partida": ["hr_partida"],
+    },
+}
+
+
+def test_remove_listas_embutidas(cliente, engine, aeronave, cia):
+    cias, aeronaves = engine.get_collection(Cia), engine.get_collection(Aeronave)
+    # Formato antigo: a companhia e a aeronave carregavam os ids dos filhos
+    cliente.portal.call(cias.update_one, {"_id": ObjectId(cia)}, {"$set": {"aeronaves": [ObjectId(aeronave)], "voos": []}})
+    cliente.portal.call(aeronaves.update_one, {"_id": ObjectId(aeronave)}, {"$set": {"voos": [ObjectId()]}})
+
+    alterados = cliente.portal.call(remover_listas_embutidas, engine)
+    assert alterados[Cia.__collection__] >= 1 and alterados[Aeronave.__collection__] >= 1
+    assert "aeronaves" not in cliente.portal.call(cias.find_one, {"_id": ObjectId(cia)})
+    assert "voos" not in cliente.portal.call(aeronaves.find_one, {"_id": ObjectId(aeronave)})
+
+    # Idempotente: a segunda execução não encontra mais nada
+    assert not any(cliente.portal.call(remover_listas_embutidas, engine).values())
+    assert cliente.get("/cias/cia_completa", params={"id": cia}).status_code == 200
+
+
+def test_remove_indices_substituidos(cliente, engine):
+    for model, indices in INDICES_ANTIGOS.items():
+        antigos = [IndexModel([(campo, 1) for campo in campos], name=nome) for nome, campos in indices.items()]
+        cliente.portal.call(engine.get_collection(model).create_indexes, antigos)
+
+    removidos = cliente.portal.call(remover_indices_substituidos, engine)
+    assert sorted(removidos) == sorted(
+        f"{model.__collection__}.{nome}" for model, indices in INDICES_ANTIGOS.items() for nome in indices
+    )
+    # Os atuais continuam lá
+    for model, indices in INDICES_ANTIGOS.items():
+        existentes = cliente.portal.call(engine.get_collection(model).index_information)
+        assert not set(indices) & set(existentes)
+        assert {indice.name for indice in model.model_config["indexes"]()} <= set(existentes)
+    assert cliente.portal.call(remover_indices_substituidos, engine) == []
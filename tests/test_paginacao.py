@@ -0,0 +1,39 @@
+def _todas_as_paginas(cliente, caminho, limit):
+    paginas, cursor = [], None
+    while True:
+        resposta = cliente.get(caminho, params={"limit": limit, **({"cursor": cursor} if cursor else {})})
+        assert resposta.status_code == 200, resposta.text
+        paginas.append([item["id"] for item in resposta.json()])
+        cursor = resposta.headers.get("x-next-cursor")
+        if not cursor:
+            return paginas
+
+
+def test_aeronaves_da_cia_por_cursor(cliente, cia):
+    ids = [
+        cliente.post("/aeronaves/", json={"modelo": "E195", "capacidade": 120, "cia": cia}).json()["id"]
+        for _ in range(5)
+    ]
+    paginas = _todas_as_paginas(cliente, f"/cias/{cia}/aeronaves", 2)
+    assert [len(pagina) for pagina in paginas][:3] == [2, 2, 1]
+    assert sum(paginas, []) == sorted(ids)
+
+
+def test_voos_da_cia_por_cursor(cliente, cia, novo_voo):
+    aeronaves = [
+        cliente.post("/aeronaves/", json={"modelo": "A320", "capacidade": 180, "cia": cia}).json()["id"]
+        for _ in range(2)
+    ]
+    # Dois voos por horário, em aeronaves diferentes: o cursor desempata pelo _id
+    voos = [
+        (horas, cliente.post("/voos/", json=novo_voo(aeronave, cia, horas_depois=horas)).json()["id"])
+        for horas in (0, 2, 4)
+        for aeronave in aeronaves
+    ]
+    paginas = _todas_as_paginas(cliente, f"/cias/{cia}/voos", 4)
+    recebidos = sum(paginas, [])
+    assert len(recebidos) == len(set(recebidos)) == len(voos)
+    # Mais recentes primeiro
+    ordem = {voo_id: horas for horas, voo_id in voos}
+    assert [ordem[voo_id] for voo_id in recebidos] == [4, 4, 2, 2, 0, 0]
+    assert cliente.get(f"/cias/{cia}/voos/count").json() == len(voos)
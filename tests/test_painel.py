@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import INICIO_TESTES
+from painel import CHEGADAS, JANELA_PAINEL, PARTIDAS, painel
+from routes.voo import HORAS_PAINEL
+
+
+class _SemBanco:
+    """No lugar de `engine.database`: qualquer coleção pedida falha o teste."""
+
+    def __getitem__(self, colecao):
+        raise AssertionError(f"o painel foi ao banco ({colecao})")
+
+    __getattr__ = __getitem__
+
+
+@pytest.fixture
+def painel_nos_testes(cliente, engine, monkeypatch):
+    # Janela estendida até depois de INICIO_TESTES, onde ficam os voos dos testes
+    monkeypatch.setattr(painel, "janela", INICIO_TESTES - datetime.utcnow() + timedelta(days=1))
+    yield
+    # Volta à janela de agora para os outros testes
+    monkeypatch.undo()
+    cliente.portal.call(painel.carregar, engine)
+
+
+def test_painel_sai_da_memoria_sem_consultar_o_banco(cliente, engine, aeronave, cia, novo_voo, painel_nos_testes, monkeypatch):
+    def criar(horas):
+        resposta = cliente.post("/voos/", json=novo_voo(aeronave, cia, horas_depois=horas, origem="PNL", destino="DSK"))
+        return resposta.json()["id"]
+
+    # Um voo entra pela carga da janela, os outros pelas rotas de escrita
+    carregado = criar(0.25)
+    cliente.portal.call(painel.carregar, engine)
+    gravados = [criar(horas) for horas in (1.5, 3)]
+
+    monkeypatch.setattr(engine, "database", _SemBanco())
+    consultas = {}
+    for tipo, aeroporto in ((PARTIDAS, "pnl"), (CHEGADAS, "DSK")):
+        # Sem `horas`: o intervalo padrão cabe na janela
+        resposta = cliente.get(f"/voos/painel/{aeroporto}", params={"tipo": tipo, "inicio": INICIO_TESTES.isoformat()})
+        assert resposta.status_code == 200, resposta.text
+        consultas[tipo] = [voo["id"] for voo in resposta.json()]
+
+    # Padrão de 2 horas: partidas em 0,25 e 1,5 h; das chegadas (1,25, 2,5 e 4 h), só a primeira
+    assert consultas == {PARTIDAS: [carregado, gravados[0]], CHEGADAS: [carregado]}
+
+
+@pytest.mark.skipif(not JANELA_PAINEL, reason="painel desligado (PAINEL_JANELA_HORAS=0)")
+def test_intervalo_padrao_dentro_da_janela(cliente):
+    assert 0 < HORAS_PAINEL <= JANELA_PAINEL
+    # Sem parâmetros (a partir de agora, intervalo padrão) a consulta não sai da janela carregada
+    assert cliente.get("/voos/painel/GRU").status_code == 200
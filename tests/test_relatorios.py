@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+import relatorios
+from models import Aeronave, Voo
+from relatorios import relatorio_frota
+
+
+def _voo(aeronave, cia, partida: datetime, horas: float) -> dict:
+    return {
+        "numero_voo": 2000,
+        "origem": "REL",
+        "destino": "FRO",
+        "hr_partida": partida,
+        "hr_chegada": partida + timedelta(hours=horas),
+        "status": "programado",
+        "aeronave": aeronave,
+        "cia": cia,
+        "versao": 0,
+    }
+
+
+@pytest.mark.skipif(relatorios.np is None, reason="numpy não instalado (extra 'relatorios')")
+def test_relatorio_frota_soma_horas_desde_o_check(cliente, engine, cia):
+    agora = datetime.utcnow().replace(microsecond=0)
+    check = agora - timedelta(days=10)
+    companhia = ObjectId(cia)
+    recente, antiga = ObjectId(), ObjectId()
+    aeronaves = [
+        {"_id": recente, "modelo": "REL1", "capacidade": 100, "cia": companhia, "versao": 0,
+         "last_check": check, "next_check": agora + timedelta(days=30)},
+        {"_id": antiga, "modelo": "REL2", "capacidade": 100, "cia": companhia, "versao": 0,
+         "last_check": check - timedelta(days=5), "next_check": agora + timedelta(days=3)},
+    ]
+    voos = [
+        _voo(recente, companhia, check + timedelta(hours=1), 2),
+        _voo(recente, companhia, check + timedelta(days=1), 1.5),
+        # Antes do check da própria aeronave, mas depois do mais antigo da frota
+        _voo(recente, companhia, check - timedelta(days=1), 4),
+        _voo(antiga, companhia, check - timedelta(days=2), 3),
+        # Ainda no ar
+        _voo(antiga, companhia, agora - timedelta(minutes=30), 2),
+        # Aeronave desconhecida (sem check para comparar), fica de fora até da companhia
+        _voo(ObjectId(), companhia, check + timedelta(days=2), 5),
+    ]
+
+    async def gerar():
+        await engine.get_collection(Aeronave).insert_many(aeronaves)
+        await engine.get_collection(Voo).insert_many(voos)
+        try:
+            # Lote pequeno: os totais atravessam vários lotes do cursor
+            return await relatorio_frota(engine, 5, 10000, tamanho_lote=2)
+        finally:
+            await engine.get_collection(Voo).delete_many({"_id": {"$in": [voo["_id"] for voo in voos]}})
+            await engine.get_collection(Aeronave).delete_many({"_id": {"$in": [recente, antiga]}})
+
+    relatorio = cliente.portal.call(gerar)
+
+    por_aeronave = {linha["aeronave"]: linha for linha in relatorio["aeronaves"]}
+    assert (por_aeronave[str(recente)]["horas_desde_check"], por_aeronave[str(recente)]["voos_desde_check"]) == (3.5, 2)
+    assert (por_aeronave[str(antiga)]["horas_desde_check"], por_aeronave[str(antiga)]["voos_desde_check"]) == (3, 1)
+    da_cia = next(linha for linha in relatorio["cias"] if linha["cia"] == cia)
+    assert (da_cia["horas"], da_cia["voos"]) == (6.5, 3)
+    # Check em 3 dias entra na lista de manutenção de 5 dias; o de 30 dias não
+    manutencao = {linha["aeronave"] for linha in relatorio["manutencao"]}
+    assert str(antiga) in manutencao and str(recente) not in manutencao
+
+
+def test_relatorio_sem_numpy_responde_503(cliente, monkeypatch):
+    monkeypatch.setattr(relatorios, "np", None)
+    resposta = cliente.get("/aeronaves/relatorio")
+    assert resposta.status_code == 503
+    assert "numpy" in resposta.json()["detail"]
@@ -0,0 +1,153 @@
+import asyncio
+
+from models import Aeronave, Cia, Voo
+from respostas import CacheRespostas
+
+MODELOS_VOO = (Voo, Cia, Aeronave)
+
+
+def _pagina(*ids):
+    # Mesmo formato de /voos/completo: o voo e as referências embutidas
+    return [{"id": id, "cia": {"id": "c1"}, "aeronave": {"id": "a1"}} for id in ids]
+
+
+def _calculo(conteudo, chamadas):
+    async def calcular():
+        chamadas.append(conteudo)
+        return conteudo, None
+
+    return calcular
+
+
+def test_lru_limitado_em_bytes():
+    async def cenario():
+        # Cada página tem 54 bytes: cabem duas
+        cache = CacheRespostas(limite_bytes=120, ttl=60, obsoleto=0)
+        chamadas = []
+        for numero in range(2):
+            await cache.responder("/r", {"n": numero}, MODELOS_VOO, _calculo(_pagina(f"v{numero}"), chamadas))
+        # Usar a primeira a torna a mais recente: a próxima inserção tira a segunda
+        assert (await cache.responder("/r", {"n": 0}, MODELOS_VOO, _calculo(None, chamadas))).headers["X-Cache"] == "HIT"
+        await cache.responder("/r", {"n": 2}, MODELOS_VOO, _calculo(_pagina("v2"), chamadas))
+        guardadas = [chave[1] for chave in cache._itens]
+
+        # Corpo maior que o limite é respondido, mas não guardado
+        grande = await cache.responder("/g", {}, MODELOS_VOO, _calculo(_pagina(*[f"v{n}" for n in range(20)]), chamadas))
+        return cache, guardadas, grande
+
+    cache, guardadas, grande = asyncio.run(cenario())
+    assert guardadas == [(("n", "0"),), (("n", "2"),)]
+    assert cache.bytes == 108 and cache.remocoes == 1
+    assert grande.status_code == 200
+    assert ("/g", ()) not in cache._itens
+
+
+def test_versao_velha_servida_enquanto_revalida():
+    async def cenario():
+        cache = CacheRespostas(ttl=0, obsoleto=60)
+        chamadas = []
+        liberar = asyncio.Event()
+
+        async def lento():
+            chamadas.append("novo")
+            await liberar.wait()
+            return _pagina("novo"), None
+
+        primeira = await cache.responder("/r", {}, MODELOS_VOO, _calculo(_pagina("velho"), chamadas))
+        # Vencida: a velha sai na hora e um único recálculo fica em segundo plano
+        segunda = await cache.responder("/r", {}, MODELOS_VOO, lento)
+        terceira = await cache.responder("/r", {}, MODELOS_VOO, lento)
+        await asyncio.sleep(0)
+        liberar.set()
+        await asyncio.gather(*cache._tarefas)
+        quarta = await cache.responder("/r", {}, MODELOS_VOO, _calculo(_pagina("novo"), chamadas))
+        await asyncio.gather(*cache._tarefas)
+        return [primeira, segunda, terceira, quarta], chamadas
+
+    respostas, chamadas = asyncio.run(cenario())
+    assert [resposta.headers["X-Cache"] for resposta in respostas] == ["MISS", "STALE", "STALE", "STALE"]
+    assert b"velho" in respostas[2].body
+    assert b"novo" in respostas[3].body
+    # Um recálculo para a segunda e a terceira juntas
+    assert chamadas.count("novo") == 1
+
+
+def test_pedidos_simultaneos_compartilham_o_calculo():
+    async def cenario():
+        cache = CacheRespostas(ttl=60, obsoleto=0)
+        chamadas = []
+
+        async def calcular():
+            chamadas.append(1)
+            await asyncio.sleep(0.01)
+            return _pagina("v1"), None
+
+        respostas = await asyncio.gather(*(cache.responder("/r", {}, MODELOS_VOO, calcular) for _ in range(3)))
+        return cache, respostas, chamadas
+
+    cache, respostas, chamadas = asyncio.run(cenario())
+    assert len(chamadas) == 1
+    assert cache.coalescidas == 2
+    assert len({resposta.body for resposta in respostas}) == 1
+
+
+def test_atualizacao_invalida_so_as_respostas_que_mostram_o_documento():
+    async def cenario():
+        cache = CacheRespostas(ttl=60, obsoleto=0)
+        chamadas = []
+        for id in ("v1", "v2"):
+            await cache.responder("/r", {"id": id}, MODELOS_VOO, _calculo(_pagina(id), chamadas))
+        estados = {}
+
+        async def estado(id):
+            resposta = await cache.responder("/r", {"id": id}, MODELOS_VOO, _calculo(_pagina(id), chamadas))
+            return resposta.headers["X-Cache"]
+
+        cache.invalidar(Voo, {"status"}, "v1")
+        estados["status"] = (await estado("v1"), await estado("v2"))
+        # A companhia aparece embutida nas duas
+        cache.invalidar(Cia, {"nome"}, "c1")
+        estados["cia"] = (await estado("v1"), await estado("v2"))
+        # Nova partida muda a ordem das listas aninhadas: toda a coleção
+        cache.invalidar(Voo, {"hr_partida"}, "v9")
+        estados["posicao"] = (await estado("v1"), await estado("v2"))
+        # Inserção ou remoção (sem id)
+        cache.invalidar(Voo)
+        estados["insercao"] = (await estado("v1"), await estado("v2"))
+        return estados
+
+    assert asyncio.run(cenario()) == {
+        "status": ("MISS", "HIT"),
+        "cia": ("MISS", "MISS"),
+        "posicao": ("MISS", "MISS"),
+        "insercao": ("MISS", "MISS"),
+    }
+
+
+def test_calculo_que_mostra_documento_alterado_nao_e_guardado():
+    async def cenario():
+        cache = CacheRespostas(ttl=60, obsoleto=0)
+
+        async def calcular():
+            # O voo muda enquanto a resposta é montada com o valor antigo
+            cache.invalidar(Voo, {"status"}, "v1")
+            return _pagina("v1"), None
+
+        await cache.responder("/r", {}, MODELOS_VOO, calcular)
+        return cache
+
+    assert not asyncio.run(cenario())._itens
+
+
+def test_patch_de_um_voo_mantem_as_respostas_dos_outros(cliente, aeronave, cia, novo_voo):
+    alterado, outro = (
+        cliente.post("/voos/", json=novo_voo(aeronave, cia, horas_depois=horas)).json()["id"] for horas in (0, 2)
+    )
+    for id in (alterado, outro):
+        assert cliente.get("/voos/completo", params={"id": id}).headers["X-Cache"] == "MISS"
+
+    assert cliente.patch(f"/voos/{alterado}", json={"status": "embarcando"}).status_code == 200
+    assert cliente.get("/voos/completo", params={"id": outro}).headers["X-Cache"] == "HIT"
+    resposta = cliente.get("/voos/completo", params={"id": alterado})
+    assert resposta.headers["X-Cache"] == "MISS"
+    assert resposta.json()[0]["status"] == "embarcando"
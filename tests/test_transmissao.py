@@ -0,0 +1,14 @@
+import transmissao
+from transmissao import difusor
+
+
+def test_limite_de_assinantes_responde_503_antes_do_stream(cliente, monkeypatch):
+    monkeypatch.setattr(transmissao, "LIMITE_ASSINANTES", 0)
+    assinantes = len(difusor.assinantes)
+
+    resposta = cliente.get("/voos/stream")
+    # O erro sai como resposta própria, não como um 200 de text/event-stream vazio
+    assert resposta.status_code == 503
+    assert resposta.headers["Retry-After"] == "5"
+    assert resposta.headers["content-type"].startswith("application/json")
+    assert len(difusor.assinantes) == assinantes
@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo.errors import OperationFailure, PyMongoError
+
+from atualizacao import ATUALIZADO_EM
+from models import Voo
+from serializacao import documento, dumps
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_FILA = int(os.getenv("STREAM_TAMANHO_FILA", "100"))  # eventos pendentes por cliente
+LIMITE_ASSINANTES = int(os.getenv("STREAM_LIMITE_ASSINANTES", "10000"))  # clientes por worker
+INTERVALO_CONSULTA = float(os.getenv("STREAM_INTERVALO_CONSULTA", "2"))  # segundos, sem change stream
+LOTE_CONSULTA = 1000  # alterações lidas por consulta periódica
+ATRASO_CONSULTA = timedelta(seconds=1)
+INTERVALO_PING = 15.0  # segundos entre comentários SSE que mantêm a conexão aberta
+
+# Recebe cada alteração de voo: (operação, documento ou None na remoção, _id)
+OuvinteVoos = Callable[[str, Optional[Dict[str, Any]], Any], None]
+
+
+@dataclass
+class FiltroStream:
+    """Mesmos critérios de /voos/filtros, avaliados em memória sobre cada evento."""
+
+    cia: Optional[ObjectId] = None
+    aeronave: Optional[ObjectId] = None
+    origem: Optional[str] = None
+    destino: Optional[str] = None
+    data_inicio: Optional[datetime] = None
+    data_fim: Optional[datetime] = None
+
+    def aceita(self, doc: Dict[str, Any]) -> bool:
+        if self.cia is not None and doc.get("cia") != self.cia:
+            return False
+        if self.aeronave is not None and doc.get("aeronave") != self.aeronave:
+            return False
+        if self.origem is not None and str(doc.get("origem", "")).upper() != self.origem:
+            return False
+        if self.destino is not None and str(doc.get("destino", "")).upper() != self.destino:
+            return False
+        partida = doc.get("hr_partida")
+        if self.data_inicio is not None and (partida is None or partida < self.data_inicio):
+            return False
+        if self.data_fim is not None and (partida is None or partida > self.data_fim):
+            return False
+        return True
+
+
+class Assinatura:
+    """Fila limitada de um cliente: se ele não acompanhar, os eventos mais antigos são descartados."""
+
+    def __init__(self, filtro: FiltroStream, tamanho: int = TAMANHO_FILA):
+        self.filtro = filtro
+        self.fila: asyncio.Queue = asyncio.Queue(maxsize=tamanho)
+        self.perdidos = 0
+
+    def entregar(self, evento: bytes) -> None:
+        if self.fila.full():
+            self.fila.get_nowait()
+            self.perdidos += 1
+        self.fila.put_nowait(evento)
+
+
+def _sse(tipo: str, conteudo: Any) -> bytes:
+    return b"event: " + tipo.encode() + b"\ndata: " + dumps(conteudo) + b"\n\n"
+
+
+class Difusor:
+    """Um único change stream de voos por worker, repassado a todos os clientes conectados.
+
+    O stream só fica aberto enquanto houver assinantes, a menos que algum
+    ouvinte interno (ex.: o painel) peça para mantê-lo com `manter`. Em um mongod
+    standalone (sem change stream) as alterações são buscadas periodicamente
+    pelo campo `atualizado_em`; nesse modo remoções não são notificadas.
+    """
+
+    def __init__(self):
+        self.assinantes: Set[Assinatura] = set()
+        self.eventos = 0
+        self.modo = "parado"
+        self.ouvintes: List[OuvinteVoos] = []
+        self._fixo = False
+        self._tarefa: Optional[asyncio.Task] = None
+
+    def _iniciar(self, engine) -> None:
+        if self._tarefa is None or self._tarefa.done():
+            self._tarefa = asyncio.create_task(self._vigiar(engine))
+
+    def manter(self, engine) -> None:
+        """Mantém o stream aberto mesmo sem clientes SSE (para os ouvintes)."""
+        self._fixo = True
+        self._iniciar(engine)
+
+    def assinar(self, engine, filtro: FiltroStream) -> Assinatura:
+        if len(self.assinantes) >= LIMITE_ASSINANTES:
+            raise HTTPException(status_code=503, detail="Limite de conexões de stream atingido", headers={"Retry-After": "5"})
+        assinatura = Assinatura(filtro)
+        self.assinantes.add(assinatura)
+        self._iniciar(engine)
+        return assinatura
+
+    def cancelar(self, assinatura: Assinatura) -> None:
+        self.assinantes.discard(assinatura)
+        if not self.assinantes and not self._fixo and self._tarefa is not None:
+            self._tarefa.cancel()
+            self._tarefa = None
+            self.modo = "parado"
+
+    async def parar(self) -> None:
+        tarefa, self._tarefa = self._tarefa, None
+        if tarefa is not None:
+            tarefa.cancel()
+            try:
+                await tarefa
+            except asyncio.CancelledError:
+                pass
+
+    def publicar(self, operacao: str, doc: Optional[Dict[str, Any]], id) -> None:
+        self.eventos += 1
+        for ouvinte in self.ouvintes:
+            ouvinte(operacao, doc, id)
+        if not self.assinantes:
+            return
+        if doc is None:
+            # Remoção: sem o documento não dá para filtrar, vai para todos
+            evento = _sse("voo", {"operacao": operacao, "id": str(id)})
+            destinos: List[Assinatura] = list(self.assinantes)
+        else:
+            evento = _sse("voo", {"operacao": operacao, "voo": documento(Voo, doc)})
+            destinos = [assinatura for assinatura in self.assinantes if assinatura.filtro.aceita(doc)]
+        for assinatura in destinos:
+            assinatura.entregar(evento)
+
+    async def _vigiar(self, engine) -> None:
+        colecao = engine.get_collection(Voo)
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+        while True:
+            try:
+                async with colecao.watch(pipeline, full_document="updateLookup") as stream:
+                    self.modo = "change_stream"
+                    async for evento in stream:
+                        operacao = evento["operationType"]
+                        doc = evento.get("fullDocument")
+                        # Atualização de um voo removido logo em seguida: a remoção chega depois
+                        if doc is None and operacao != "delete":
+                            continue
+                        self.publicar(operacao, doc, evento["documentKey"]["_id"])
+            except OperationFailure as e:
+                # 40573: change streams só existem em replica set/cluster
+                if e.code == 40573:
+                    logger.warning("Change stream indisponível (%s); stream de voos por consulta periódica", e)
+                    await self._consultar(colecao)
+                    return
+                logger.warning("Change stream de voos interrompido (%s); reconectando", e)
+                await asyncio.sleep(1)
+            except PyMongoError as e:
+                logger.warning("Change stream de voos interrompido (%s); reconectando", e)
+                await asyncio.sleep(1)
+
+    async def _consultar(self, colecao) -> None:
+        self.modo = "consulta"
+        # Posição (atualizado_em, _id) do último voo publicado
+        marca, ultimo_id = datetime.utcnow(), ObjectId("0" * 24)
+        while True:
+            await asyncio.sleep(INTERVALO_CONSULTA)
+            # Gravações ainda não confirmadas podem ter carimbo um pouco mais antigo: lê com atraso
+            limite = datetime.utcnow() - ATRASO_CONSULTA
+            filtro = {
+                "$or": [
+                    {ATUALIZADO_EM: {"$gt": marca, "$lt": limite}},
+                    {ATUALIZADO_EM: marca, "_id": {"$gt": ultimo_id}},
+                ]
+            }
+            try:
+                busca = colecao.find(filtro).sort([(ATUALIZADO_EM, 1), ("_id", 1)]).limit(LOTE_CONSULTA)
+                async for doc in busca:
+                    marca, ultimo_id = doc[ATUALIZADO_EM], doc["_id"]
+                    self.publicar("insert" if doc.get("versao", 0) == 0 else "update", doc, doc["_id"])
+            except PyMongoError as e:
+                logger.warning("Falha ao consultar alterações de voos (%s)", e)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        return {
+            "modo": self.modo,
+            "fixo": self._fixo,
+            "assinantes": len(self.assinantes),
+            "eventos": self.eventos,
+            "perdidos": sum(assinatura.perdidos for assinatura in self.assinantes),
+        }
+
+
+# Instância única por worker
+difusor = Difusor()
+
+
+async def transmitir(assinatura: Assinatura) -> AsyncIterator[bytes]:
+    """Corpo do text/event-stream de um cliente; a assinatura é removida quando ele desconecta.
+
+    A assinatura é feita pela rota, antes da resposta: acima do limite o
+    cliente recebe o 503, e não um 200 com o corpo vazio.
+    """
+    try:
+        yield b"retry: 3000\n\n"
+        perdidos = 0
+        while True:
+            try:
+                evento = await asyncio.wait_for(assinatura.fila.get(), INTERVALO_PING)
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"
+                continue
+            # Cliente lento perdeu eventos: avisa para ele recarregar a lista
+            if assinatura.perdidos != perdidos:
+                yield _sse("perdidos", {"total": assinatura.perdidos})
+                perdidos = assinatura.perdidos
+            yield evento
+    finally:
+        difusor.cancelar(assinatura)
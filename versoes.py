@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi import Header, HTTPException, Request, Response
+from pymongo.errors import OperationFailure, PyMongoError
+
+from models import Aeronave, Cia, Voo
+
+logger = logging.getLogger(__name__)
+
+# Sem change stream, escritas de outros workers não chegam aqui: a ETag expira nesse intervalo
+VERSOES_TTL = float(os.getenv("VERSOES_TTL", "5"))  # segundos
+
+MODELOS = (Cia, Aeronave, Voo)
+
+# Chamado a cada alteração: (model, campos alterados ou None quando não se sabe quais,
+# _id do documento atualizado ou None para inserções, remoções e escritas em vários documentos)
+Ouvinte = Callable[[type, Optional[Set[str]], Optional[Any]], None]
+
+
+class VersoesColecoes:
+    """Contador de versão por coleção, incrementado a cada escrita.
+
+    A ETag das listagens é derivada das versões das coleções lidas e dos
+    parâmetros da consulta, então um If-None-Match igual responde 304 sem ir
+    ao banco. A época (aleatória por processo) impede que uma ETag gerada por
+    outro worker, com outra contagem, seja aceita por engano.
+    """
+
+    def __init__(self, ttl: float = VERSOES_TTL):
+        self.ttl = ttl
+        self.epoca = os.urandom(8).hex()
+        self.vigiado = False
+        self.ouvintes: List[Ouvinte] = []
+        self.nao_modificados = 0
+        self._versoes: Dict[str, int] = {}
+
+    def alterar(self, model, campos: Optional[Iterable[str]] = None, id: Optional[Any] = None) -> None:
+        colecao = model.__collection__
+        self._versoes[colecao] = self._versoes.get(colecao, 0) + 1
+        campos = set(campos) if campos is not None else None
+        for ouvinte in self.ouvintes:
+            ouvinte(model, campos, id)
+
+    def versao(self, model) -> int:
+        return self._versoes.get(model.__collection__, 0)
+
+    def etag(self, rota: str, parametros: Iterable[Tuple[str, str]], colecoes: Iterable[str]) -> str:
+        partes = [self.epoca, rota]
+        partes.extend(f"{colecao}={self._versoes.get(colecao, 0)}" for colecao in colecoes)
+        partes.extend(f"{nome}={valor}" for nome, valor in sorted(parametros))
+        if not self.vigiado:
+            partes.append(str(int(time.time() // self.ttl)))
+        resumo = hashlib.blake2b("\n".join(partes).encode(), digest_size=12).hexdigest()
+        return f'W/"{resumo}"'
+
+    def estatisticas(self) -> Dict[str, object]:
+        return {
+            "versoes": dict(self._versoes),
+            "vigiado": self.vigiado,
+            "nao_modificados": self.nao_modificados,
+        }
+
+
+# Instância única por worker
+versoes = VersoesColecoes()
+
+
+def _corresponde(if_none_match: str, tag: str) -> bool:
+    # Comparação fraca (RFC 9110): W/"x" e "x" são a mesma ETag
+    alvo = tag.removeprefix("W/")
+    return any(
+        item.strip() == "*" or item.strip().removeprefix("W/") == alvo
+        for item in if_none_match.split(",")
+    )
+
+
+def condicional(*models):
+    """Dependência das rotas GET: define a ETag e responde 304 antes de consultar o banco."""
+    colecoes = tuple(model.__collection__ for model in models)
+
+    async def verificar(
+        request: Request,
+        response: Response,
+        if_none_match: str = Header(None, description="ETag de uma resposta anterior; responde 304 se nada mudou"),
+    ) -> str:
+        tag = versoes.etag(request.url.path, request.query_params.multi_items(), colecoes)
+        cabecalhos = {"ETag": tag, "Cache-Control": "no-cache"}
+        if if_none_match and _corresponde(if_none_match, tag):
+            versoes.nao_modificados += 1
+            raise HTTPException(status_code=304, headers=cabecalhos)
+        response.headers.update(cabecalhos)
+        return tag
+
+    return verificar
+
+
+async def vigiar_alteracoes(engine, estado: VersoesColecoes = versoes) -> None:
+    """Aplica as escritas de outros workers (change stream) às versões e aos ouvintes.
+
+    Em um mongod standalone não há change stream: as ETags passam a expirar por tempo.
+    """
+    modelos = {model.__collection__: model for model in MODELOS}
+    pipeline = [{"$match": {"ns.coll": {"$in": list(modelos)}}}]
+    while True:
+        try:
+            async with engine.database.watch(pipeline) as stream:
+                # Eventos perdidos enquanto não havia stream: considera tudo alterado
+                for model in MODELOS:
+                    estado.alterar(model)
+                estado.vigiado = True
+                async for evento in stream:
+                    model = modelos.get(evento.get("ns", {}).get("coll"))
+                    if model is None:
+                        continue
+                    campos = None
+                    id = None
+                    if evento["operationType"] == "update":
+                        descricao = evento["updateDescription"]
+                        campos = {
+                            campo.split(".")[0]
+                            for campo in list(descricao["updatedFields"]) + descricao.get("removedFields", [])
+                        }
+                        id = evento["documentKey"]["_id"]
+                    estado.alterar(model, campos, id)
+        except OperationFailure as e:
+            estado.vigiado = False
+            # 40573: change streams só existem em replica set/cluster
+            if e.code == 40573:
+                logger.warning("Change stream indisponível (%s); ETags e respostas expiram por tempo", e)
+                return
+            logger.warning("Change stream interrompido (%s); reconectando", e)
+            await asyncio.sleep(1)
+        except PyMongoError as e:
+            estado.vigiado = False
+            logger.warning("Change stream interrompido (%s); reconectando", e)
+            await asyncio.sleep(1)